@@ -0,0 +1,148 @@
+# bench/harness.py
+"""
+Timing, peak memory, result files and run-to-run comparison for bench/run.py.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class BenchSkipped(Exception):
+    """Raised by a benchmark that cannot run here (missing binary, …); reported as skipped, not failed."""
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> List[float]:
+    """Run fn warmup + repeat times; return the timed samples in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def measure_async(make_coro: Callable[[], Awaitable[Any]], repeat: int = 5, warmup: int = 1) -> List[float]:
+    async def run() -> List[float]:
+        for _ in range(warmup):
+            await make_coro()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await make_coro()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    return asyncio.run(run())
+
+
+def peak_memory_async(make_coro: Callable[[], Awaitable[Any]]) -> Tuple[Any, int]:
+    """Run one coroutine under tracemalloc; return (its result, peak bytes allocated while it ran)."""
+    tracemalloc.start()
+    try:
+        result = asyncio.run(make_coro())
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples: List[float], **extra: Any) -> Dict[str, Any]:
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+        **extra,
+    }
+
+
+def run_meta(mode: str) -> Dict[str, Any]:
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False
+        ).stdout.strip()
+    except OSError:
+        sha = ""
+    return {
+        "git": sha,
+        "mode": mode,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_results(path: str, meta: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "results": results}, fh, indent=2, sort_keys=True)
+
+
+def compare(
+    baseline_path: str,
+    results: Dict[str, Dict[str, Any]],
+    threshold: float = 0.10,
+    metric: str = "p50_ms",
+) -> List[Dict[str, Any]]:
+    """
+    Compare against a previous results file.  A benchmark regresses when its
+    `metric` grew by more than `threshold` (0.10 = 10 %).
+    """
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)["results"]
+    rows = []
+    for name in sorted(set(baseline) | set(results)):
+        old: Optional[float] = baseline.get(name, {}).get(metric)
+        new: Optional[float] = results.get(name, {}).get(metric)
+        ratio = (new / old) if old and new is not None else None
+        rows.append({
+            "name": name,
+            "baseline": old,
+            "current": new,
+            "ratio": round(ratio, 3) if ratio is not None else None,
+            "regressed": ratio is not None and ratio > 1 + threshold,
+        })
+    return rows
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    width = max((len(n) for n in results), default=10)
+    print(f"{'benchmark':<{width}}  {'p50 ms':>10}  {'p95 ms':>10}  {'mean ms':>10}  n")
+    for name, r in results.items():
+        if "skipped" in r or "failed" in r:
+            status = "skipped" if "skipped" in r else "FAILED"
+            print(f"{name:<{width}}  {status}: {r.get('skipped') or r.get('failed')}")
+            continue
+        print(f"{name:<{width}}  {r['p50_ms']:>10.3f}  {r['p95_ms']:>10.3f}  {r['mean_ms']:>10.3f}  {r['n']}")
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    width = max((len(r["name"]) for r in rows), default=10)
+    print(f"\n{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  ratio")
+    for r in rows:
+        flag = "  ← REGRESSION" if r["regressed"] else ""
+        base = f"{r['baseline']:.3f}" if r["baseline"] is not None else "-"
+        cur = f"{r['current']:.3f}" if r["current"] is not None else "-"
+        ratio = f"{r['ratio']:.3f}" if r["ratio"] is not None else "-"
+        print(f"{r['name']:<{width}}  {base:>10}  {cur:>10}  {ratio}{flag}")
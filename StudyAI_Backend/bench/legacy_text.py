@@ -0,0 +1,155 @@
+# bench/legacy_text.py
+"""
+The summariser / flashcard text stages as they were before
+services/text_processing.py (per-call re.sub chains, patterns compiled on
+every call).  Kept verbatim as the reference the "text" benchmarks time
+against and check the new module's output against; not used by the app.
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+
+def clean(txt: str) -> str:
+    return re.sub(r"\s+", " ", txt).strip()
+
+
+def is_meta_line(line: str) -> bool:
+    l = line.strip().lower()
+    return (
+        l.startswith(("abstract —", "write an academic abstract"))
+        or "for confidential support" in l
+        or re.search(r"(http|www\.)", l)
+        or re.search(r"@\w+", l)
+        or any(bad in l for bad in ["click here", "follow us", "back to", "prize", "winner", "submit", "feature"])
+    )
+
+
+def strip_prompt(text: str) -> str:
+    lines = [l for l in text.splitlines() if not is_meta_line(l)]
+    cleaned_text = "\n".join(lines)
+    cleaned_text = re.sub(r'@\w+', '', cleaned_text)
+    cleaned_text = re.sub(r'(http|www\.)\S+', '', cleaned_text)
+    cleaned_text = re.sub(r'(click here|follow us|back to|prize|winner|submit|feature).*', '', cleaned_text, flags=re.I)
+    return cleaned_text
+
+
+def split_sections(text: str) -> List[str]:
+    section_pattern = re.compile(r"(?:^|\n)([A-Z][A-Za-z0-9\- ]{3,40})(?:\n|$)")
+    sections = []
+    last_idx = 0
+    for match in section_pattern.finditer(text):
+        start = match.start(1)
+        if last_idx < start:
+            section_text = text[last_idx:start].strip()
+            if section_text:
+                sections.append(section_text)
+        last_idx = start
+    if last_idx < len(text):
+        section_text = text[last_idx:].strip()
+        if section_text:
+            sections.append(section_text)
+    if not sections:
+        sections = [text]
+    return sections
+
+
+def postprocess(summary: str) -> str:
+    summary = re.sub(r'for confidential support.*', '', summary, flags=re.I | re.S)
+    summary = re.sub(r'(http|www\.)\S+', '', summary)
+    summary = re.sub(r'@\w+', '', summary)
+    summary = re.sub(r'(click here|follow us|back to|prize|winner|submit|feature).*', '', summary, flags=re.I)
+    summary = re.sub(r'\s{2,}', ' ', summary).strip()
+    summary = re.sub(
+        r"(write an academic abstract.*?in a scholarly tone:.*?)+", "", summary, flags=re.I | re.S
+    )
+    summary = re.sub(
+        r"(write an academic abstract.*?in a academic tone:.*?)+", "", summary, flags=re.I | re.S
+    )
+    summary = re.sub(r"authors say\.\.", "authors say.", summary)
+    summary = re.sub(r"([.?!])[^.?!]*$", r"\1", summary)
+    summary = summary.strip()
+    if not summary.endswith('.'):
+        summary += '.'
+    return summary
+
+
+def clean_flashcard_text(text: str) -> str:
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
+    text = re.sub(r'`.*?`', '', text)
+    return text
+
+
+def parse_qa_pairs(response: str) -> List[Tuple[str, str]]:
+    flashcards = []
+    response = re.sub(r'\s+', ' ', response).strip()
+    patterns = [
+        r'Q:\s*(.*?)\s*A:\s*(.*?)(?=Q:|$)',
+        r'Question:\s*(.*?)\s*Answer:\s*(.*?)(?=Question:|$)',
+        r'\d+\.\s*(.*?\?)\s*(.*?)(?=\d+\.|$)',
+        r'([^.!?]+\?)\s*(.*?)(?=[^.!?]+\?|$)',
+    ]
+    for pattern in patterns:
+        matches = re.findall(pattern, response, re.DOTALL | re.IGNORECASE)
+        if matches:
+            for question, answer in matches:
+                question = question.strip()
+                answer = answer.strip()
+                question = re.sub(r'^\d+\.\s*', '', question)
+                answer = re.sub(r'^\d+\.\s*', '', answer)
+                question = re.sub(r'\[.*?\]', '', question)
+                answer = re.sub(r'\[.*?\]', '', answer)
+                answer = re.sub(r'\(.*?\)', '', answer)
+                if not question.endswith('?'):
+                    question += '?'
+                if len(question) > 10 and len(answer) > 10:
+                    flashcards.append((question, answer))
+            if flashcards:
+                break
+    if not flashcards:
+        sentences = re.split(r'[.!?]+', response)
+        sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
+        for i, sentence in enumerate(sentences[:10]):
+            words = sentence.split()
+            if len(words) > 5:
+                key_word = words[0] if words[0].istitle() else "this concept"
+                question = f"What is {key_word}?"
+                flashcards.append((question, sentence))
+    return flashcards[:15]
+
+
+def build_flashcards(summary_response: str, cleaned_content: str, num_flashcards: int) -> List[Tuple[str, str]]:
+    summary_sentences = re.split(r'[.!?]+', summary_response)
+    summary_sentences = [s.strip() for s in summary_sentences if len(s.strip()) > 20]
+    original_sentences = re.split(r'[.!?]+', cleaned_content)
+    original_sentences = [s.strip() for s in original_sentences if len(s.strip()) > 30]
+    all_sentences = summary_sentences + original_sentences
+    flashcards = []
+    for i, sentence in enumerate(all_sentences[:num_flashcards]):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        words = sentence.split()
+        key_term = None
+        for word in words:
+            if (word[0].isupper() and len(word) > 3 and
+                word.lower() not in ['the', 'this', 'that', 'these', 'those', 'what', 'when', 'where', 'which', 'who', 'why', 'how', 'there', 'during', 'which', 'where', 'extract', 'important', 'sentences', 'text', 'could', 'used', 'educational', 'flashcards', 'focus', 'definitions', 'processes', 'concepts']):
+                key_term = word
+                break
+        if not key_term:
+            for word in words:
+                if len(word) > 4 and word.lower() not in ['the', 'this', 'that', 'these', 'those', 'what', 'when', 'where', 'which', 'who', 'why', 'how', 'there', 'during', 'which', 'where', 'extract', 'important', 'sentences', 'text', 'could', 'used', 'educational', 'flashcards', 'focus', 'definitions', 'processes', 'concepts']:
+                    key_term = word.capitalize()
+                    break
+        if not key_term:
+            key_term = "this topic"
+        flashcards.append((f"What is {key_term}?", sentence))
+    unique_flashcards = []
+    seen_questions = set()
+    for card in flashcards:
+        if card[0] not in seen_questions:
+            unique_flashcards.append(card)
+            seen_questions.add(card[0])
+    return unique_flashcards[:num_flashcards]
@@ -0,0 +1,353 @@
+# bench/loadgen.py
+"""
+Closed-loop load generator + capacity report for the HTTP API.
+
+Replays a weighted mix of real client calls (text summaries, PDF uploads,
+image uploads, flashcard generation, set listings) at stepped concurrency
+and reports, per step, throughput, latency percentiles and error rate, then
+the saturation point: the highest concurrency that still meets the p99 SLO,
+and the knee where adding users stops adding throughput.
+
+Without --url it starts the app the way render.yaml does (a single uvicorn
+process), with the stub model and throwaway SQLite storage, so it needs no
+GPU or Google credentials.  Point --url at a running instance to test a
+real deployment or the real model.
+
+Run from StudyAI_Backend/:
+    python -m bench.loadgen                                  # 1,2,4,8,16,32 users, 20 s each
+    python -m bench.loadgen --steps 1,4,16,64 --duration 30 --slo-p99-ms 3000
+    python -m bench.loadgen --mix summarize_text=80,flashcard_sets=20
+    python -m bench.loadgen --real-model --out capacity.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from bench import samples
+from bench.harness import percentile, run_meta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rough shape of production traffic; override with --mix.
+DEFAULT_MIX = {
+    "summarize_text": 40,
+    "upload_pdf": 15,
+    "upload_images": 5,
+    "generate_flashcards": 15,
+    "flashcard_sets": 25,
+}
+LIBRARY_USER = "loadgen-library"
+
+
+# ---------- request mix ---------- #
+class Workload:
+    """Builds one request per call; payloads are prepared once up front."""
+
+    def __init__(self, base_url: str, timeout: float = 120.0) -> None:
+        self.base = base_url.rstrip("/")
+        self.timeout = timeout
+        self.text = samples.note("medium")
+        self.pdf = samples.pdf("medium")
+        try:
+            self.image: Optional[bytes] = samples.image("small")
+        except ImportError:  # Pillow missing on the load box
+            self.image = None
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def user(self) -> str:
+        # fresh user per write, otherwise content-hash dedup answers from storage
+        with self._lock:
+            self._n += 1
+            return f"loadgen-{os.getpid()}-{self._n}"
+
+    def seed(self, session: requests.Session, sets: int = 25) -> None:
+        cards = [{"question": f"Question {i}?", "answer": f"Answer {i}"} for i in range(20)]
+        for i in range(sets):
+            session.post(f"{self.base}/create_flashcard_set", json={
+                "user_id": LIBRARY_USER, "set_name": f"Set {i}", "flashcards": cards,
+            }, timeout=30)
+
+    def summarize_text(self, s: requests.Session) -> requests.Response:
+        return s.post(f"{self.base}/summarize_text", json={
+            "content": self.text, "user_id": self.user(), "title": "Load test", "source": "text",
+        }, timeout=self.timeout)
+
+    def upload_pdf(self, s: requests.Session) -> requests.Response:
+        return s.post(
+            f"{self.base}/upload_pdf",
+            files={"file": ("notes.pdf", self.pdf, "application/pdf")},
+            data={"user_id": self.user(), "title": "Load test PDF"},
+            timeout=self.timeout,
+        )
+
+    def upload_images(self, s: requests.Session) -> requests.Response:
+        if self.image is None:
+            raise RuntimeError("Pillow not installed; drop upload_images from --mix")
+        return s.post(
+            f"{self.base}/upload_images",
+            files=[("files", ("page.png", self.image, "image/png"))],
+            data={"user_id": self.user(), "title": "Load test images"},
+            timeout=self.timeout,
+        )
+
+    def generate_flashcards(self, s: requests.Session) -> requests.Response:
+        return s.post(f"{self.base}/generate_flashcards", json={
+            "content": self.text, "user_id": self.user(), "set_name": "Load test set",
+        }, timeout=self.timeout)
+
+    def flashcard_sets(self, s: requests.Session) -> requests.Response:
+        return s.get(f"{self.base}/flashcard_sets/{LIBRARY_USER}", timeout=self.timeout)
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, int]:
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+# ---------- one concurrency step ---------- #
+Sample = Tuple[str, float, bool]  # (operation, latency seconds, ok)
+
+
+def _ok(resp: requests.Response) -> bool:
+    if resp.status_code >= 400:
+        return False
+    try:
+        body = resp.json()
+    except ValueError:
+        return False
+    # endpoints report failures as 200 + {"success": false}
+    return not (isinstance(body, dict) and body.get("success") is False)
+
+
+def run_step(
+    workload: Workload,
+    mix: Dict[str, int],
+    users: int,
+    duration: float,
+    seed: int,
+) -> List[Sample]:
+    ops: List[str] = list(mix)
+    weights: List[int] = [mix[o] for o in ops]
+    results: List[Sample] = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def user_loop(idx: int) -> None:
+        rng = random.Random(seed * 1000 + idx)
+        session = requests.Session()  # keep-alive, like one app client
+        local: List[Sample] = []
+        while time.monotonic() < stop_at:
+            op = rng.choices(ops, weights)[0]
+            call: Callable[[requests.Session], requests.Response] = getattr(workload, op)
+            start = time.perf_counter()
+            try:
+                ok = _ok(call(session))
+            except requests.RequestException:  # timeouts and dropped connections count as errors
+                ok = False
+            local.append((op, time.perf_counter() - start, ok))
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=user_loop, args=(i,), daemon=True) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    ms = [x * 1000 for x in latencies]
+    if not ms:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "max_ms": round(max(ms), 1),
+    }
+
+
+def step_report(users: int, duration: float, samples_: List[Sample]) -> Dict[str, Any]:
+    ok = [lat for _, lat, good in samples_ if good]
+    errors = len(samples_) - len(ok)
+    by_op: Dict[str, List[Sample]] = defaultdict(list)
+    for s in samples_:
+        by_op[s[0]].append(s)
+    return {
+        "users": users,
+        "requests": len(samples_),
+        "throughput_rps": round(len(ok) / duration, 2),
+        "error_rate": round(errors / len(samples_), 4) if samples_ else 0.0,
+        **_latency_stats(ok),
+        "operations": {
+            op: {
+                "requests": len(rows),
+                "errors": sum(1 for _, _, good in rows if not good),
+                **_latency_stats([lat for _, lat, good in rows if good]),
+            }
+            for op, rows in sorted(by_op.items())
+        },
+    }
+
+
+def saturation(steps: List[Dict[str, Any]], slo_p99_ms: float, max_error_rate: float, knee_gain: float) -> Dict[str, Any]:
+    """
+    • max_users_within_slo – highest step whose p99 and error rate are within limits
+    • knee_users           – first step after which throughput grows by < knee_gain
+    """
+    within = [s for s in steps if s["p99_ms"] <= slo_p99_ms and s["error_rate"] <= max_error_rate]
+    knee = None
+    for prev, cur in zip(steps, steps[1:]):
+        if prev["throughput_rps"] and cur["throughput_rps"] < prev["throughput_rps"] * (1 + knee_gain):
+            knee = prev
+            break
+    peak = max(steps, key=lambda s: s["throughput_rps"]) if steps else None
+    return {
+        "slo_p99_ms": slo_p99_ms,
+        "max_error_rate": max_error_rate,
+        "max_users_within_slo": within[-1]["users"] if within else 0,
+        "throughput_at_slo_rps": within[-1]["throughput_rps"] if within else 0.0,
+        "knee_users": knee["users"] if knee else None,
+        "peak_throughput_rps": peak["throughput_rps"] if peak else 0.0,
+        "peak_users": peak["users"] if peak else None,
+    }
+
+
+# ---------- local server ---------- #
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(real_model: bool, workdir: str) -> Tuple[subprocess.Popen, str]:
+    """uvicorn main:app, single process as in render.yaml, local storage stand-in."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.setdefault("STORAGE_BACKEND", "sqlite")
+    env.setdefault("SQLITE_STORAGE_PATH", os.path.join(workdir, "loadgen.sqlite3"))
+    env.setdefault("EXTRACTION_CACHE", "0")   # every upload pays its parse, as distinct files would
+    env.setdefault("SEARCH_INDEX_DIR", os.path.join(workdir, "search"))
+    env.setdefault("LOG_FILE", os.path.join(workdir, "server.log"))   # logs at the app's level, as deployed
+    if not real_model:
+        env["HF_MODEL"] = "stub"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + (600 if real_model else 60)   # model download / load
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{url}/", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    proc.terminate()
+    raise SystemExit("server did not become ready")
+
+
+# ---------- output ---------- #
+def print_step(step: Dict[str, Any]) -> None:
+    print(
+        f"{step['users']:>5}  {step['throughput_rps']:>8.2f}  {step['p50_ms']:>9.1f}  "
+        f"{step['p95_ms']:>9.1f}  {step['p99_ms']:>9.1f}  {step['error_rate'] * 100:>6.2f}%  {step['requests']}",
+        flush=True,
+    )
+
+
+def print_summary(sat: Dict[str, Any], steps: List[Dict[str, Any]]) -> None:
+    print(f"\nSaturation (p99 ≤ {sat['slo_p99_ms']:.0f} ms, errors ≤ {sat['max_error_rate'] * 100:.1f}%):")
+    print(f"  max concurrent users within SLO : {sat['max_users_within_slo']}"
+          f"  ({sat['throughput_at_slo_rps']} req/s)")
+    print(f"  throughput knee                 : {sat['knee_users'] or 'not reached'}")
+    print(f"  peak throughput                 : {sat['peak_throughput_rps']} req/s at {sat['peak_users']} users")
+    if steps:
+        last = steps[-1]
+        print(f"\nPer operation at {last['users']} users:")
+        for op, row in last["operations"].items():
+            print(f"  {op:<20} p50 {row['p50_ms']:>8.1f}  p99 {row['p99_ms']:>8.1f}  errors {row['errors']}/{row['requests']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="StudyAI load generator / capacity report")
+    parser.add_argument("--url", help="target instance; default starts a local stub-model server")
+    parser.add_argument("--real-model", action="store_true", help="local server loads HF_MODEL instead of the stub")
+    parser.add_argument("--steps", default="1,2,4,8,16,32", help="comma-separated concurrent users per step")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per step")
+    parser.add_argument("--mix", help="op=weight,... (default: %s)" % ",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout (counts as an error)")
+    parser.add_argument("--slo-p99-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--knee-gain", type=float, default=0.05, help="min throughput gain per step before the knee")
+    parser.add_argument("--stop-after-saturation", action="store_true", help="stop ramping once the SLO is broken")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="capacity.json")
+    args = parser.parse_args()
+
+    steps_users = [int(x) for x in args.steps.split(",") if x.strip()]
+    mix = parse_mix(args.mix)
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_server(args.real_model, tempfile.mkdtemp(prefix="studyai-loadgen-"))
+    try:
+        workload = Workload(url, args.timeout)
+        workload.seed(requests.Session())
+
+        print(f"target {url}  mix {mix}  {args.duration:.0f}s/step")
+        print(f"{'users':>5}  {'req/s':>8}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  {'errors':>7}  n")
+        steps: List[Dict[str, Any]] = []
+        for users in steps_users:
+            step = step_report(users, args.duration, run_step(workload, mix, users, args.duration, args.seed))
+            steps.append(step)
+            print_step(step)
+            if args.stop_after_saturation and (step["p99_ms"] > args.slo_p99_ms or step["error_rate"] > args.max_error_rate):
+                break
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    sat = saturation(steps, args.slo_p99_ms, args.max_error_rate, args.knee_gain)
+    print_summary(sat, steps)
+
+    meta = run_meta("external" if args.url else ("real" if args.real_model else "stub"))
+    meta.update({"url": url if args.url else "local", "mix": mix, "duration_s": args.duration})
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "steps": steps, "saturation": sat}, fh, indent=2)
+    print(f"\nReport written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+# bench/run.py
+"""
+Offline benchmark suite for the StudyAI backend.
+
+Covers parsing (pdfminer, OCR), the summarizer's text stages (prompt
+stripping, section splitting, chunking, post-processing), flashcard
+parsing + generation, end-to-end summarize() (time, and peak memory on
+large uploads), response encoding of large payloads (CPU time and bytes,
+against FastAPI's default path), and the HTTP endpoints via
+FastAPI's TestClient.  Storage is a throwaway SQLite file, and the model is
+the deterministic stub (services/stub_model.py) unless --real-model is set.
+
+Run from StudyAI_Backend/:
+    python -m bench.run                          # all groups, stub model
+    python -m bench.run --only text flashcards   # some groups
+    python -m bench.run --out before.json
+    python -m bench.run --compare before.json --fail-on-regression
+    python -m bench.run --real-model --repeat 3
+
+A benchmark whose dependency is missing (ImportError, BenchSkipped) is
+reported as skipped; any other exception is a failure, and the run exits
+non-zero.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import itertools
+import os
+import sys
+import tempfile
+import traceback
+from typing import Any, Callable, Dict, List, Tuple
+
+GROUPS = ("parse", "text", "flashcards", "pipeline", "api")
+
+
+def _configure_env(real_model: bool, workdir: str) -> None:
+    """Must run before any app module is imported – they read config at import time."""
+    os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+    os.environ.setdefault("SQLITE_STORAGE_PATH", os.path.join(workdir, "bench.sqlite3"))
+    os.environ.setdefault("EXTRACTION_CACHE", "0")   # measure parsing, not cache hits
+    os.environ.setdefault("SEARCH_INDEX_DIR", os.path.join(workdir, "search"))
+    os.environ.setdefault("WRITE_BEHIND", "0")
+    os.environ.setdefault("LOG_FILE", os.path.join(workdir, "bench.log"))   # app log level, off the results table
+    os.environ.setdefault("STUB_LATENCY_MS", "20")
+    if not real_model:
+        os.environ["HF_MODEL"] = "stub"
+
+
+Bench = Tuple[str, str, Callable[[], Dict[str, Any]]]   # (group, name, run)
+
+
+def _suite(repeat: int) -> List[Bench]:
+    from bench import samples
+    from bench.harness import BenchSkipped, measure, measure_async, peak_memory_async, summarize
+
+    benches: List[Bench] = []
+
+    def add(group: str, name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        benches.append((group, name, fn))
+
+    # ---------- parsing ---------- #
+    def parse_pdf(size: str) -> Dict[str, Any]:
+        from services.pdf_parser import extract_text_from_pdf
+
+        data = samples.pdf(size)
+        return summarize(measure(lambda: extract_text_from_pdf(data), repeat), bytes=len(data))
+
+    def require_tesseract() -> None:
+        import pytesseract
+
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError as exc:
+            raise BenchSkipped("tesseract binary not installed") from exc
+
+    def parse_ocr(size: str) -> Dict[str, Any]:
+        from services.parser import extract_text_from_image
+
+        require_tesseract()
+
+        data = samples.image(size)
+        return summarize(measure(lambda: extract_text_from_image(data), max(1, repeat // 2)), bytes=len(data))
+
+    for size in ("small", "medium", "large"):
+        add("parse", f"parse.pdf.{size}", lambda size=size: parse_pdf(size))
+    for size in ("small", "medium"):
+        add("parse", f"parse.ocr.{size}", lambda size=size: parse_ocr(size))
+
+    # ---------- summarizer text stages ---------- #
+    _svc: Dict[str, Any] = {}
+
+    def svc():
+        if "svc" not in _svc:
+            from services.summarizer_service import SummarizerService
+
+            _svc["svc"] = SummarizerService()
+        return _svc["svc"]
+
+    def strip_clean(size: str) -> Dict[str, Any]:
+        s, text = svc(), samples.note(size)
+        return summarize(measure(lambda: s._clean(s._strip_prompt(text)), repeat), chars=len(text))
+
+    def chunk(size: str) -> Dict[str, Any]:
+        s = svc()
+        text = s._clean(s._strip_prompt(samples.note(size)))
+        return summarize(measure(lambda: s._chunk(text), repeat), chunks=len(s._chunk(text)))
+
+    def split_sections(size: str) -> Dict[str, Any]:
+        s = svc()
+        text = s._clean(s._strip_prompt(samples.note(size)))
+        return summarize(measure(lambda: s._split_sections(text), repeat))
+
+    def postprocess(size: str) -> Dict[str, Any]:
+        s, text = svc(), samples.note(size)
+        return summarize(measure(lambda: s._postprocess(text), repeat), chars=len(text))
+
+    for size in ("medium", "large", "xlarge"):
+        add("text", f"text.strip_clean.{size}", lambda size=size: strip_clean(size))
+        add("text", f"text.chunk.{size}", lambda size=size: chunk(size))
+        add("text", f"text.split_sections.{size}", lambda size=size: split_sections(size))
+        add("text", f"text.postprocess.{size}", lambda size=size: postprocess(size))
+
+    # ---------- flashcards ---------- #
+    def fc_parse(kind: str) -> Dict[str, Any]:
+        from services.flashcard_service import FlashcardService
+
+        fc, response = FlashcardService(svc()), samples.flashcard_responses()[kind]
+        return summarize(
+            measure(lambda: fc._parse_flashcards_from_response(response), repeat),
+            cards=len(fc._parse_flashcards_from_response(response)),
+        )
+
+    def fc_generate(size: str) -> Dict[str, Any]:
+        from services.flashcard_service import FlashcardService
+
+        fc, text = FlashcardService(svc()), samples.note(size)
+        return summarize(measure_async(lambda: fc.generate_flashcards(text), repeat))
+
+    for kind in ("qa", "numbered", "prose"):
+        add("flashcards", f"flashcards.parse.{kind}", lambda kind=kind: fc_parse(kind))
+    for size in ("medium", "large"):
+        add("flashcards", f"flashcards.generate.{size}", lambda size=size: fc_generate(size))
+
+    # ---------- text processing vs. bench/legacy_text.py ---------- #
+    MB = 1 << 20
+    legacy_p50: Dict[str, float] = {}
+
+    def against_legacy(group: str, name: str, new_fn: Callable[[str], Any], old_fn: Callable[[str], Any],
+                       make_input: Callable[[], str]) -> None:
+        """Two rows: `name.legacy` (the old code) and `name` (with speedup + identical output check)."""
+        def run_legacy() -> Dict[str, Any]:
+            data = make_input()
+            result = summarize(measure(lambda: old_fn(data), repeat), chars=len(data))
+            legacy_p50[name] = result["p50_ms"]
+            return result
+
+        def run_new() -> Dict[str, Any]:
+            data = make_input()
+            result = summarize(measure(lambda: new_fn(data), repeat), chars=len(data), identical=new_fn(data) == old_fn(data))
+            if legacy_p50.get(name) and result["p50_ms"]:
+                result["speedup"] = round(legacy_p50[name] / result["p50_ms"], 2)
+            return result
+
+        add(group, f"{name}.legacy", run_legacy)
+        add(group, name, run_new)
+
+    def fc_build(content: str) -> List[Tuple[str, str]]:
+        from services.flashcard_service import FlashcardService
+
+        cards = FlashcardService(svc())._build_flashcards(samples.prose_of_size(2000), content, 10)
+        return [(c.question, c.answer) for c in cards]
+
+    def equivalence() -> Dict[str, Any]:
+        pairs = [
+            ("clean_input", tp.clean_input, lambda t: legacy.clean(legacy.strip_prompt(t))),
+            ("is_meta_line", tp.is_meta_line, lambda t: bool(legacy.is_meta_line(t))),
+            ("split_sections", tp.split_sections, legacy.split_sections),
+            ("postprocess", tp.postprocess_summary, legacy.postprocess),
+            ("clean_flashcard_text", tp.clean_flashcard_text, legacy.clean_flashcard_text),
+            ("parse_qa_pairs", tp.parse_qa_pairs, legacy.parse_qa_pairs),
+            ("build_flashcards", fc_build, lambda t: legacy.build_flashcards(samples.prose_of_size(2000), t, 10)),
+        ]
+        corpus = samples.tricky_texts() + [samples.text_of_size(MB), samples.prose_of_size(MB)]
+        mismatches: List[str] = []
+
+        def check() -> None:
+            mismatches.clear()
+            for text in corpus:
+                mismatches.extend(name for name, new_fn, old_fn in pairs if new_fn(text) != old_fn(text))
+
+        return summarize(measure(check, 1, warmup=0), cases=len(corpus) * len(pairs),
+                         mismatches=len(mismatches), mismatched=sorted(set(mismatches)))
+
+    from bench import legacy_text as legacy
+    from services import text_processing as tp
+
+    against_legacy("text", "text.strip_clean.1mb", tp.clean_input,
+                   lambda t: legacy.clean(legacy.strip_prompt(t)), lambda: samples.text_of_size(MB))
+    against_legacy("text", "text.postprocess.1mb", tp.postprocess_summary, legacy.postprocess,
+                   lambda: samples.prose_of_size(MB))
+    against_legacy("flashcards", "flashcards.clean.1mb", tp.clean_flashcard_text, legacy.clean_flashcard_text,
+                   lambda: samples.text_of_size(MB))
+    against_legacy("flashcards", "flashcards.parse.1mb", tp.parse_qa_pairs, legacy.parse_qa_pairs,
+                   lambda: samples.prose_of_size(MB))
+    against_legacy("flashcards", "flashcards.build.1mb", fc_build,
+                   lambda t: legacy.build_flashcards(samples.prose_of_size(2000), t, 10), lambda: samples.text_of_size(MB))
+    add("text", "text.equivalence", equivalence)
+
+    # ---------- end-to-end summarize ---------- #
+    def pipeline(size: str) -> Dict[str, Any]:
+        s, text = svc(), samples.note(size)
+        before = s.batch_stats.padded_tokens, s.batch_stats.real_tokens
+        result = summarize(measure_async(lambda: s.summarize(text), repeat))
+        padded = s.batch_stats.padded_tokens - before[0]
+        real = s.batch_stats.real_tokens - before[1]
+        result["padding_efficiency"] = round(real / padded, 4) if padded else 1.0
+        return result
+
+    for size in ("small", "medium", "large"):
+        add("pipeline", f"pipeline.summarize.{size}", lambda size=size: pipeline(size))
+
+    # peak memory of one summarize() on a large upload, streamed vs. in memory
+    in_memory_summary: Dict[int, str] = {}
+    memory_users = itertools.count()
+
+    def peak_memory(size_mb: int, streaming: bool) -> Dict[str, Any]:
+        from services import summarizer_service
+
+        s, text = svc(), samples.text_of_size(size_mb * MB)
+        run = lambda: s.summarize(text, user_id=f"bench-memory-{next(memory_users)}")  # fresh budget, no dedup
+        threshold = summarizer_service.STREAM_MIN_CHARS
+        summarizer_service.STREAM_MIN_CHARS = threshold if streaming else len(text) + 1
+        try:
+            timings = measure_async(run, 1, warmup=0)
+            summary, peak = peak_memory_async(run)
+        finally:
+            summarizer_service.STREAM_MIN_CHARS = threshold
+        result = summarize(timings, input_mb=size_mb, peak_mb=round(peak / MB, 2), summary_mb=round(len(summary) / MB, 2))
+        if streaming:
+            if size_mb in in_memory_summary:
+                result["identical"] = summary == in_memory_summary[size_mb]
+        else:
+            in_memory_summary[size_mb] = summary
+        return result
+
+    for size_mb in (1, 2):
+        add("pipeline", f"pipeline.peak_memory.{size_mb}mb.in_memory", lambda size_mb=size_mb: peak_memory(size_mb, False))
+        add("pipeline", f"pipeline.peak_memory.{size_mb}mb", lambda size_mb=size_mb: peak_memory(size_mb, True))
+
+    # ---------- HTTP endpoints ---------- #
+    _client: Dict[str, Any] = {}
+
+    def client():
+        if "client" not in _client:
+            from fastapi.testclient import TestClient
+
+            import main
+
+            _client["cm"] = TestClient(main.app)
+            _client["client"] = _client["cm"].__enter__()  # runs startup hooks
+        return _client["client"]
+
+    counter = {"n": 0}
+
+    def fresh_user() -> str:
+        # unique user per call, otherwise content-hash dedup answers from storage
+        counter["n"] += 1
+        return f"bench-user-{counter['n']}"
+
+    def api_summarize_text() -> Dict[str, Any]:
+        c, text = client(), samples.note("medium")
+        return summarize(measure(lambda: c.post("/summarize_text", json={
+            "content": text, "user_id": fresh_user(), "title": "Bench", "source": "text",
+        }), repeat))
+
+    def api_upload_pdf() -> Dict[str, Any]:
+        c, data = client(), samples.pdf("medium")
+        return summarize(measure(lambda: c.post(
+            "/upload_pdf",
+            files={"file": ("bench.pdf", data, "application/pdf")},
+            data={"user_id": fresh_user(), "title": "Bench PDF"},
+        ), repeat))
+
+    def api_upload_images() -> Dict[str, Any]:
+        require_tesseract()
+        c, data = client(), samples.image("small")
+        return summarize(measure(lambda: c.post(
+            "/upload_images",
+            files=[("files", ("page.png", data, "image/png"))],
+            data={"user_id": fresh_user(), "title": "Bench images"},
+        ), max(1, repeat // 2)))
+
+    def api_generate_flashcards() -> Dict[str, Any]:
+        c, text = client(), samples.note("medium")
+        return summarize(measure(lambda: c.post("/generate_flashcards", json={
+            "content": text, "user_id": fresh_user(), "set_name": "Bench set",
+        }), repeat))
+
+    def api_flashcard_sets() -> Dict[str, Any]:
+        c = client()
+        cards = [{"question": f"Question {i}?", "answer": f"Answer {i}"} for i in range(20)]
+        for i in range(25):
+            c.post("/create_flashcard_set", json={"user_id": "bench-library", "set_name": f"Set {i}", "flashcards": cards})
+        return summarize(measure(lambda: c.get("/flashcard_sets/bench-library"), repeat * 4))
+
+    add("api", "api.summarize_text.medium", api_summarize_text)
+    add("api", "api.upload_pdf.medium", api_upload_pdf)
+    add("api", "api.upload_images.small", api_upload_images)
+    add("api", "api.generate_flashcards.medium", api_generate_flashcards)
+    add("api", "api.flashcard_sets.list25", api_flashcard_sets)
+
+    # ---------- response encoding: FastAPI's default path vs utils/serialization ---------- #
+    def payloads() -> Dict[str, Callable[[], Dict[str, Any]]]:
+        from models.flashcard import Flashcard
+
+        prose = samples.prose_of_size(4000)
+        cards = [Flashcard(question=f"What is term {i}?", answer=prose[i % 97:i % 97 + 300]) for i in range(500)]
+        sets = [
+            {"id": f"set_{i}", "name": f"Set {i}", "note_id": f"note_{i}", "card_count": 50, "createdAt": 1700000000000 + i,
+             "flashcards": [{"id": f"card_{j}", "question": f"Question {j}?", "answer": prose[j:j + 200]} for j in range(50)]}
+            for i in range(100)
+        ]
+        return {
+            "flashcards500": lambda: {"success": True, "set_id": "set_1", "flashcards": cards, "count": len(cards)},
+            "sets100x50": lambda: {"success": True, "sets": sets},
+            "summary1mb": lambda: {"success": True, "summary": samples.prose_of_size(MB), "summary_id": "s", "note_id": "n"},
+        }
+
+    def legacy_encode(payload: Dict[str, Any]) -> bytes:
+        """Route returns dicts (flashcards as dict lists) → jsonable_encoder → JSONResponse."""
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse
+
+        if "flashcards" in payload:
+            payload = {**payload, "flashcards": [{"question": c.question, "answer": c.answer} for c in payload["flashcards"]]}
+        return JSONResponse(jsonable_encoder(payload)).body
+
+    def encode(name: str, accept_encoding: str, legacy: bool) -> Dict[str, Any]:
+        import json
+
+        from utils.serialization import encode_body
+
+        payload = payloads()[name]()
+        if legacy:
+            body = legacy_encode(payload)
+            result = summarize(measure(lambda: legacy_encode(payload), repeat), bytes=len(body))
+            legacy_p50[f"encode.{name}"] = result["p50_ms"]
+            return result
+        body, _, headers = encode_body(payload, "", accept_encoding)
+        plain = gzip.decompress(body) if headers.get("Content-Encoding") == "gzip" else body
+        result = summarize(measure(lambda: encode_body(payload, "", accept_encoding), repeat), bytes=len(body),
+                           identical=json.loads(plain) == json.loads(legacy_encode(payload)))
+        if legacy_p50.get(f"encode.{name}") and result["p50_ms"]:
+            result["speedup"] = round(legacy_p50[f"encode.{name}"] / result["p50_ms"], 2)
+        return result
+
+    for name in ("flashcards500", "sets100x50", "summary1mb"):
+        add("api", f"api.encode.{name}.legacy", lambda name=name: encode(name, "", True))
+        add("api", f"api.encode.{name}", lambda name=name: encode(name, "", False))
+        add("api", f"api.encode.{name}.gzip", lambda name=name: encode(name, "gzip", False))
+
+    def close() -> None:
+        if "cm" in _client:
+            _client["cm"].__exit__(None, None, None)
+
+    benches.append(("", "__close__", close))  # type: ignore[arg-type]
+    return benches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="StudyAI offline benchmarks")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, help="benchmark groups to run")
+    parser.add_argument("--filter", default="", help="substring a benchmark name must contain")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--real-model", action="store_true", help="load HF_MODEL instead of the stub")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (0.10 = 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="studyai-bench-")
+    _configure_env(args.real_model, workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from bench.harness import BenchSkipped, compare, print_comparison, print_table, run_meta, write_results
+
+    groups = set(args.only or GROUPS)
+    results: Dict[str, Dict[str, Any]] = {}
+    for group, name, fn in _suite(args.repeat):
+        if name == "__close__":
+            fn()
+            continue
+        if group not in groups or args.filter not in name:
+            continue
+        try:
+            results[name] = fn()
+        except (ImportError, BenchSkipped) as exc:  # optional deps, missing tesseract, …
+            results[name] = {"skipped": f"{type(exc).__name__}: {exc}"}
+        except Exception as exc:
+            traceback.print_exc()
+            results[name] = {"failed": f"{type(exc).__name__}: {exc}"}
+        print(f"  {name} done", file=sys.stderr)
+
+    print_table(results)
+    write_results(args.out, run_meta("real" if args.real_model else "stub"), results)
+    print(f"\nResults written to {args.out}")
+
+    # rewritten paths must reproduce what they replace exactly (bench/legacy_text.py, in-memory summarize)
+    differs = [name for name, r in results.items() if r.get("identical") is False or r.get("mismatches")]
+    if differs:
+        print(f"\nOutput differs from the reference implementation: {', '.join(differs)}", file=sys.stderr)
+    failed = [name for name, r in results.items() if "failed" in r]
+    if failed:
+        print(f"\nBenchmarks failed: {', '.join(failed)}", file=sys.stderr)
+
+    if args.compare:
+        rows = compare(args.compare, results, args.threshold)
+        print_comparison(rows)
+        if args.fail_on_regression and any(r["regressed"] for r in rows):
+            return 1
+    return 1 if differs or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
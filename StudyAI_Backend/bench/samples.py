@@ -0,0 +1,170 @@
+# bench/samples.py
+"""
+Benchmark inputs.
+
+Text notes are bundled in bench/samples/.  Larger notes, PDFs and images are
+derived from them deterministically (same bytes on every run), so results
+stay comparable between machines without shipping binary fixtures.
+"""
+from __future__ import annotations
+
+import io
+import os
+import textwrap
+import zlib
+from functools import lru_cache
+from typing import Dict, List
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), "samples")
+
+# note name → how many times the medium note is repeated (0 = bundled file as-is)
+NOTE_SIZES = {"small": 0, "medium": 0, "large": 12, "xlarge": 60}
+
+
+@lru_cache(maxsize=None)
+def note(size: str) -> str:
+    if size in ("small", "medium"):
+        with open(os.path.join(SAMPLES_DIR, f"note_{size}.txt"), encoding="utf-8") as fh:
+            return fh.read()
+    medium = note("medium")
+    parts = [f"Chapter {i + 1} Review\n{medium}" for i in range(NOTE_SIZES[size])]
+    return "\n".join(parts)
+
+
+def text_of_size(n_bytes: int) -> str:
+    """Realistic note text (with meta lines + URLs mixed in) of roughly n_bytes."""
+    noisy = (
+        note("medium")
+        + "\nClick here to follow us for more notes: https://example.com/notes @studyai\n"
+        + "For confidential support call the help line.\n"
+    )
+    reps = max(1, n_bytes // len(noisy.encode("utf-8")) + 1)
+    return (noisy * reps)[:n_bytes]
+
+
+def prose_of_size(n_bytes: int) -> str:
+    """Note text flattened to one paragraph (model-output-like) of roughly n_bytes."""
+    flat = " ".join(note("medium").split()) + " "
+    reps = max(1, n_bytes // len(flat.encode("utf-8")) + 1)
+    return (flat * reps)[:n_bytes]
+
+
+# fragments that trip the text-cleaning patterns: promo/meta phrases in odd
+# case, characters re.IGNORECASE folds onto ASCII, unusual line breaks and
+# whitespace, Q/A markers, code spans
+_TRICKY = [
+    "@user", "@", "http://x.y/z", "HTTP://A", "www.site", "WWW.", "Click Here", "cLiCk", " here", "Feature", "PRIZE",
+    "winner", "back to", "follow us", "sub@x mit", "ſubmit", "ſ", "\u212a", "\u0130", "\u0131", "ß", "é", "Σ",
+    "For Confidential Support", "for confidential", " support", "write an academic abstract", "in a scholarly tone:",
+    "in a academic tone:", "Abstract —", "  abstract — x", "authors say..", "authors say...", "```code```", "`x`", "`",
+    "Q:", "A:", "q: ", "Question:", "answer:", "1.", "2. ", "?", ".", "!", "(p)", "[b]",
+    "\n", "\r\n", "\r", "\x1c", "\u0085", "\u2028", "\u00a0", "\t", "  ", " ",
+    "Chapter One\n", "\nHeading Here\n", "word", "The", "Mitochondria", "Longer sentence with many words in it",
+]
+
+
+def tricky_texts(count: int = 2000, seed: int = 7) -> List[str]:
+    """Deterministic adversarial inputs for checking text-processing rewrites against the originals."""
+    import random
+
+    rnd = random.Random(seed)
+    seps = ["", "", " ", "\n"]
+    return [
+        "".join(rnd.choice(_TRICKY) + rnd.choice(seps) for _ in range(rnd.randint(0, 40)))
+        for _ in range(count)
+    ]
+
+
+def notes() -> Dict[str, str]:
+    return {size: note(size) for size in NOTE_SIZES}
+
+
+# ---------- PDFs ---------- #
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+@lru_cache(maxsize=None)
+def pdf(size: str) -> bytes:
+    """A text PDF (Helvetica, ~55 lines/page) containing note(size)."""
+    lines: List[str] = []
+    for para in note(size).splitlines():
+        lines.extend(textwrap.wrap(para, 90) or [""])
+    pages = [lines[i : i + 55] for i in range(0, len(lines), 55)] or [[]]
+
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # placeholders, filled once ids are known
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids = []
+    for page_lines in pages:
+        ops = ["BT", "/F1 10 Tf", "13 TL", "50 770 Td"]
+        ops += [f"({_pdf_escape(l)}) '" for l in page_lines]
+        ops.append("ET")
+        stream = zlib.compress("\n".join(ops).encode("latin-1", "replace"))
+        content = add(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % i + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for off in offsets:
+        out.write(b"%010d 00000 n \n" % off)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+# ---------- images ---------- #
+@lru_cache(maxsize=None)
+def image(size: str) -> bytes:
+    """A PNG 'photo of a handout' rendering the first lines of note(size)."""
+    from PIL import Image, ImageDraw
+
+    max_lines = {"small": 25, "medium": 60}.get(size, 120)
+    lines: List[str] = []
+    for para in note(size).splitlines():
+        lines.extend(textwrap.wrap(para, 80) or [""])
+    lines = lines[:max_lines]
+
+    img = Image.new("RGB", (1000, 40 + 16 * len(lines)), "white")
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((20, 20 + 16 * i), line, fill="black")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# ---------- model responses (flashcard parser) ---------- #
+def flashcard_responses() -> Dict[str, str]:
+    qa = " ".join(
+        f"Q: What does concept number {i} in supply and demand describe? "
+        f"A: It describes how buyers and sellers respond to price change number {i}."
+        for i in range(12)
+    )
+    numbered = " ".join(
+        f"{i}. Why does the demand curve slope downward in case {i}? "
+        f"Because of the income and substitution effects in case {i}."
+        for i in range(1, 12)
+    )
+    prose = note("medium")  # no Q/A structure → falls through every pattern
+    return {"qa": qa, "numbered": numbered, "prose": prose}
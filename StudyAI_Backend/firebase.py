@@ -1,36 +1,54 @@
 # firebase.py
 """
 Firestore helpers – save & delete notes + summaries + flashcards.
+
+Every write stamps updatedAt and every delete leaves a document in
+users/{uid}/tombstones, so the mobile client can delta-sync
+(changes_since).  Tombstones carry expireAt for a Firestore TTL policy.
 """
 from __future__ import annotations
 
 import os
 import uuid
-from typing import Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import AlreadyExists
 from utils.auto_google_creds import ensure_google_credentials
 from models.flashcard import Flashcard, FlashcardSet
+from utils.log import get_logger
+from utils.metrics import timed_fn
+from utils.storage import TOMBSTONE_TTL_DAYS, SyncPosition, new_flashcard_set_id, new_note_ids, tombstone_id
 
 load_dotenv()
 
+logger = get_logger("firebase")
+
 # ---------- initialisation ---------- #
-ensure_google_credentials()
+_client = None
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(credentials.Certificate(os.environ["GOOGLE_APPLICATION_CREDENTIALS"]))
 
-db = firestore.client()
+def get_db():
+    """Firestore client, created on first use so importing this module needs no credentials."""
+    global _client
+    if _client is None:
+        ensure_google_credentials()
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(os.environ["GOOGLE_APPLICATION_CREDENTIALS"]))
+        _client = firestore.client()
+    return _client
 
-# ---------- utils ---------- #
-def _sanitize(key: str) -> str:
-    return key.replace(" ", "_").replace("/", "-").strip()
+
+# Firestore limits
+BATCH_WRITE_LIMIT = 500   # operations per WriteBatch
+IN_QUERY_LIMIT    = 30    # values per "in" filter
 
 
 # ---------- public API ---------- #
-def save_note_to_firestore(
+def _note_writes(
     *,
     user_id: str,
     title: str,
@@ -38,87 +56,286 @@ def save_note_to_firestore(
     summary: str,
     source: str,
     summary_type: str = "bullet_points",
-) -> Dict[str, str]:
-    note_id = f"{_sanitize(source)}_{_sanitize(title)}"
-    summary_id = f"{note_id}_{summary_type}_{uuid.uuid4().hex[:8]}"
+    content_hash: str | None = None,
+    upload_hash: str | None = None,
+    summary_id: str | None = None,
+    note_id: str | None = None,
+) -> Tuple[str, str, List[Tuple[str, Any, Dict[str, Any]]]]:
+    """Ids + the (op, ref, data) writes that store one note and its summary."""
+    new_note_id, new_summary_id = new_note_ids(source, title, summary_type)
+    note_id = note_id or new_note_id
+    summary_id = summary_id or new_summary_id
 
-    note_ref = (
-        db.collection("users")
-        .document(user_id)
-        .collection("notes")
-        .document(note_id)
-    )
-    summary_ref = (
-        db.collection("users")
-        .document(user_id)
-        .collection("summaries")
-        .document(summary_id)
-    )
-
-    if note_ref.get().exists:
-        print(f"⚠️ Note {note_id} already exists – skipping write")
-        return {"success": False, "note_id": note_id, "summary_id": summary_id}
-
-    batch = db.batch()
+    user_ref = get_db().collection("users").document(user_id)
     ts = firestore.SERVER_TIMESTAMP
-
-    batch.set(
-        note_ref,
-        {
+    # create() fails the whole batch if the note exists – no separate get() round trip
+    writes = [
+        ("create", user_ref.collection("notes").document(note_id), {
             "name": title,
             "content": content,
             "source": source,
             "createdAt": ts,
+            "updatedAt": ts,
             "noteId": note_id,
-        },
-    )
-    batch.set(
-        summary_ref,
-        {
+            "summaryId": summary_id,
+            "contentHash": content_hash,
+            "uploadHash": upload_hash,
+        }),
+        ("set", user_ref.collection("summaries").document(summary_id), {
             "noteId": note_id,
             "summary": summary,
             "summaryType": summary_type,
             "createdAt": ts,
-        },
+            "updatedAt": ts,
+        }),
+    ]
+    return note_id, summary_id, writes
+
+
+def _stage(batch, writes: List[Tuple[str, Any, Dict[str, Any]]]) -> None:
+    for op, ref, data in writes:
+        getattr(batch, op)(ref, data)
+
+
+def _delete_with_tombstone(batch, user_ref, kind: str, ref) -> None:
+    """Delete `ref` and record the deletion for delta sync (two batch operations)."""
+    batch.delete(ref)
+    batch.set(user_ref.collection("tombstones").document(tombstone_id(kind, ref.id)), {
+        "kind": kind,
+        "id": ref.id,
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+        "expireAt": datetime.now(timezone.utc) + timedelta(days=TOMBSTONE_TTL_DAYS),
+    })
+
+
+@timed_fn("firestore.save_note")
+def save_note_to_firestore(
+    *,
+    user_id: str,
+    title: str,
+    content: str,
+    summary: str,
+    source: str,
+    summary_type: str = "bullet_points",
+    content_hash: str | None = None,
+    upload_hash: str | None = None,
+    summary_id: str | None = None,
+    note_id: str | None = None,
+) -> Dict[str, str]:
+    note_id, summary_id, writes = _note_writes(
+        user_id=user_id,
+        title=title,
+        content=content,
+        summary=summary,
+        source=source,
+        summary_type=summary_type,
+        content_hash=content_hash,
+        upload_hash=upload_hash,
+        summary_id=summary_id,
+        note_id=note_id,
     )
-    batch.commit()
-    print("✅ Firestore write successful.")
+    batch = get_db().batch()
+    _stage(batch, writes)
+    try:
+        batch.commit()
+    except AlreadyExists:
+        logger.warning("Note already exists – skipping write", extra={"note_id": note_id})
+        return {"success": False, "note_id": note_id, "summary_id": summary_id}
+    logger.debug("Saved note", extra={"note_id": note_id, "summary_id": summary_id})
     return {"success": True, "note_id": note_id, "summary_id": summary_id}
 
 
+@timed_fn("firestore.save_notes")
+def save_notes_to_firestore(notes: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Bulk save_note_to_firestore: two writes per note, committed in batches of
+    up to BATCH_WRITE_LIMIT operations.  A batch that hits an existing note
+    is retried note by note, so only that note is skipped.
+    """
+    results: List[Dict[str, str]] = []
+    per_batch = BATCH_WRITE_LIMIT // 2
+    for start in range(0, len(notes), per_batch):
+        chunk = notes[start : start + per_batch]
+        batch = get_db().batch()
+        staged = []
+        for note in chunk:
+            note_id, summary_id, writes = _note_writes(**note)
+            _stage(batch, writes)
+            staged.append({"success": True, "note_id": note_id, "summary_id": summary_id})
+        try:
+            batch.commit()
+        except AlreadyExists:
+            logger.warning("Bulk note batch hit an existing note – writing one by one", extra={"notes": len(chunk)})
+            results.extend(save_note_to_firestore(**note) for note in chunk)
+            continue
+        results.extend(staged)
+    logger.debug("Saved notes", extra={"notes": len(notes)})
+    return results
+
+
+@timed_fn("firestore.find_note_by_hash")
+def find_note_by_hash(
+    user_id: str,
+    *,
+    content_hash: str | None = None,
+    upload_hash: str | None = None,
+) -> Optional[Dict[str, str]]:
+    """
+    Look up an existing note by content hash or raw-upload hash and return
+    its ids + summary, or None.  Used to short-circuit duplicate uploads
+    before any parsing or inference.
+    """
+    field, value = ("contentHash", content_hash) if content_hash else ("uploadHash", upload_hash)
+    if not value:
+        return None
+    try:
+        user_ref = get_db().collection("users").document(user_id)
+        docs = list(user_ref.collection("notes").where(field, "==", value).limit(1).stream())
+        if not docs:
+            return None
+        note = docs[0].to_dict()
+        note_id = note.get("noteId", docs[0].id)
+
+        summary_doc = None
+        if note.get("summaryId"):
+            summary_doc = user_ref.collection("summaries").document(note["summaryId"]).get()
+        else:  # notes written before summaryId was stored on the note
+            hits = list(user_ref.collection("summaries").where("noteId", "==", note_id).limit(1).stream())
+            summary_doc = hits[0] if hits else None
+        if summary_doc is None or not summary_doc.exists:
+            return None
+
+        logger.info("Duplicate note found", extra={"note_id": note_id, "field": field})
+        return {
+            "note_id": note_id,
+            "summary_id": summary_doc.id,
+            "summary": summary_doc.to_dict().get("summary", ""),
+        }
+    except Exception as exc:
+        logger.exception("find_note_by_hash failed")
+        return None
+
+
+@timed_fn("firestore.note_exists")
+def note_exists(user_id: str, note_id: str) -> bool:
+    """Whether the user already has a note with this id (raises on Firestore errors)."""
+    doc = get_db().collection("users").document(user_id).collection("notes").document(note_id).get()
+    return doc.exists
+
+
+@timed_fn("firestore.find_notes_by_hashes")
+def find_notes_by_hashes(user_id: str, content_hashes: List[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Bulk find_note_by_hash(content_hash=…): "in" queries of up to
+    IN_QUERY_LIMIT hashes, then a single get_all() for the summaries.
+    Returns content hash → {note_id, summary_id, summary} for the hits.
+    """
+    found: Dict[str, Dict[str, str]] = {}
+    hashes = list(dict.fromkeys(h for h in content_hashes if h))
+    try:
+        user_ref = get_db().collection("users").document(user_id)
+        notes: Dict[str, Tuple[str, Optional[str]]] = {}
+        for start in range(0, len(hashes), IN_QUERY_LIMIT):
+            query = user_ref.collection("notes").where("contentHash", "in", hashes[start : start + IN_QUERY_LIMIT])
+            for doc in query.stream():
+                note = doc.to_dict()
+                notes.setdefault(note["contentHash"], (note.get("noteId", doc.id), note.get("summaryId")))
+
+        refs = [user_ref.collection("summaries").document(sid) for _, sid in notes.values() if sid]
+        summaries = {snap.id: snap for snap in get_db().get_all(refs)} if refs else {}
+        for h, (note_id, summary_id) in notes.items():
+            if summary_id is None:  # notes written before summaryId was stored on the note
+                hit = find_note_by_hash(user_id, content_hash=h)
+                if hit:
+                    found[h] = hit
+                continue
+            snap = summaries.get(summary_id)
+            if snap is not None and snap.exists:
+                found[h] = {"note_id": note_id, "summary_id": summary_id, "summary": snap.to_dict().get("summary", "")}
+    except Exception as exc:
+        logger.exception("find_notes_by_hashes failed")
+    return found
+
+
+@timed_fn("firestore.delete_summary_and_note")
 def delete_summary_and_note(user_id: str, summary_id: str) -> Dict[str, str | bool]:
     """Atomically delete summary and its linked note."""
     try:
-        print(f"[DEBUG] Deleting summary: user_id={user_id}, summary_id={summary_id}")
         summary_ref = (
-            db.collection("users")
+            get_db().collection("users")
             .document(user_id)
             .collection("summaries")
             .document(summary_id)
         )
         summary_doc = summary_ref.get()
         if not summary_doc.exists:
-            print(f"[DEBUG] Summary not found: {summary_id}")
+            logger.debug("Summary not found", extra={"summary_id": summary_id})
             return {"success": False, "message": "Summary not found"}
         note_id = summary_doc.to_dict().get("noteId")
         note_ref = (
-            db.collection("users")
+            get_db().collection("users")
             .document(user_id)
             .collection("notes")
             .document(note_id)
         )
-        batch = db.batch()
-        batch.delete(summary_ref)
-        batch.delete(note_ref)
+        user_ref = get_db().collection("users").document(user_id)
+        batch = get_db().batch()
+        _delete_with_tombstone(batch, user_ref, "summaries", summary_ref)
+        _delete_with_tombstone(batch, user_ref, "notes", note_ref)
         batch.commit()
-        print(f"[DEBUG] Deleted summary: {summary_id} and note: {note_id}")
+        logger.debug("Deleted summary and note", extra={"summary_id": summary_id, "note_id": note_id})
         return {"success": True, "message": "Deleted", "note_id": note_id}
     except Exception as exc:
-        print(f"[DEBUG] Exception in delete_summary_and_note: {exc}")
+        logger.exception("delete_summary_and_note failed")
         return {"success": False, "message": str(exc)}
 
 
+@timed_fn("firestore.delete_summaries_and_notes")
+def delete_summaries_and_notes(user_id: str, summary_ids: List[str]) -> Dict[str, Dict[str, str | bool]]:
+    """
+    Bulk delete_summary_and_note: one get_all() for the summaries (to learn
+    their note ids), then the summary + note deletes (and their tombstones)
+    in batches of up to BATCH_WRITE_LIMIT operations.  Each pair stays in
+    one batch, so a summary is never deleted without its note.  Returns
+    summary id → result.
+    """
+    ids = list(dict.fromkeys(summary_ids))
+    results: Dict[str, Dict[str, str | bool]] = {
+        summary_id: {"success": False, "message": "Summary not found"} for summary_id in ids
+    }
+    try:
+        user_ref = get_db().collection("users").document(user_id)
+        pairs: List[Tuple[Any, Optional[str]]] = []   # (summary ref, note id)
+        for start in range(0, len(ids), BATCH_WRITE_LIMIT):
+            refs = [user_ref.collection("summaries").document(sid) for sid in ids[start : start + BATCH_WRITE_LIMIT]]
+            pairs += [(snap.reference, snap.to_dict().get("noteId")) for snap in get_db().get_all(refs) if snap.exists]
+    except Exception as exc:
+        logger.exception("delete_summaries_and_notes failed")
+        return {summary_id: {"success": False, "message": str(exc)} for summary_id in ids}
+
+    per_batch = BATCH_WRITE_LIMIT // 4
+    for start in range(0, len(pairs), per_batch):
+        chunk = pairs[start : start + per_batch]
+        batch = get_db().batch()
+        for summary_ref, note_id in chunk:
+            _delete_with_tombstone(batch, user_ref, "summaries", summary_ref)
+            if note_id:
+                _delete_with_tombstone(batch, user_ref, "notes", user_ref.collection("notes").document(note_id))
+        try:
+            batch.commit()
+        except Exception as exc:
+            logger.exception("delete_summaries_and_notes batch failed")
+            results.update({ref.id: {"success": False, "message": str(exc)} for ref, _ in chunk})
+            continue
+        results.update({
+            ref.id: {"success": True, "message": "Deleted", "note_id": note_id} for ref, note_id in chunk
+        })
+    logger.debug("Deleted summaries and notes", extra={"requested": len(ids), "found": len(pairs)})
+    return results
+
+
 # ---------- flashcard functions ---------- #
+@timed_fn("firestore.save_flashcard_set")
 def save_flashcard_set_to_firestore(
     *,
     user_id: str,
@@ -126,9 +343,10 @@ def save_flashcard_set_to_firestore(
     flashcards: List[Flashcard],
     note_id: str = None,
     note_title: str = None,
+    set_id: str | None = None,
 ) -> Dict[str, str]:
     """Save a flashcard set to Firestore."""
-    set_id = f"flashcard_set_{_sanitize(set_name)}_{uuid.uuid4().hex[:8]}"
+    set_id = set_id or new_flashcard_set_id(set_name)
     
     # Convert flashcards to dict format for Firestore
     flashcard_data = []
@@ -140,37 +358,39 @@ def save_flashcard_set_to_firestore(
         })
     
     set_ref = (
-        db.collection("users")
+        get_db().collection("users")
         .document(user_id)
         .collection("flashcardSets")
         .document(set_id)
     )
     
-    if set_ref.get().exists:
-        print(f"⚠️ Flashcard set {set_id} already exists – skipping write")
-        return {"success": False, "set_id": set_id}
-    
     ts = firestore.SERVER_TIMESTAMP
     
-    set_ref.set({
-        "name": set_name,
-        "userId": user_id,
-        "noteId": note_id,
-        "noteTitle": note_title,
-        "flashcards": flashcard_data,
-        "createdAt": ts,
-        "setId": set_id,
-    })
+    try:
+        set_ref.create({
+            "name": set_name,
+            "userId": user_id,
+            "noteId": note_id,
+            "noteTitle": note_title,
+            "flashcards": flashcard_data,
+            "createdAt": ts,
+            "updatedAt": ts,
+            "setId": set_id,
+        })
+    except AlreadyExists:
+        logger.warning("Flashcard set already exists – skipping write", extra={"set_id": set_id})
+        return {"success": False, "set_id": set_id}
     
-    print("✅ Flashcard set saved to Firestore.")
+    logger.debug("Saved flashcard set", extra={"set_id": set_id})
     return {"success": True, "set_id": set_id}
 
 
+@timed_fn("firestore.get_user_flashcard_sets")
 def get_user_flashcard_sets(user_id: str) -> List[Dict]:
     """Get all flashcard sets for a user."""
     try:
         sets_ref = (
-            db.collection("users")
+            get_db().collection("users")
             .document(user_id)
             .collection("flashcardSets")
         )
@@ -196,15 +416,16 @@ def get_user_flashcard_sets(user_id: str) -> List[Dict]:
         sets.sort(key=lambda x: x.get("createdAt", ""), reverse=True)
         return sets
     except Exception as exc:
-        print(f"[DEBUG] Exception in get_user_flashcard_sets: {exc}")
+        logger.exception("get_user_flashcard_sets failed")
         return []
 
 
+@timed_fn("firestore.get_flashcard_set")
 def get_flashcard_set(user_id: str, set_id: str) -> Dict:
     """Get a specific flashcard set."""
     try:
         set_ref = (
-            db.collection("users")
+            get_db().collection("users")
             .document(user_id)
             .collection("flashcardSets")
             .document(set_id)
@@ -214,50 +435,116 @@ def get_flashcard_set(user_id: str, set_id: str) -> Dict:
         if not doc.exists:
             return {"success": False, "message": "Flashcard set not found"}
         
-        data = doc.to_dict()
-        created_at = data.get("createdAt")
-        # Convert Firestore timestamp to ISO string
-        if hasattr(created_at, "isoformat"):
-            created_at = created_at.isoformat()
-        elif created_at is not None:
-            created_at = str(created_at)
+        return _flashcard_set_dict(doc.to_dict())
+    except Exception as exc:
+        logger.exception("get_flashcard_set failed")
+        return {"success": False, "message": str(exc)}
+
+
+def _flashcard_set_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    created_at = data.get("createdAt")
+    # Convert Firestore timestamp to ISO string
+    if hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    elif created_at is not None:
+        created_at = str(created_at)
+    return {
+        "success": True,
+        "id": data.get("setId"),
+        "name": data.get("name"),
+        "noteId": data.get("noteId"),
+        "noteTitle": data.get("noteTitle"),
+        "flashcards": data.get("flashcards", []),
+        "createdAt": created_at,
+    }
+
+
+@timed_fn("firestore.get_flashcard_sets")
+def get_flashcard_sets(user_id: str, set_ids: List[str]) -> Dict[str, Dict]:
+    """Bulk get_flashcard_set: one get_all() per BATCH_WRITE_LIMIT ids.  Returns set id → result."""
+    ids = list(dict.fromkeys(set_ids))
+    try:
+        sets_ref = get_db().collection("users").document(user_id).collection("flashcardSets")
+        results: Dict[str, Dict] = {}
+        for start in range(0, len(ids), BATCH_WRITE_LIMIT):
+            refs = [sets_ref.document(set_id) for set_id in ids[start : start + BATCH_WRITE_LIMIT]]
+            for snap in get_db().get_all(refs):
+                if snap.exists:
+                    results[snap.id] = _flashcard_set_dict(snap.to_dict())
         return {
-            "success": True,
-            "id": data.get("setId"),
-            "name": data.get("name"),
-            "noteId": data.get("noteId"),
-            "noteTitle": data.get("noteTitle"),
-            "flashcards": data.get("flashcards", []),
-            "createdAt": created_at,
+            set_id: results.get(set_id, {"success": False, "message": "Flashcard set not found"})
+            for set_id in ids
         }
     except Exception as exc:
-        print(f"[DEBUG] Exception in get_flashcard_set: {exc}")
-        return {"success": False, "message": str(exc)}
+        logger.exception("get_flashcard_sets failed")
+        return {set_id: {"success": False, "message": str(exc)} for set_id in ids}
 
 
+@timed_fn("firestore.delete_flashcard_set")
 def delete_flashcard_set(user_id: str, set_id: str) -> Dict[str, str | bool]:
     """Delete a flashcard set."""
     try:
-        print(f"[DEBUG] Deleting flashcard set: user_id={user_id}, set_id={set_id}")
         set_ref = (
-            db.collection("users")
+            get_db().collection("users")
             .document(user_id)
             .collection("flashcardSets")
             .document(set_id)
         )
         
         if not set_ref.get().exists:
-            print(f"[DEBUG] Flashcard set not found: {set_id}")
+            logger.debug("Flashcard set not found", extra={"set_id": set_id})
             return {"success": False, "message": "Flashcard set not found"}
         
-        set_ref.delete()
-        print(f"[DEBUG] Deleted flashcard set: {set_id}")
+        batch = get_db().batch()
+        _delete_with_tombstone(batch, get_db().collection("users").document(user_id), "flashcard_sets", set_ref)
+        batch.commit()
+        logger.debug("Deleted flashcard set", extra={"set_id": set_id})
         return {"success": True, "message": "Deleted"}
     except Exception as exc:
-        print(f"[DEBUG] Exception in delete_flashcard_set: {exc}")
+        logger.exception("delete_flashcard_set failed")
         return {"success": False, "message": str(exc)}
 
 
+@timed_fn("firestore.delete_flashcard_sets")
+def delete_flashcard_sets(user_id: str, set_ids: List[str]) -> Dict[str, Dict[str, str | bool]]:
+    """
+    Bulk delete_flashcard_set: get_all() to find which sets exist, then
+    batched deletes (plus tombstones) of up to BATCH_WRITE_LIMIT operations.
+    Returns set id → result.
+    """
+    ids = list(dict.fromkeys(set_ids))
+    results: Dict[str, Dict[str, str | bool]] = {
+        set_id: {"success": False, "message": "Flashcard set not found"} for set_id in ids
+    }
+    try:
+        user_ref = get_db().collection("users").document(user_id)
+        sets_ref = user_ref.collection("flashcardSets")
+        found = []
+        for start in range(0, len(ids), BATCH_WRITE_LIMIT):
+            refs = [sets_ref.document(set_id) for set_id in ids[start : start + BATCH_WRITE_LIMIT]]
+            found += [snap.reference for snap in get_db().get_all(refs) if snap.exists]
+    except Exception as exc:
+        logger.exception("delete_flashcard_sets failed")
+        return {set_id: {"success": False, "message": str(exc)} for set_id in ids}
+
+    per_batch = BATCH_WRITE_LIMIT // 2
+    for start in range(0, len(found), per_batch):
+        chunk = found[start : start + per_batch]
+        batch = get_db().batch()
+        for ref in chunk:
+            _delete_with_tombstone(batch, user_ref, "flashcard_sets", ref)
+        try:
+            batch.commit()
+        except Exception as exc:
+            logger.exception("delete_flashcard_sets batch failed")
+            results.update({ref.id: {"success": False, "message": str(exc)} for ref in chunk})
+            continue
+        results.update({ref.id: {"success": True, "message": "Deleted"} for ref in chunk})
+    logger.debug("Deleted flashcard sets", extra={"requested": len(ids), "found": len(found)})
+    return results
+
+
+@timed_fn("firestore.update_flashcard_set")
 def update_flashcard_set(
     user_id: str, 
     set_id: str, 
@@ -266,7 +553,7 @@ def update_flashcard_set(
     """Update a flashcard set with new flashcards."""
     try:
         set_ref = (
-            db.collection("users")
+            get_db().collection("users")
             .document(user_id)
             .collection("flashcardSets")
             .document(set_id)
@@ -286,10 +573,99 @@ def update_flashcard_set(
         
         set_ref.update({
             "flashcards": flashcard_data,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
         })
         
-        print(f"[DEBUG] Updated flashcard set: {set_id}")
+        logger.debug("Updated flashcard set", extra={"set_id": set_id})
         return {"success": True, "message": "Updated"}
     except Exception as exc:
-        print(f"[DEBUG] Exception in update_flashcard_set: {exc}")
+        logger.exception("update_flashcard_set failed")
         return {"success": False, "message": str(exc)}
+
+
+# ---------- delta sync ---------- #
+_SYNC_COLLECTIONS = {
+    "notes": "notes",
+    "summaries": "summaries",
+    "flashcard_sets": "flashcardSets",
+    "tombstones": "tombstones",
+}
+
+# kind → stored field → record field
+_SYNC_FIELDS = {
+    "notes": {"name": "name", "content": "content", "source": "source", "summaryId": "summaryId"},
+    "summaries": {"noteId": "noteId", "summary": "summary", "summaryType": "summaryType"},
+    "flashcard_sets": {"name": "name", "noteId": "noteId", "noteTitle": "noteTitle", "flashcards": "flashcards"},
+    "tombstones": {"kind": "kind", "id": "id"},
+}
+
+
+def _us(ts: datetime) -> int:
+    return int(ts.timestamp()) * 1_000_000 + ts.microsecond
+
+
+def _from_us(us: int) -> datetime:
+    return datetime.fromtimestamp(us // 1_000_000, timezone.utc).replace(microsecond=us % 1_000_000)
+
+
+@timed_fn("firestore.changes_since")
+def changes_since(
+    user_id: str, kind: str, after: Optional[SyncPosition], limit: int
+) -> List[Tuple[int, str, Dict[str, Any]]]:
+    """
+    One indexed range read: documents of `kind` ordered by (updatedAt, id),
+    starting after the client's position.  Reads scale with the number of
+    changes, not the size of the library.
+    """
+    coll = get_db().collection("users").document(user_id).collection(_SYNC_COLLECTIONS[kind])
+    doc_id = firestore.FieldPath.document_id()
+    query = coll.order_by("updatedAt").order_by(doc_id).limit(limit)
+    if after is not None:
+        query = query.start_after({"updatedAt": _from_us(after[0]), doc_id: coll.document(after[1])})
+
+    changes = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        updated_at = data["updatedAt"]
+        record = {out: data.get(field) for field, out in _SYNC_FIELDS[kind].items()}
+        if kind != "tombstones":
+            created_at = data.get("createdAt")
+            record = {
+                "id": doc.id,
+                **record,
+                "createdAt": _us(created_at) // 1000 if hasattr(created_at, "timestamp") else None,
+                "updatedAt": _us(updated_at) // 1000,
+            }
+        changes.append((_us(updated_at), doc.id, record))
+    return changes
+
+
+@timed_fn("firestore.backfill_updated_at")
+def backfill_updated_at(user_id: str) -> None:
+    """
+    Stamp updatedAt (= createdAt) on documents written before delta sync,
+    which range queries on updatedAt would otherwise never return.  Runs
+    once per user; the user document remembers that it's done.
+    """
+    user_ref = get_db().collection("users").document(user_id)
+    snap = user_ref.get()
+    if snap.exists and (snap.to_dict() or {}).get("syncBackfilled"):
+        return
+    stamped = 0
+    for kind in ("notes", "summaries", "flashcard_sets"):
+        batch, staged = get_db().batch(), 0
+        for doc in user_ref.collection(_SYNC_COLLECTIONS[kind]).select(["createdAt", "updatedAt"]).stream():
+            data = doc.to_dict()
+            if data.get("updatedAt") is not None:
+                continue
+            batch.update(doc.reference, {"updatedAt": data.get("createdAt") or firestore.SERVER_TIMESTAMP})
+            staged += 1
+            if staged == BATCH_WRITE_LIMIT:
+                batch.commit()
+                stamped += staged
+                batch, staged = get_db().batch(), 0
+        if staged:
+            batch.commit()
+            stamped += staged
+    user_ref.set({"syncBackfilled": True}, merge=True)
+    logger.info("Backfilled updatedAt for delta sync", extra={"user_id": user_id, "documents": stamped})
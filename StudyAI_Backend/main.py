@@ -6,8 +6,11 @@ FastAPI entry-point for StudyAI backend.
 """
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Any, Dict, List
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from fastapi import (
     Body,
@@ -19,28 +22,41 @@ from fastapi import (
     UploadFile,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from models.note import NoteRequest
 from models.flashcard import FlashcardGenerationRequest, Flashcard
-from services.summarizer_service import SummarizerService
+from services.admission import AdmissionRejected, get_admission
+from services.summarizer_service import PartialSummary, SummarizerService
 from services.flashcard_service import FlashcardService
-from services.parser import extract_text_from_image
-from services.pdf_parser import extract_text_from_pdf
-from firebase import (
-    delete_summary_and_note, 
-    save_note_to_firestore,
-    save_flashcard_set_to_firestore,
-    get_user_flashcard_sets,
-    get_flashcard_set,
-    delete_flashcard_set,
-    update_flashcard_set
-)
-from utils.auto_google_creds import ensure_google_credentials
+from services.parser import OCR_SETTINGS, extract_text_from_image
+from services.pdf_parser import PDF_SETTINGS, extract_text_from_pdf
+from services.search_index import INDEXED_KINDS, SEARCH_INDEX, SearchIndex, make_embedder
+from utils.deadline import DEADLINE_HEADER, Deadline, DeadlineExceeded, deadline_var, watch_disconnect
+from utils.extraction_cache import cached_extract, get_extraction_cache
+from utils.hashing import bytes_hash, content_hash, request_key
+from utils.log import get_logger, new_request_id, request_id_var, span
+from utils.metrics import HTTP_REQUEST_SECONDS, REGISTRY, Gauge, run_in_executor, timed
+from utils.singleflight import SingleFlight
+from utils.storage import get_storage, new_flashcard_set_id, new_note_ids
+from utils.serialization import dumps, encoded
+from utils.sync import SYNC_PAGE_LIMIT, InvalidCursor, collect as collect_changes
+from utils.write_behind import WRITE_BEHIND, WriteBehindQueue
 
 # ---------- bootstrap ---------- #
-ensure_google_credentials()
+logger = get_logger("api")
+
+SUMMARIZE_BATCH_MAX_ITEMS = int(os.getenv("SUMMARIZE_BATCH_MAX_ITEMS", "500"))
+BATCH_DEADLINE_PER_ITEM_S = float(os.getenv("SUMMARIZE_BATCH_DEADLINE_PER_ITEM_SECONDS", "30"))
+BATCH_DEADLINE_MAX_S      = float(os.getenv("SUMMARIZE_BATCH_DEADLINE_MAX_SECONDS", "7200"))  # 0 = uncapped
+BULK_WRITE_SIZE           = int(os.getenv("BULK_WRITE_SIZE", "100"))   # notes per bulk storage write
+BULK_MAX_IDS              = int(os.getenv("BULK_MAX_IDS", "1000"))     # ids per bulk fetch/delete call
 
 app = FastAPI()
 
+# Identical requests arriving while one is still running (client retries,
+# double-taps) attach to the in-flight work instead of starting their own.
+_flights = SingleFlight()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -50,12 +66,191 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Tag the request with an id (X-Request-ID) and a deadline (X-Request-Timeout
+    seconds, else REQUEST_DEADLINE_SECONDS), open its root span, record latency.
+    """
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    deadline_token = deadline_var.set(Deadline.from_header(request.headers.get(DEADLINE_HEADER)))
+    start = time.perf_counter()
+    status = 500
+    try:
+        with span("http.request", method=request.method, path=request.url.path):
+            response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        deadline_var.reset(deadline_token)
+        request_id_var.reset(token)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    """Over-budget jobs: 413 (too large for any mode) or 429 (user budget, retry later)."""
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": str(exc), "success": False, "retry_after": exc.retry_after},
+        headers=headers,
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    """Deadline passed (or client left) before any section / card set finished."""
+    return JSONResponse(
+        status_code=504,
+        content={"error": f"Request cancelled: {exc}.", "success": False},
+    )
+
+
+@app.on_event("startup")
+async def init_storage() -> None:
+    get_storage()
+
+
 @app.on_event("startup")
 async def load_model() -> None:
     app.state.summarizer = SummarizerService()
     app.state.flashcard_service = FlashcardService(app.state.summarizer)
 
 
+@app.on_event("startup")
+async def start_search_index() -> None:
+    app.state.search_index = None
+    if SEARCH_INDEX:
+        app.state.search_index = SearchIndex(make_embedder(app.state.summarizer))
+        app.state.search_index.start()
+
+
+def _index_changed(user_id: str) -> None:
+    """A note or summary was saved/deleted: let the search index catch up in the background."""
+    if app.state.search_index is not None:
+        app.state.search_index.mark_changed(user_id)
+
+
+# ---------- write-behind persistence ---------- #
+def _flush_notes(payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results = get_storage().save_notes(payloads)
+    for user_id in {payload["user_id"] for payload in payloads}:
+        _index_changed(user_id)
+    return results
+
+
+def _flush_flashcard_sets(payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results = []
+    for payload in payloads:
+        payload["flashcards"] = [Flashcard(**card) for card in payload["flashcards"]]
+        results.append(get_storage().save_flashcard_set(**payload))
+    return results
+
+
+def _queued_note(payload: Dict[str, Any]) -> Dict[str, str]:
+    return {"note_id": payload.get("note_id", ""), "summary_id": payload.get("summary_id", ""),
+            "summary": payload["summary"]}
+
+
+def _find_note(
+    request: Request,
+    user_id: str,
+    *,
+    content_hash: str | None = None,
+    upload_hash: str | None = None,
+) -> Optional[Dict[str, str]]:
+    """
+    find_note_by_hash, counting notes still waiting in the write-behind queue.
+    The queue is asked first: a job leaves it only after its note is stored,
+    so a note being flushed meanwhile is found in one place or the other.
+    """
+    queue: WriteBehindQueue | None = request.app.state.write_queue
+    if queue is not None:
+        queued = queue.pending("save_note", user_id, content_hash=content_hash, upload_hash=upload_hash)
+        if queued:
+            return _queued_note(queued)
+    return get_storage().find_note_by_hash(user_id, content_hash=content_hash, upload_hash=upload_hash)
+
+
+@app.on_event("startup")
+async def start_write_queue() -> None:
+    app.state.write_queue = None
+    if WRITE_BEHIND:
+        app.state.write_queue = WriteBehindQueue(
+            handlers={
+                "save_note": _flush_notes,
+                "save_flashcard_set": _flush_flashcard_sets,
+            }
+        )
+        app.state.write_queue.start()
+
+
+# ---------- metrics ---------- #
+def _register_gauges() -> None:
+    def queue_metric(name: str):
+        return lambda: app.state.write_queue.metrics()[name]
+
+    def cache_metric(name: str):
+        return lambda: get_extraction_cache().stats()[name]
+
+    gauges = [
+        Gauge("studyai_batch_padding_efficiency", "Share of padded batch tokens that are real input.",
+              fn=lambda: app.state.summarizer.batch_stats.padding_efficiency),
+        Gauge("studyai_singleflight_coalesced_total", "Requests served by an identical in-flight request.",
+              fn=lambda: _flights.followers),
+        Gauge("studyai_singleflight_in_flight", "Distinct request computations currently running.",
+              fn=_flights.in_flight),
+        Gauge("studyai_fair_queue_depth", "Generate calls waiting for an inference slot.",
+              fn=get_admission().scheduler.depth),
+    ]
+    if app.state.write_queue is not None:
+        gauges += [
+            Gauge("studyai_write_queue_depth", "Jobs waiting in the write-behind journal.", fn=queue_metric("depth")),
+            Gauge("studyai_write_queue_lag_seconds", "Age of the oldest unflushed write.", fn=queue_metric("lag_seconds")),
+            Gauge("studyai_write_queue_dead", "Writes parked after exhausting retries.", fn=queue_metric("dead")),
+        ]
+    if get_extraction_cache() is not None:
+        gauges += [
+            Gauge("studyai_extraction_cache_hit_rate", "Extraction cache hit rate (this process).", fn=cache_metric("hit_rate")),
+            Gauge("studyai_extraction_cache_bytes", "Extraction cache size on disk.", fn=cache_metric("bytes")),
+        ]
+    for gauge in gauges:
+        REGISTRY.register(gauge)
+
+
+@app.on_event("startup")
+async def register_gauges() -> None:
+    _register_gauges()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint: stage / request histograms, token counters, queue gauges."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("shutdown")
+async def stop_write_queue() -> None:
+    if app.state.write_queue is not None:
+        app.state.write_queue.stop()
+
+
+@app.on_event("shutdown")
+async def stop_search_index() -> None:
+    if app.state.search_index is not None:
+        app.state.search_index.stop()
+
+
 # ---------- helper ---------- #
 async def _process_and_save(
     *,
@@ -65,25 +260,118 @@ async def _process_and_save(
     title: str,
     source: str,
     summary_type: str,
+    upload_hash: str | None = None,
+) -> Dict[str, Any]:
+    """Summarise + persist once per (user, content, params) even under retries."""
+    key = request_key("note", user_id, title, source, summary_type, content_hash(content, normalize=False))
+    return await _flights.do(
+        key,
+        lambda: _summarize_and_save(
+            request=request,
+            content=content,
+            user_id=user_id,
+            title=title,
+            source=source,
+            summary_type=summary_type,
+            upload_hash=upload_hash,
+        ),
+    )
+
+
+def _duplicate_response(existing: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "summary": existing["summary"],
+        "summary_id": existing["summary_id"],
+        "note_id": existing["note_id"],
+        "success": True,
+        "duplicate": True,
+    }
+
+
+def _enqueue_notes(queue: WriteBehindQueue, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Write-behind save_notes: journal each note under its final ids and
+    answer as the direct write would – a title the user already has (stored
+    or still queued) is refused.  Blocking (fsync, storage lookup): run it
+    in the executor.
+    """
+    results = []
+    for kwargs in notes:
+        user_id = kwargs["user_id"]
+        note_id, summary_id = new_note_ids(kwargs["source"], kwargs["title"], kwargs["summary_type"])
+        job = queue.enqueue(
+            "save_note",
+            dict(kwargs, summary_id=summary_id, note_id=note_id),
+            key=f"{user_id}/{note_id}",
+            taken=lambda: get_storage().note_exists(user_id, note_id),
+        )
+        results.append({"success": job is not None, "note_id": note_id, "summary_id": summary_id, "queued": True})
+    return results
+
+
+async def _summarize_and_save(
+    *,
+    request: Request,
+    content: str,
+    user_id: str,
+    title: str,
+    source: str,
+    summary_type: str,
+    upload_hash: str | None = None,
 ) -> Dict[str, Any]:
     if not content.strip():
         return {"error": "Content is empty.", "success": False}
 
+    with timed("note.dedup_lookup"):
+        note_hash = content_hash(content)
+        existing = _find_note(request, user_id, content_hash=note_hash)
+    if existing:
+        return _duplicate_response(existing)
+
     svc: SummarizerService = request.app.state.summarizer
-    summary = await svc.summarize(content, academic=True)
+    with timed("note.summarize"):
+        summary = await svc.summarize(content, academic=True, user_id=user_id)
+
+    if isinstance(summary, PartialSummary):
+        # Not persisted: a retry with more time should produce (and save) the full summary
+        return {
+            "summary": str(summary),
+            "success": True,
+            "partial": True,
+            "chunks_completed": summary.chunks_completed,
+            "chunks_total": summary.chunks_total,
+            "sections_completed": summary.sections_completed,
+            "sections_total": summary.sections_total,
+        }
 
     if len(summary.strip()) < 10:
         return {"error": "Summary too short – probably invalid input.", "success": False}
 
-    save_res = save_note_to_firestore(
-        user_id=user_id,
-        title=title,
-        content=content,
-        summary=summary,
-        source=source,
-        summary_type=summary_type,
-    )
-    
+    queue: WriteBehindQueue | None = request.app.state.write_queue
+    if queue is not None:
+        [save_res] = await run_in_executor("write_behind.enqueue", _enqueue_notes, queue, [dict(
+            user_id=user_id,
+            title=title,
+            content=content,
+            summary=summary,
+            source=source,
+            summary_type=summary_type,
+            content_hash=note_hash,
+            upload_hash=upload_hash,
+        )])
+    else:
+        with timed("note.persist"):
+            save_res = get_storage().save_note(
+                user_id=user_id,
+                title=title,
+                content=content,
+                summary=summary,
+                source=source,
+                summary_type=summary_type,
+                content_hash=note_hash,
+                upload_hash=upload_hash,
+            )
+
     if not save_res["success"]:
         return {
             "warning": "Note already existed.", 
@@ -92,6 +380,10 @@ async def _process_and_save(
             "note_id": save_res.get("note_id", "")
         }
 
+    if save_res.get("queued"):  # indexed once the flusher has written it
+        return {"summary": summary, "summary_id": save_res["summary_id"], "note_id": save_res["note_id"],
+                "success": True, "queued": True}
+    _index_changed(user_id)
     return {
         "summary": summary, 
         "summary_id": save_res.get("summary_id", ""), 
@@ -108,14 +400,15 @@ def welcome():
 
 @app.post("/summarize_text")
 async def summarize_text_handler(request: Request, note: NoteRequest = Body(...)):
-    return await _process_and_save(
-        request=request,
-        content=note.content,
-        user_id=note.user_id,
-        title=note.title,
-        source=note.source,
-        summary_type="detailed",
-    )
+    async with watch_disconnect(request, deadline_var.get()):
+        return encoded(request, await _process_and_save(
+            request=request,
+            content=note.content,
+            user_id=note.user_id,
+            title=note.title,
+            source=note.source,
+            summary_type="detailed",
+        ))
 
 
 @app.post("/summarize_raw")
@@ -126,14 +419,198 @@ async def summarize_raw_text(
     title: str = Form(...),
     summary_type: str = Form("detailed"),
 ):
-    return await _process_and_save(
-        request=request,
-        content=content,
-        user_id=user_id,
-        title=title,
-        source="text",
-        summary_type=summary_type,
+    async with watch_disconnect(request, deadline_var.get()):
+        return encoded(request, await _process_and_save(
+            request=request,
+            content=content,
+            user_id=user_id,
+            title=title,
+            source="text",
+            summary_type=summary_type,
+        ))
+
+
+# ---------- batch summarisation ---------- #
+def _ndjson(index: int, payload: Dict[str, Any]) -> str:
+    return dumps({"index": index, **payload}).decode() + "\n"
+
+
+def _batch_error(exc: Exception) -> Dict[str, Any]:
+    if isinstance(exc, AdmissionRejected):
+        return {"error": str(exc), "success": False, "status": exc.status_code, "retry_after": exc.retry_after}
+    if isinstance(exc, DeadlineExceeded):
+        return {"error": f"Request cancelled: {exc}.", "success": False, "status": 504}
+    return {"error": f"Failed to summarize: {exc}", "success": False, "status": 500}
+
+
+async def _batch_lines(request: Request, notes: List[NoteRequest], deadline: Deadline) -> AsyncIterator[str]:
+    """
+    NDJSON body of /summarize_batch.  Order of work:
+      1. empty notes and in-batch duplicates (same user + content) are
+         answered without inference – a copy gets its original's result
+      2. one bulk hash lookup per user answers notes already stored (or queued)
+      3. the rest go through SummarizerService.summarize_many as one job,
+         so chunks of every user's notes share batches
+      4. finished summaries are written with save_notes() in bulk – every
+         result ready at that moment, up to BULK_WRITE_SIZE per write
+    """
+    deadline_var.set(deadline)   # the batch's own budget, not the interactive one
+    svc: SummarizerService = request.app.state.summarizer
+    queue: WriteBehindQueue | None = request.app.state.write_queue
+    hashes = [content_hash(note.content) for note in notes]
+    copies: Dict[int, List[int]] = defaultdict(list)
+
+    def emit(index: int, payload: Dict[str, Any]) -> List[str]:
+        lines = [_ndjson(index, payload)]
+        for copy in copies.get(index, []):
+            lines.append(_ndjson(copy, {**payload, "duplicate": True, "duplicate_of": index}))
+        return lines
+
+    # 1. empty + in-batch duplicates
+    first: Dict[Tuple[str, str], int] = {}
+    todo: Dict[str, List[int]] = defaultdict(list)   # user → note indexes (dedup is per user)
+    for i, note in enumerate(notes):
+        if not note.content.strip():
+            yield _ndjson(i, {"error": "Content is empty.", "success": False})
+            continue
+        key = (note.user_id, hashes[i])
+        if key in first:
+            copies[first[key]].append(i)
+            continue
+        first[key] = i
+        todo[note.user_id].append(i)
+
+    # 2. already stored
+    with timed("batch.dedup_lookup"):
+        for user_id, indexes in todo.items():
+            wanted = [hashes[i] for i in indexes]
+            existing = {}
+            if queue is not None:   # queue first, as in _find_note
+                existing = {h: _queued_note(p) for h, p in queue.pending_by_hashes("save_note", user_id, wanted).items()}
+            rest = [h for h in wanted if h not in existing]
+            if rest:
+                existing.update(get_storage().find_notes_by_hashes(user_id, rest))
+            for i in indexes:
+                if hashes[i] in existing:
+                    for line in emit(i, _duplicate_response(existing[hashes[i]])):
+                        yield line
+            todo[user_id] = [i for i in indexes if hashes[i] not in existing]
+
+    # 3. summarise, the whole batch as one job
+    done: asyncio.Queue = asyncio.Queue()
+    indexes = sorted(i for idx in todo.values() for i in idx)
+
+    async def run() -> None:
+        reported = set()
+        try:
+            async for k, result in svc.summarize_many(
+                [notes[i].content for i in indexes], [notes[i].user_id for i in indexes]
+            ):
+                reported.add(k)
+                await done.put((indexes[k], result))
+        except Exception as exc:
+            logger.exception("summarize_batch job failed", extra={"notes": len(indexes)})
+            for k, i in enumerate(indexes):
+                if k not in reported:
+                    await done.put((i, exc))
+
+    runners = [asyncio.ensure_future(run())] if indexes else []
+    expected = len(indexes)
+
+    # 4. persist + stream
+    async def persist(ready: List[Tuple[int, Any]]) -> List[str]:
+        lines: List[str] = []
+        writes: List[Tuple[int, Dict[str, Any]]] = []
+        for i, result in ready:
+            note = notes[i]
+            if isinstance(result, Exception):
+                lines += emit(i, _batch_error(result))
+            elif isinstance(result, PartialSummary):
+                lines += emit(i, {  # not persisted, as in _summarize_and_save
+                    "summary": str(result),
+                    "success": True,
+                    "partial": True,
+                    "chunks_completed": result.chunks_completed,
+                    "chunks_total": result.chunks_total,
+                    "sections_completed": result.sections_completed,
+                    "sections_total": result.sections_total,
+                })
+            elif len(result.strip()) < 10:
+                lines += emit(i, {"error": "Summary too short – probably invalid input.", "success": False})
+            else:
+                writes.append((i, dict(
+                    user_id=note.user_id,
+                    title=note.title,
+                    content=note.content,
+                    summary=result,
+                    source=note.source,
+                    summary_type="detailed",
+                    content_hash=hashes[i],
+                )))
+        if not writes:
+            return lines
+        try:
+            if queue is not None:
+                saved = await run_in_executor("write_behind.enqueue", _enqueue_notes, queue,
+                                              [kwargs for _, kwargs in writes])
+            else:
+                with timed("batch.persist"):
+                    saved = get_storage().save_notes([kwargs for _, kwargs in writes])
+        except Exception as exc:
+            # keep the stream going; the finished summaries go back to the client unsaved
+            logger.exception("summarize_batch save failed", extra={"notes": len(writes)})
+            for i, kwargs in writes:
+                lines += emit(i, {"error": f"Failed to save note: {exc}", "success": False, "status": 500,
+                                  "summary": kwargs["summary"]})
+            return lines
+        if queue is None:  # queued notes are indexed once the flusher has written them
+            for user_id in {kwargs["user_id"] for _, kwargs in writes}:
+                _index_changed(user_id)
+        for (i, kwargs), res in zip(writes, saved):
+            if res["success"]:
+                lines += emit(i, {"summary": kwargs["summary"], "summary_id": res["summary_id"],
+                                  "note_id": res["note_id"], "success": True,
+                                  **({"queued": True} if res.get("queued") else {})})
+            else:
+                lines += emit(i, {"warning": "Note already existed.", "success": False,
+                                  "summary_id": res.get("summary_id", ""), "note_id": res.get("note_id", "")})
+        return lines
+
+    try:
+        async with watch_disconnect(request, deadline_var.get()):
+            received = 0
+            while received < expected:
+                ready = [await done.get()]
+                while not done.empty() and len(ready) < BULK_WRITE_SIZE:
+                    ready.append(done.get_nowait())
+                received += len(ready)
+                for line in await persist(ready):
+                    yield line
+    finally:
+        for runner in runners:
+            runner.cancel()
+
+
+@app.post("/summarize_batch")
+async def summarize_batch(request: Request, notes: List[NoteRequest] = Body(...)):
+    """
+    Summarise many notes in one call (course imports).  Streams one NDJSON
+    line per note, in completion order: {"index": i, "success": …, …} with
+    the same fields /summarize_text returns.
+
+    Imports get their own deadline, not the interactive one: the
+    X-Request-Timeout header if sent, else SUMMARIZE_BATCH_DEADLINE_PER_ITEM_SECONDS
+    per note, capped at SUMMARIZE_BATCH_DEADLINE_MAX_SECONDS either way.
+    Notes unfinished by then come back partial (unsaved) or as 504 lines.
+    """
+    if len(notes) > SUMMARIZE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SUMMARIZE_BATCH_MAX_ITEMS} notes per batch.")
+    deadline = Deadline.from_header(
+        request.headers.get(DEADLINE_HEADER),
+        default=BATCH_DEADLINE_PER_ITEM_S * max(1, len(notes)),
+        cap=BATCH_DEADLINE_MAX_S,
     )
+    return StreamingResponse(_batch_lines(request, notes, deadline), media_type="application/x-ndjson")
 
 
 @app.post("/upload_pdf")
@@ -144,17 +621,46 @@ async def upload_pdf(
     title: str = Form(...),
     summary_type: str = Form("detailed"),
 ):
-    print(f"📄 PDF upload request: user_id={user_id}, title={title}, filename={file.filename}")
-    
-    pdf_bytes = await file.read()
-    print(f"📄 Read {len(pdf_bytes)} bytes from uploaded file")
+    logger.info("PDF upload", extra={"user_id": user_id, "upload_filename": file.filename})
     
-    extracted = extract_text_from_pdf(pdf_bytes)
+    with timed("upload.read"):
+        pdf_bytes = await file.read()
+    logger.debug("Read uploaded PDF", extra={"bytes": len(pdf_bytes)})
+
+    key = request_key("pdf", user_id, title, summary_type, bytes_hash(pdf_bytes))
+    async with watch_disconnect(request, deadline_var.get()):
+        return encoded(request, await _flights.do(
+            key,
+            lambda: _pdf_to_summary(
+                request=request,
+                pdf_bytes=pdf_bytes,
+                user_id=user_id,
+                title=title,
+                summary_type=summary_type,
+            ),
+        ))
+
+
+async def _pdf_to_summary(
+    *,
+    request: Request,
+    pdf_bytes: bytes,
+    user_id: str,
+    title: str,
+    summary_type: str,
+) -> Dict[str, Any]:
+    upload_hash = bytes_hash(pdf_bytes)
+    existing = _find_note(request, user_id, upload_hash=upload_hash)
+    if existing:
+        return _duplicate_response(existing)
+
+    with timed("upload.extract"):
+        extracted = cached_extract("pdf", pdf_bytes, extract_text_from_pdf, PDF_SETTINGS)
     if not extracted.strip():
-        print("❌ No text extracted from PDF")
+        logger.warning("No text extracted from PDF", extra={"user_id": user_id})
         return {"error": "No text found in PDF.", "success": False}
 
-    print(f"✅ Extracted {len(extracted)} characters from PDF")
+    logger.debug("Extracted PDF text", extra={"chars": len(extracted)})
     
     result = await _process_and_save(
         request=request,
@@ -163,9 +669,10 @@ async def upload_pdf(
         title=title,
         source="pdf",
         summary_type=summary_type,
+        upload_hash=upload_hash,
     )
     
-    print(f"📄 PDF processing result: {result}")
+    logger.info("PDF processed", extra={"success": result.get("success"), "summary_id": result.get("summary_id")})
     return result
 
 
@@ -177,10 +684,41 @@ async def upload_images(
     title: str = Form(...),
     summary_type: str = Form("detailed"),
 ):
-    chunks = []
-    for f in files:
-        img_bytes = await f.read()
-        chunks.append(extract_text_from_image(img_bytes))
+    with timed("upload.read"):
+        images = [await f.read() for f in files]
+
+    key = request_key("images", user_id, title, summary_type, *[bytes_hash(b) for b in images])
+    async with watch_disconnect(request, deadline_var.get()):
+        return encoded(request, await _flights.do(
+            key,
+            lambda: _images_to_summary(
+                request=request,
+                images=images,
+                user_id=user_id,
+                title=title,
+                summary_type=summary_type,
+            ),
+        ))
+
+
+async def _images_to_summary(
+    *,
+    request: Request,
+    images: List[bytes],
+    user_id: str,
+    title: str,
+    summary_type: str,
+) -> Dict[str, Any]:
+    upload_hash = request_key(*[bytes_hash(b) for b in images])
+    existing = _find_note(request, user_id, upload_hash=upload_hash)
+    if existing:
+        return _duplicate_response(existing)
+
+    with timed("upload.extract"):
+        chunks = [
+            cached_extract("image", img_bytes, extract_text_from_image, OCR_SETTINGS)
+            for img_bytes in images
+        ]
 
     full_text = "\n".join(chunks).strip()
     if not full_text:
@@ -193,17 +731,62 @@ async def upload_images(
         title=title,
         source="image",
         summary_type=summary_type,
+        upload_hash=upload_hash,
     )
 
 
+@app.get("/write_queue")
+def write_queue_metrics(request: Request):
+    """Depth / lag of the write-behind journal (enabled with WRITE_BEHIND=1)."""
+    queue: WriteBehindQueue | None = request.app.state.write_queue
+    if queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **queue.metrics()}
+
+
 @app.delete("/delete_summary/{user_id}/{summary_id}")
 async def delete_summary_endpoint(user_id: str, summary_id: str):
-    res = delete_summary_and_note(user_id, summary_id)
+    res = get_storage().delete_summary_and_note(user_id, summary_id)
     if not res["success"]:
         raise HTTPException(status_code=404, detail=res["message"])
+    _index_changed(user_id)
     return res
 
 
+def _bulk_ids(ids: List[str]) -> List[str]:
+    if len(ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_IDS} ids per call.")
+    return ids
+
+
+def _bulk_response(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    ok = sum(1 for res in results.values() if res["success"])
+    return {"success": ok == len(results), "succeeded": ok, "failed": len(results) - ok, "results": results}
+
+
+@app.post("/delete_summaries/{user_id}")
+async def delete_summaries_endpoint(user_id: str, summary_ids: List[str] = Body(...)):
+    """Delete many summaries and their notes.  `results` maps each summary id to its outcome."""
+    results = get_storage().delete_summaries_and_notes(user_id, _bulk_ids(summary_ids))
+    _index_changed(user_id)
+    return _bulk_response(results)
+
+
+@app.get("/search/{user_id}")
+async def search_endpoint(request: Request, user_id: str, q: str, k: int = 10, kind: str | None = None):
+    """Semantic search over the user's notes and summaries (kind=notes|summaries to restrict)."""
+    index: SearchIndex | None = request.app.state.search_index
+    if index is None:
+        raise HTTPException(status_code=404, detail="Search is disabled (SEARCH_INDEX=0).")
+    if not q.strip():
+        return {"error": "Query is empty.", "success": False}
+    if kind is not None and kind not in INDEXED_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(INDEXED_KINDS)}.")
+    with timed("search.query"):
+        hits = await index.search(user_id, q, max(1, min(k, 100)), kind)
+    return encoded(request, {"success": True, "results": hits})
+
+
 # ---------- flashcard routes ---------- #
 @app.post("/generate_flashcards")
 async def generate_flashcards(
@@ -218,14 +801,34 @@ async def generate_flashcards(
             return {"error": "Content too short for flashcard generation.", "success": False}
         flashcard_service: FlashcardService = request.app.state.flashcard_service
         # Generate flashcards
-        flashcards = await flashcard_service.generate_flashcards(
-            flashcard_request.content, 
-            num_flashcards=10
-        )
+        async with watch_disconnect(request, deadline_var.get()):
+            flashcards = await flashcard_service.generate_flashcards(
+                flashcard_request.content, 
+                num_flashcards=10,
+                user_id=flashcard_request.user_id,
+            )
         if not flashcards:
             return {"error": "Could not generate flashcards from content. No flashcards were created.", "success": False}
+        queue: WriteBehindQueue | None = request.app.state.write_queue
+        if queue is not None:
+            set_id = new_flashcard_set_id(flashcard_request.set_name)
+            await run_in_executor("write_behind.enqueue", queue.enqueue, "save_flashcard_set", dict(
+                user_id=flashcard_request.user_id,
+                set_name=flashcard_request.set_name,
+                flashcards=flashcards,
+                note_id=flashcard_request.note_id,
+                note_title=flashcard_request.note_title,
+                set_id=set_id,
+            ))
+            return encoded(request, {
+                "success": True,
+                "set_id": set_id,
+                "flashcards": flashcards,
+                "count": len(flashcards),
+                "queued": True,
+            })
         # Save to Firestore only if flashcards exist
-        save_result = save_flashcard_set_to_firestore(
+        save_result = get_storage().save_flashcard_set(
             user_id=flashcard_request.user_id,
             set_name=flashcard_request.set_name,
             flashcards=flashcards,
@@ -233,46 +836,48 @@ async def generate_flashcards(
             note_title=flashcard_request.note_title,
         )
         if not save_result["success"]:
-            return {
+            return encoded(request, {
                 "error": "Flashcard set could not be saved (possibly duplicate name).",
                 "success": False,
                 "set_id": save_result.get("set_id", ""),
-                "flashcards": [{"question": card.question, "answer": card.answer} for card in flashcards]
-            }
-        return {
+                "flashcards": flashcards,
+            })
+        return encoded(request, {
             "success": True,
             "set_id": save_result.get("set_id", ""),
-            "flashcards": [{"question": card.question, "answer": card.answer} for card in flashcards],
+            "flashcards": flashcards,
             "count": len(flashcards)
-        }
+        })
+    except (AdmissionRejected, DeadlineExceeded):
+        raise
     except Exception as e:
-        print(f"[DEBUG] Exception in generate_flashcards: {e}")
+        logger.exception("generate_flashcards failed")
         return {"error": f"Failed to generate flashcards: {str(e)}", "success": False}
 
 
 @app.get("/flashcard_sets/{user_id}")
-async def get_flashcard_sets(user_id: str):
+async def get_flashcard_sets(request: Request, user_id: str):
     """Get all flashcard sets for a user."""
     try:
-        sets = get_user_flashcard_sets(user_id)
-        return {"success": True, "sets": sets}
+        sets = get_storage().get_user_flashcard_sets(user_id)
+        return encoded(request, {"success": True, "sets": sets})
     except Exception as e:
-        print(f"[DEBUG] Exception in get_flashcard_sets: {e}")
+        logger.exception("get_flashcard_sets failed")
         return {"error": f"Failed to get flashcard sets: {str(e)}", "success": False}
 
 
 @app.get("/flashcard_set/{user_id}/{set_id}")
-async def get_flashcard_set_endpoint(user_id: str, set_id: str):
+async def get_flashcard_set_endpoint(request: Request, user_id: str, set_id: str):
     """Get a specific flashcard set."""
     try:
-        result = get_flashcard_set(user_id, set_id)
+        result = get_storage().get_flashcard_set(user_id, set_id)
         if not result["success"]:
             raise HTTPException(status_code=404, detail=result["message"])
-        return result
+        return encoded(request, result)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[DEBUG] Exception in get_flashcard_set_endpoint: {e}")
+        logger.exception("get_flashcard_set_endpoint failed")
         return {"error": f"Failed to get flashcard set: {str(e)}", "success": False}
 
 
@@ -280,17 +885,29 @@ async def get_flashcard_set_endpoint(user_id: str, set_id: str):
 async def delete_flashcard_set_endpoint(user_id: str, set_id: str):
     """Delete a flashcard set."""
     try:
-        result = delete_flashcard_set(user_id, set_id)
+        result = get_storage().delete_flashcard_set(user_id, set_id)
         if not result["success"]:
             raise HTTPException(status_code=404, detail=result["message"])
         return result
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[DEBUG] Exception in delete_flashcard_set_endpoint: {e}")
+        logger.exception("delete_flashcard_set_endpoint failed")
         return {"error": f"Failed to delete flashcard set: {str(e)}", "success": False}
 
 
+@app.post("/get_flashcard_sets/{user_id}")
+async def get_flashcard_sets_bulk(request: Request, user_id: str, set_ids: List[str] = Body(...)):
+    """Fetch many flashcard sets (e.g. a study session).  `results` maps each set id to the set or an error."""
+    return encoded(request, _bulk_response(get_storage().get_flashcard_sets(user_id, _bulk_ids(set_ids))))
+
+
+@app.post("/delete_flashcard_sets/{user_id}")
+async def delete_flashcard_sets_bulk(user_id: str, set_ids: List[str] = Body(...)):
+    """Delete many flashcard sets.  `results` maps each set id to its outcome."""
+    return _bulk_response(get_storage().delete_flashcard_sets(user_id, _bulk_ids(set_ids)))
+
+
 @app.put("/flashcard_set/{user_id}/{set_id}")
 async def update_flashcard_set_endpoint(
     user_id: str, 
@@ -309,14 +926,14 @@ async def update_flashcard_set_endpoint(
                 )
             )
         
-        result = update_flashcard_set(user_id, set_id, flashcard_objects)
+        result = get_storage().update_flashcard_set(user_id, set_id, flashcard_objects)
         if not result["success"]:
             raise HTTPException(status_code=404, detail=result["message"])
         return result
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[DEBUG] Exception in update_flashcard_set_endpoint: {e}")
+        logger.exception("update_flashcard_set_endpoint failed")
         return {"error": f"Failed to update flashcard set: {str(e)}", "success": False}
 
 
@@ -334,7 +951,7 @@ async def create_flashcard_set(
         if not user_id or not set_name or not flashcards:
             return {"success": False, "error": "Missing required fields."}
         flashcard_objs = [Flashcard(question=fc["question"], answer=fc["answer"]) for fc in flashcards]
-        save_result = save_flashcard_set_to_firestore(
+        save_result = get_storage().save_flashcard_set(
             user_id=user_id,
             set_name=set_name,
             flashcards=flashcard_objs,
@@ -344,3 +961,20 @@ async def create_flashcard_set(
         return {"success": save_result.get("success", False), "set_id": save_result.get("set_id", None)}
     except Exception as e:
         return {"success": False, "error": str(e)}
+
+
+# ---------- delta sync ---------- #
+@app.get("/sync/{user_id}")
+async def sync_endpoint(request: Request, user_id: str, since: str | None = None, limit: int = SYNC_PAGE_LIMIT):
+    """
+    Notes, summaries and flashcard sets created, changed or deleted after
+    the `since` cursor (omit it for a full sync).  Pass the returned
+    `cursor` next time; call again straight away while `has_more` is set.
+    A `reset` response means the cursor was too old: replace local data.
+    """
+    try:
+        with timed("sync.collect"):
+            payload = collect_changes(get_storage(), user_id, since, limit)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return encoded(request, payload)
@@ -0,0 +1,223 @@
+# services/admission.py
+"""
+Admission control + weighted fair scheduling for model inference.
+
+• Cost        – each job is priced before any inference runs: input tokens
+                (summed over every chunk of every section, prompt included)
+                × beams
+• Budgets     – a per-request cap and a per-user token bucket.  A job over
+                either is downgraded to greedy decoding when that fits,
+                otherwise rejected (413 too large / 429 + Retry-After)
+• Fair queue  – generate calls wait for one of INFERENCE_CONCURRENCY slots
+                in weighted-fair order (virtual finish time per user), and
+                small interactive jobs weigh more, so one user's textbook
+                doesn't starve everyone else's notes
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.log import get_logger
+from utils.metrics import REGISTRY, Counter, Histogram, run_in_executor
+
+# ─────── Configuration ───────
+ADMISSION             = os.getenv("ADMISSION", "1") == "1"
+MAX_REQUEST_COST      = int(os.getenv("ADMISSION_MAX_REQUEST_COST", "500000"))    # tokens × beams
+USER_BUDGET           = int(os.getenv("ADMISSION_USER_BUDGET", "1500000"))        # per window
+USER_WINDOW_SECONDS   = float(os.getenv("ADMISSION_USER_WINDOW_SECONDS", "60"))
+INTERACTIVE_COST      = int(os.getenv("ADMISSION_INTERACTIVE_COST", "20000"))     # ≈ a few pages
+INTERACTIVE_WEIGHT    = float(os.getenv("ADMISSION_INTERACTIVE_WEIGHT", "4"))
+DOWNGRADE_BEAMS       = int(os.getenv("ADMISSION_DOWNGRADE_BEAMS", "1"))
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "2"))
+# ────────────────────────────────────────
+
+logger = get_logger("admission")
+
+ADMISSIONS = REGISTRY.register(Counter(
+    "studyai_admission_total", "Admission decisions.", ["op", "decision"]))
+FAIR_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "studyai_fair_queue_wait_seconds", "Time a generate call waited for an inference slot.", ["op"]))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job does not fit its budget even in the cheap mode."""
+
+    def __init__(
+        self, message: str, status_code: int = 429, retry_after: Optional[int] = None, user_id: Optional[str] = None
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.user_id = user_id   # whose budget / job was turned down
+
+
+@dataclass
+class Ticket:
+    op: str
+    user_id: str
+    cost: int
+    beams: int
+    weight: float
+    downgraded: bool = False
+
+
+class FairScheduler:
+    """
+    Start-time fair queueing over a fixed number of inference slots.
+
+    Each call is tagged finish = max(V, user's last finish) + cost / weight
+    and slots go to the smallest tag, so a user's many queued batches line
+    up behind each other while another user's single batch starts near the
+    current virtual time V.
+    """
+
+    def __init__(self, slots: int = INFERENCE_CONCURRENCY) -> None:
+        self.slots = max(1, slots)
+        self._busy = 0
+        self._heap: List[Tuple[float, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._finish: Dict[str, float] = {}
+
+    def depth(self) -> int:
+        return sum(1 for *_, fut in self._heap if not fut.done())
+
+    def _tag(self, user_id: str, cost: float, weight: float) -> Tuple[float, float]:
+        start = max(self._vtime, self._finish.get(user_id, 0.0))
+        finish = start + cost / weight
+        self._finish[user_id] = finish
+        if len(self._finish) > 10_000:  # forget users that are fully caught up
+            self._finish = {u: f for u, f in self._finish.items() if f > self._vtime}
+        return start, finish
+
+    async def acquire(self, user_id: str, cost: float, weight: float) -> None:
+        start, finish = self._tag(user_id, cost, weight)
+        # release() hands slots straight to live waiters, so a free slot
+        # means nobody (uncancelled) is queued
+        if self._busy < self.slots:
+            self._busy += 1
+            self._vtime = max(self._vtime, start)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), start, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():  # granted just as we were cancelled
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._busy -= 1
+        while self._heap and self._busy < self.slots:
+            _, _, start, fut = heapq.heappop(self._heap)
+            if fut.done():  # waiter was cancelled
+                continue
+            self._busy += 1
+            self._vtime = max(self._vtime, start)
+            fut.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self.scheduler = FairScheduler(INFERENCE_CONCURRENCY)
+        self._buckets: Dict[str, List[float]] = {}   # user → [level, last refill]
+        self._rate = USER_BUDGET / USER_WINDOW_SECONDS
+
+    def _available(self, user_id: str) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.setdefault(user_id, [float(USER_BUDGET), now])
+        bucket[0] = min(float(USER_BUDGET), bucket[0] + (now - bucket[1]) * self._rate)
+        bucket[1] = now
+        return bucket[0]
+
+    @staticmethod
+    def _weight(cost: int) -> float:
+        return INTERACTIVE_WEIGHT if cost <= INTERACTIVE_COST else 1.0
+
+    def admit(self, op: str, user_id: Optional[str], tokens: int, beams: int) -> Ticket:
+        """
+        Price a job and charge the user's budget.  Returns a Ticket whose
+        `beams` may be lower than requested (downgraded); raises
+        AdmissionRejected when even the cheap mode does not fit.
+        """
+        user = user_id or "anonymous"
+        if not ADMISSION:
+            cost = tokens * beams
+            return Ticket(op, user, cost, beams, self._weight(cost))
+
+        modes = [beams] + ([DOWNGRADE_BEAMS] if DOWNGRADE_BEAMS < beams else [])
+        affordable = [b for b in modes if tokens * b <= MAX_REQUEST_COST]
+        if not affordable:
+            ADMISSIONS.inc(op=op, decision="rejected_size")
+            logger.warning("Rejected oversized job", extra={"op": op, "user_id": user, "tokens": tokens})
+            raise AdmissionRejected(
+                f"Input too large to process (~{tokens} tokens); split it into smaller documents.",
+                status_code=413,
+                user_id=user,
+            )
+
+        available = self._available(user)
+        for b in affordable:
+            cost = tokens * b
+            if cost <= available:
+                self._buckets[user][0] -= cost
+                ticket = Ticket(op, user, cost, b, self._weight(cost), downgraded=b != beams)
+                ADMISSIONS.inc(op=op, decision="downgraded" if ticket.downgraded else "admitted")
+                if ticket.downgraded:
+                    logger.info("Downgraded to cheaper decoding", extra={
+                        "op": op, "user_id": user, "tokens": tokens, "beams": b,
+                    })
+                return ticket
+
+        cheapest = tokens * affordable[-1]
+        retry_after = math.ceil((cheapest - available) / self._rate)
+        ADMISSIONS.inc(op=op, decision="rejected_budget")
+        logger.warning("Rejected over-budget job", extra={"op": op, "user_id": user, "tokens": tokens})
+        raise AdmissionRejected(
+            "Processing budget exhausted for this user; retry later.",
+            status_code=429,
+            retry_after=retry_after,
+            user_id=user,
+        )
+
+    async def run(self, ticket: Ticket, tokens: int, fn: Callable, *args: Any) -> Any:
+        """
+        Run one generate call in the executor once the fair queue grants a
+        slot.  The slot is held until the executor thread is done – a caller
+        cancelled meanwhile (deadline, disconnect) stops waiting, but the
+        call it started still counts against INFERENCE_CONCURRENCY.
+        """
+        queued = time.perf_counter()
+        await self.scheduler.acquire(ticket.user_id, tokens * ticket.beams, ticket.weight)
+        FAIR_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued, op=ticket.op)
+        try:
+            call = asyncio.ensure_future(run_in_executor(ticket.op, fn, *args))
+        except BaseException:
+            self.scheduler.release()
+            raise
+
+        def finished(fut: asyncio.Future) -> None:
+            self.scheduler.release()
+            if not fut.cancelled():
+                fut.exception()   # retrieved, even when the caller has gone
+
+        call.add_done_callback(finished)
+        return await asyncio.shield(call)
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
@@ -0,0 +1,99 @@
+# services/batching.py
+"""
+Length-bucketed batching for seq2seq inference.
+
+• Items are grouped by generation target (max/min length, quantised so
+  near-identical targets can share one generate call)
+• Inside a group they are bucketed + sorted by input length, so every batch
+  pads to a length close to its own members
+• Items keep their submission index, so callers can put outputs back in
+  order as batches finish
+• BatchStats reports how much of each padded batch was real tokens
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+# ─────── Configuration ───────
+BATCH_SIZE            = int(os.getenv("HF_BATCH_SIZE", "4"))
+LENGTH_BUCKET_TOKENS  = int(os.getenv("LENGTH_BUCKET_TOKENS", "128"))  # input-length bucket width
+TARGET_BUCKET_TOKENS  = int(os.getenv("TARGET_BUCKET_TOKENS", "32"))   # max_length rounding step
+MAX_TARGET_TOKENS     = 1000
+MIN_LENGTH_RATIO      = 0.60
+# ────────────────────────────────────────
+
+
+@dataclass
+class BatchItem:
+    index: int          # position in the caller's list
+    text: str
+    n_tokens: int
+    max_length: int
+    min_length: int
+
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    items: int = 0
+    real_tokens: int = 0
+    padded_tokens: int = 0
+
+    @property
+    def padding_efficiency(self) -> float:
+        """Share of the padded token grid that holds real tokens (1.0 = no waste)."""
+        if not self.padded_tokens:
+            return 1.0
+        return self.real_tokens / self.padded_tokens
+
+    def record(self, batch: Sequence[BatchItem]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        self.real_tokens += sum(it.n_tokens for it in batch)
+        self.padded_tokens += max(it.n_tokens for it in batch) * len(batch)
+
+    def merge(self, other: "BatchStats") -> None:
+        self.batches += other.batches
+        self.items += other.items
+        self.real_tokens += other.real_tokens
+        self.padded_tokens += other.padded_tokens
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "real_tokens": self.real_tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_efficiency": round(self.padding_efficiency, 4),
+        }
+
+
+def quantize_target(max_length: int) -> Tuple[int, int]:
+    """Round max_length up to the bucket step and derive min_length from it."""
+    step = max(1, TARGET_BUCKET_TOKENS)
+    mx = min(MAX_TARGET_TOKENS, -(-max_length // step) * step)
+    return mx, int(mx * MIN_LENGTH_RATIO)
+
+
+def plan_batches(items: Sequence[BatchItem], batch_size: int = BATCH_SIZE) -> List[List[BatchItem]]:
+    """
+    Split items into batches that share a generation target and have similar
+    input lengths.  Longest buckets go first so the slowest work starts early.
+    """
+    batch_size = max(1, batch_size)
+    width = max(1, LENGTH_BUCKET_TOKENS)
+
+    groups: Dict[Tuple[int, int, int], List[BatchItem]] = {}
+    for it in items:
+        key = (it.n_tokens // width, it.max_length, it.min_length)
+        groups.setdefault(key, []).append(it)
+
+    batches: List[List[BatchItem]] = []
+    for key in sorted(groups, reverse=True):
+        group = sorted(groups[key], key=lambda it: it.n_tokens, reverse=True)
+        batches.extend(group[i : i + batch_size] for i in range(0, len(group), batch_size))
+    return batches
+
@@ -3,14 +3,23 @@
 OCR helper – extracts text from an image (PNG, JPG, etc.).
 """
 import io
+import os
 from typing import Union
 
 from PIL import Image
 import pytesseract
 
+from utils.metrics import timed_fn
 
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_CONFIG = os.getenv("OCR_CONFIG", "")
+# Anything that changes OCR output must be part of this string – it keys the extraction cache.
+OCR_SETTINGS = f"tesseract:{OCR_LANG}:{OCR_CONFIG}:rgb"
+
+
+@timed_fn("parse.ocr")
 def extract_text_from_image(image_bytes: Union[bytes, bytearray]) -> str:
     """Return UTF-8 text extracted via Tesseract."""
     with Image.open(io.BytesIO(image_bytes)) as img:
         img = img.convert("RGB")  # ensure 3-channel for better OCR
-        return pytesseract.image_to_string(img)
+        return pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_CONFIG)
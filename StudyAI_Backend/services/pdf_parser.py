@@ -5,16 +5,26 @@ Lightweight PDF → text extraction using pdfminer.six.
 import os
 from tempfile import NamedTemporaryFile
 
+import pdfminer
 from pdfminer.high_level import extract_text
 
+from utils.log import get_logger
+from utils.metrics import timed_fn
 
+# Anything that changes parse output must be part of this string – it keys the extraction cache.
+PDF_SETTINGS = f"pdfminer:{getattr(pdfminer, '__version__', 'unknown')}"
+
+logger = get_logger("pdf_parser")
+
+
+@timed_fn("parse.pdf")
 def extract_text_from_pdf(pdf_bytes: bytes) -> str:
     """Write bytes to a temp file (required by pdfminer) and extract text."""
     if not pdf_bytes:
-        print("❌ PDF bytes are empty")
+        logger.warning("PDF bytes are empty")
         return ""
     
-    print(f"📄 Processing PDF with {len(pdf_bytes)} bytes")
+    logger.debug("Parsing PDF", extra={"bytes": len(pdf_bytes)})
     
     with NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
         tmp_file.write(pdf_bytes)
@@ -22,10 +32,10 @@ def extract_text_from_pdf(pdf_bytes: bytes) -> str:
 
     try:
         extracted_text = extract_text(tmp_path)
-        print(f"✅ Successfully extracted {len(extracted_text)} characters from PDF")
+        logger.debug("Parsed PDF", extra={"chars": len(extracted_text)})
         return extracted_text
     except Exception as exc:
-        print(f"❌ PDF parsing failed: {exc}")
+        logger.warning("PDF parsing failed", extra={"error": str(exc)})
         return ""
     finally:
         # Clean up the temporary file
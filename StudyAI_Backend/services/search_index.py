@@ -0,0 +1,429 @@
+# services/search_index.py
+"""
+Per-user semantic search over notes and summaries.
+
+• Embedder   – BART encoder mean-pooled over the attention mask (reuses the
+               summariser's loaded model, so each call waits for a fair-
+               queue inference slot like a generate call), or a feature-
+               hashing embedder with the stub model; unit-length vectors
+               either way
+• UserIndex  – one float16 matrix per user, memory-mapped from local disk
+               (SEARCH_INDEX_DIR/<user hash>/vectors.f16) + a small JSON
+               sidecar of row metadata.  Inserts append a row, deletes
+               swap the last row into the hole: both O(dim)
+• SearchIndex – keeps each UserIndex current from the delta-sync stream
+               (storage.changes_since), so every write path — direct
+               saves, /summarize_batch, the write-behind queue, other
+               instances — ends up indexed, and each text is embedded once.
+               Saves/deletes schedule a background refresh, and so does a
+               search over an index older than SEARCH_REFRESH_SECONDS –
+               the query itself never waits for indexing.  Queries are one
+               blocked matrix-vector product + argpartition top-k, no
+               Firestore scan.  At most SEARCH_LOADED_USERS indexes stay
+               open; one in use is never closed
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.admission import INTERACTIVE_WEIGHT, Ticket, get_admission
+from utils.log import get_logger
+from utils.metrics import REGISTRY, Counter, run_in_executor
+from utils.storage import StorageBackend, get_storage
+
+# ─────── Configuration ───────
+SEARCH_INDEX           = os.getenv("SEARCH_INDEX", "1") == "1"
+SEARCH_INDEX_DIR       = os.getenv(
+    "SEARCH_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "search"),
+)
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "10"))
+SEARCH_MAX_TOKENS      = int(os.getenv("SEARCH_MAX_TOKENS", "512"))     # encoder input per text
+SEARCH_HASH_DIM        = int(os.getenv("SEARCH_HASH_DIM", "512"))       # hashing embedder width
+SEARCH_EMBED_BATCH     = int(os.getenv("SEARCH_EMBED_BATCH", "16"))
+SEARCH_LOADED_USERS    = int(os.getenv("SEARCH_LOADED_USERS", "64"))    # open memmaps kept
+# ────────────────────────────────────────
+
+INDEXED_KINDS = ("notes", "summaries")
+_PAGE = 500          # changes read per changes_since call
+_SCORE_BLOCK = 1024  # rows converted to float32 per matmul
+
+logger = get_logger("search")
+
+SEARCH_EMBEDDED = REGISTRY.register(Counter(
+    "studyai_search_embedded_total", "Texts embedded into the search index.", ["kind"]))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ---------- embedders ---------- #
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams + bigrams, sublinear tf.  No model needed."""
+
+    _WORD_RE = re.compile(r"\w+")
+    uses_model = False
+
+    def __init__(self, dim: int = SEARCH_HASH_DIM) -> None:
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _one(self, text: str) -> np.ndarray:
+        words = self._WORD_RE.findall(text.lower())
+        feats = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if feats:
+            h = np.fromiter((zlib.crc32(f.encode()) for f in feats), dtype=np.uint32, count=len(feats))
+            np.add.at(vec, (h % self.dim).astype(np.intp), np.where(h & 0x80000000, -1.0, 1.0).astype(np.float32))
+        return np.sign(vec) * np.log1p(np.abs(vec))
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        return _normalize(np.stack([self._one(t) for t in texts]))
+
+
+class EncoderEmbedder:
+    """Mean-pooled encoder states of the summariser's seq2seq model."""
+
+    uses_model = True   # shares the summariser's model: run through the fair queue
+
+    def __init__(self, model: Any, tokenizer: Any, model_name: str) -> None:
+        self.model = model
+        self.tokenizer = tokenizer
+        self.dim = int(model.config.d_model)
+        self.name = f"{model_name}-encoder-mean"
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        import torch
+
+        out = []
+        encoder = self.model.get_encoder()
+        for start in range(0, len(texts), SEARCH_EMBED_BATCH):
+            enc = self.tokenizer(
+                list(texts[start : start + SEARCH_EMBED_BATCH]),
+                padding=True, truncation=True, max_length=SEARCH_MAX_TOKENS, return_tensors="pt",
+            ).to(self.model.device)
+            with torch.inference_mode():
+                hidden = encoder(input_ids=enc.input_ids, attention_mask=enc.attention_mask).last_hidden_state
+            mask = enc.attention_mask.unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            out.append(pooled.float().cpu().numpy())
+        return _normalize(np.concatenate(out))
+
+
+def make_embedder(summarizer: Any) -> Any:
+    """Encoder embedder over the summariser's model when it has one, else hashing."""
+    model = getattr(summarizer, "model", None) or getattr(getattr(summarizer, "pipe", None), "model", None)
+    if model is not None and hasattr(model, "get_encoder"):
+        from services.summarizer_service import MODEL_NAME
+
+        return EncoderEmbedder(model, summarizer.tokenizer, MODEL_NAME)
+    return HashingEmbedder()
+
+
+def _text(kind: str, record: Dict[str, Any]) -> str:
+    if kind == "notes":
+        return f"{record.get('name') or ''}\n{record.get('content') or ''}"
+    return record.get("summary") or ""
+
+
+# ---------- one user's index ---------- #
+class UserIndex:
+    """
+    vectors.f16 – float16 [capacity, dim] memmap; rows [0, count) are live
+    meta.json   – embedder, row metadata in row order, sync positions
+
+    `lock` guards rows + vectors and is only held to read or to apply an
+    already embedded page; `refreshing` serialises whole refreshes.
+    """
+
+    def __init__(self, path: str, embedder_name: str, dim: int) -> None:
+        self.path = path
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.refreshing = threading.Lock()
+        self.refreshed_at = 0.0
+        self.users = 0   # SearchIndex._using holders; never evicted while > 0
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta()
+        if meta is None or meta.get("embedder") != embedder_name or meta.get("dim") != dim:
+            meta = {"embedder": embedder_name, "dim": dim, "rows": [], "positions": {}}
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+        self.rows: List[Dict[str, Any]] = meta["rows"]
+        self.positions: Dict[str, Tuple[int, str]] = {k: tuple(v) for k, v in meta["positions"].items()}
+        self.embedder_name = embedder_name
+        self.where = {row["key"]: i for i, row in enumerate(self.rows)}
+        self.vectors = self._open(max(64, len(self.rows)))
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f16")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, capacity: int) -> np.memmap:
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        have = size // (2 * self.dim)
+        if have >= capacity:
+            return np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(have, self.dim))
+        with open(self._vectors_path, "ab") as fh:   # grow in place; existing rows stay put
+            fh.truncate(capacity * self.dim * 2)
+        return np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+
+    def _reserve(self, count: int) -> None:
+        if count > self.vectors.shape[0]:
+            self.vectors.flush()
+            del self.vectors
+            self.vectors = self._open(max(count, 2 * len(self.rows), 64))
+
+    def upsert(self, entries: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        self._reserve(len(self.rows) + len(entries))
+        for entry, vec in zip(entries, vectors):
+            row = self.where.get(entry["key"])
+            if row is None:
+                row = len(self.rows)
+                self.rows.append(entry)
+                self.where[entry["key"]] = row
+            else:
+                self.rows[row] = entry
+            self.vectors[row] = vec
+
+    def delete(self, key: str, deleted_us: int) -> None:
+        row = self.where.get(key)
+        if row is None or self.rows[row]["us"] > deleted_us:   # re-created after the delete
+            return
+        last = len(self.rows) - 1
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.rows[row] = self.rows[last]
+            self.where[self.rows[row]["key"]] = row
+        self.rows.pop()
+        del self.where[key]
+
+    def save(self) -> None:
+        """Persist vectors + metadata; takes `lock` only to snapshot the metadata."""
+        self.vectors.flush()
+        with self.lock:
+            meta = json.dumps(
+                {"embedder": self.embedder_name, "dim": self.dim, "rows": self.rows, "positions": self.positions},
+                separators=(",", ":"),
+            )
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(meta)
+        os.replace(tmp, self._meta_path)
+
+    def top_k(self, query: np.ndarray, k: int, kind: Optional[str]) -> List[Tuple[int, float]]:
+        n = len(self.rows)
+        if not n:
+            return []
+        q = query.astype(np.float32)
+        scores = np.empty(n, dtype=np.float32)
+        block = np.empty((min(n, _SCORE_BLOCK), self.dim), dtype=np.float32)   # BLAS needs float32
+        for start in range(0, n, _SCORE_BLOCK):
+            stop = min(n, start + _SCORE_BLOCK)
+            np.copyto(block[: stop - start], self.vectors[start:stop])
+            np.dot(block[: stop - start], q, out=scores[start:stop])
+        if kind is not None:
+            scores[np.array([row["kind"] != kind for row in self.rows])] = -np.inf
+        k = min(k, n)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best if np.isfinite(scores[i])]
+
+
+# ---------- all users ---------- #
+class SearchIndex:
+    def __init__(self, embedder: Any, root: str = SEARCH_INDEX_DIR) -> None:
+        self.embedder = embedder
+        self.root = root
+        self._users: "OrderedDict[str, UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty: "OrderedDict[str, None]" = OrderedDict()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+
+    @contextmanager
+    def _using(self, user_id: str) -> Iterator[UserIndex]:
+        """The user's index, kept open (not evicted) until the block exits."""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                path = os.path.join(self.root, hashlib.sha256(user_id.encode()).hexdigest()[:32])
+                index = self._users[user_id] = UserIndex(path, self.embedder.name, self.embedder.dim)
+            self._users.move_to_end(user_id)
+            index.users += 1
+            self._evict()
+        try:
+            yield index
+        finally:
+            with self._lock:
+                index.users -= 1
+                self._evict()
+
+    def _evict(self) -> None:
+        """Close least recently used indexes past SEARCH_LOADED_USERS, skipping any in use (self._lock held)."""
+        excess = len(self._users) - SEARCH_LOADED_USERS
+        if excess > 0:
+            idle = [u for u, index in self._users.items() if not index.users and not index.refreshing.locked()]
+            for user_id in idle[:excess]:
+                del self._users[user_id]   # memmap closes once unreferenced
+
+    # ---------- embedding ---------- #
+    async def _embed(self, user_id: str, texts: Sequence[str], weight: float) -> np.ndarray:
+        if not self.embedder.uses_model:
+            return await run_in_executor("search.embed", self.embedder, texts)
+        # an encoder pass is model inference: take a fair-queue slot, as generate calls do
+        tokens = sum(min(SEARCH_MAX_TOKENS, int(len(t.split()) * 1.5) + 1) for t in texts)
+        ticket = Ticket("search.embed", user_id, tokens, 1, weight)
+        return await get_admission().run(ticket, tokens, self.embedder, texts)
+
+    def _embed_blocking(self, user_id: str, texts: Sequence[str]) -> np.ndarray:
+        """_embed from the refresh thread (bulk weight), via the app's event loop when there is one."""
+        if self._loop is None or not self.embedder.uses_model:
+            return self.embedder(texts)
+        return asyncio.run_coroutine_threadsafe(self._embed(user_id, texts, 1.0), self._loop).result()
+
+    # ---------- updates ---------- #
+    def refresh(self, user_id: str, storage: Optional[StorageBackend] = None) -> int:
+        """
+        Apply every change since the index's sync positions; returns how many
+        were applied.  Pages are embedded without holding the index lock, so
+        queries keep searching the index as it was until a page is applied.
+        """
+        storage = storage or get_storage()
+        applied = 0
+        with self._using(user_id) as index, index.refreshing:
+            for kind in (*INDEXED_KINDS, "tombstones"):
+                while True:
+                    changes = storage.changes_since(user_id, kind, index.positions.get(kind), _PAGE)
+                    if not changes:
+                        break
+                    if kind == "tombstones":
+                        with index.lock:
+                            for us, _, record in changes:
+                                if record["kind"] in INDEXED_KINDS:
+                                    index.delete(f"{record['kind']}:{record['id']}", us)
+                            index.positions[kind] = changes[-1][:2]
+                    else:
+                        entries, vectors = self._embed_changes(user_id, kind, changes)
+                        with index.lock:
+                            index.upsert(entries, vectors)
+                            index.positions[kind] = changes[-1][:2]
+                        SEARCH_EMBEDDED.inc(len(entries), kind=kind)
+                    applied += len(changes)
+                    if len(changes) < _PAGE:
+                        break
+            if applied:
+                index.save()
+            index.refreshed_at = time.monotonic()
+        if applied:
+            logger.debug("Search index refreshed", extra={"user_id": user_id, "changes": applied})
+        return applied
+
+    def _embed_changes(
+        self, user_id: str, kind: str, changes: List[Tuple[int, str, Dict[str, Any]]]
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Row entries + float16 vectors for a page of upserts."""
+        entries = []
+        for us, item_id, record in changes:
+            entry = {"key": f"{kind}:{item_id}", "kind": kind, "id": item_id, "us": us}
+            if kind == "notes":
+                entry["title"] = record.get("name")
+                entry["noteId"] = item_id
+            else:
+                entry["noteId"] = record.get("noteId")
+            entries.append(entry)
+        vectors = self._embed_blocking(user_id, [_text(kind, record) for _, _, record in changes])
+        return entries, vectors.astype(np.float16)
+
+    def mark_changed(self, user_id: str) -> None:
+        """Schedule a background refresh (after a save or delete)."""
+        with self._wake:
+            self._dirty[user_id] = None
+            self._wake.notify()
+
+    def start(self) -> None:
+        """Start the refresh thread; call from the event loop that serves searches."""
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None   # no loop: the refresh thread embeds directly
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._wake:
+            self._running = False
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            with self._wake:
+                while self._running and not self._dirty:
+                    self._wake.wait()
+                if not self._running:
+                    return
+                user_id, _ = self._dirty.popitem(last=False)
+            try:
+                self.refresh(user_id)
+            except Exception:
+                logger.exception("Search index refresh failed", extra={"user_id": user_id})
+
+    # ---------- queries ---------- #
+    async def search(
+        self, user_id: str, query: str, k: int = 10, kind: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k notes/summaries by cosine similarity, best first.  A stale
+        index is refreshed in the background; this query searches it as is.
+        """
+        with self._using(user_id) as index:
+            if time.monotonic() - index.refreshed_at > SEARCH_REFRESH_SECONDS:
+                self.mark_changed(user_id)
+            q = (await self._embed(user_id, [query], INTERACTIVE_WEIGHT))[0]
+            return await run_in_executor("search.top_k", self._hits, index, q, k, kind)
+
+    @staticmethod
+    def _hits(index: UserIndex, q: np.ndarray, k: int, kind: Optional[str]) -> List[Dict[str, Any]]:
+        with index.lock:
+            hits = []
+            for i, score in index.top_k(q, k, kind):
+                row = index.rows[i]
+                note_row = index.where.get(f"notes:{row['noteId']}")
+                hits.append({
+                    "kind": row["kind"],
+                    "id": row["id"],
+                    "noteId": row["noteId"],
+                    "title": index.rows[note_row].get("title") if note_row is not None else None,
+                    "score": round(score, 4),
+                })
+            return hits
@@ -0,0 +1,104 @@
+# services/stub_model.py
+"""
+Deterministic stand-ins for the HF tokenizer + summarization pipeline.
+
+Selected with HF_MODEL=stub.  No torch / transformers needed, output
+depends only on the input, and each pipeline call sleeps a fixed latency
+so benchmarks and load tests exercise the real chunking, batching,
+scheduling and persistence code at a predictable model cost.
+
+    STUB_LATENCY_MS        fixed cost per pipeline call      (default 50)
+    STUB_TOKEN_LATENCY_MS  extra cost per generated token    (default 0)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+STUB_LATENCY_MS       = float(os.getenv("STUB_LATENCY_MS", "50"))
+STUB_TOKEN_LATENCY_MS = float(os.getenv("STUB_TOKEN_LATENCY_MS", "0"))
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class _Encoding:
+    def __init__(self, input_ids) -> None:
+        self.input_ids = input_ids
+
+
+class StubTokenizer:
+    """Word/punctuation tokenizer with a growing vocabulary; decode(encode(x)) ≈ x."""
+
+    model_max_length = 1024
+
+    def __init__(self) -> None:
+        self._vocab: Dict[str, int] = {}
+        self._words: List[str] = []
+        self._lock = threading.Lock()
+
+    def _id(self, tok: str) -> int:
+        idx = self._vocab.get(tok)
+        if idx is None:
+            with self._lock:
+                idx = self._vocab.setdefault(tok, len(self._words))
+                if idx == len(self._words):
+                    self._words.append(tok)
+        return idx
+
+    def _encode(self, text: str) -> List[int]:
+        return [self._id(tok) for tok in _TOKEN_RE.findall(text)]
+
+    def __call__(self, text: Union[str, Sequence[str]], add_special_tokens: bool = True, **_) -> _Encoding:
+        if isinstance(text, str):
+            return _Encoding(self._encode(text))
+        return _Encoding([self._encode(t) for t in text])
+
+    def decode(self, ids: Sequence[int], skip_special_tokens: bool = True, **_) -> str:
+        out = " ".join(self._words[i] for i in ids)
+        return re.sub(r"\s+([^\w\s])", r"\1", out)
+
+
+class StubPipeline:
+    """
+    Callable like transformers' summarization pipeline: returns the leading
+    sentences of each input (prompt stripped), trimmed to max_length tokens.
+    The latency is spent in DECODE_STEPS slices with stopping_criteria
+    checked between them, like generate() does between decode steps.
+    """
+
+    DECODE_STEPS = 10
+
+    def __init__(self, latency_ms: float = STUB_LATENCY_MS, token_latency_ms: float = STUB_TOKEN_LATENCY_MS) -> None:
+        self.latency_ms = latency_ms
+        self.token_latency_ms = token_latency_ms
+        self.calls = 0
+
+    @staticmethod
+    def _summarize_one(text: str, max_length: int) -> str:
+        body = text.split(":\n", 1)[-1] if ":\n" in text[:400] else text
+        words = body.split()[: max(1, int(max_length / 1.5))]
+        return " ".join(words)
+
+    def __call__(
+        self,
+        inputs: Union[str, Sequence[str]],
+        max_length: int = 142,
+        min_length: int = 56,
+        stopping_criteria: Optional[Sequence[Callable]] = None,
+        **_,
+    ) -> List[Dict[str, str]]:
+        batch = [inputs] if isinstance(inputs, str) else list(inputs)
+        outputs = [self._summarize_one(t, max_length) for t in batch]
+        generated = max((len(o.split()) for o in outputs), default=0)
+        step = (self.latency_ms + self.token_latency_ms * generated) / 1000.0 / self.DECODE_STEPS
+        for done in range(self.DECODE_STEPS):
+            if stopping_criteria and any(c(None, None) for c in stopping_criteria):
+                # cut short: keep the share of each output "decoded" so far
+                outputs = [" ".join(o.split()[: len(o.split()) * done // self.DECODE_STEPS]) for o in outputs]
+                break
+            time.sleep(step)
+        self.calls += 1
+        return [{"summary_text": o} for o in outputs]
@@ -13,16 +13,26 @@ below still works unchanged.
 """
 
 from __future__ import annotations
-import asyncio, os, re
-from typing import List
+import asyncio, os, time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-import torch
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline, Pipeline
+from services.admission import AdmissionRejected, Ticket, get_admission
+from services import text_processing
+from services.batching import BATCH_SIZE, BatchItem, BatchStats, plan_batches, quantize_target
+from utils.deadline import DEADLINE_EVENTS, Deadline, DeadlineExceeded, current_deadline, iter_until, stopping_criteria
+from utils.hashing import content_hash, request_key
+from utils.log import get_logger, log_payload
+from utils.metrics import record_generation, run_in_executor, timed
+from utils.singleflight import SingleFlight
 
 # ─────── Configuration ───────
-MODEL_NAME        = os.getenv("HF_MODEL", "facebook/bart-large-cnn")
+MODEL_NAME        = os.getenv("HF_MODEL", "facebook/bart-large-cnn")   # "stub" → services.stub_model
 USE_FP16          = os.getenv("HF_FP16", "1") == "1"
 USE_8BIT          = os.getenv("HF_8BIT", "0") == "1"
+NUM_BEAMS         = 5          # admission control may downgrade a job to greedy
 
 OUTPUT_RATIO      = 0.45       # ~45 % of source words
 SECOND_PASS_RATIO = 0.50       # compress if >50 %
@@ -30,42 +40,135 @@ TOKEN_SCALE       = 1.5        # BART ≈ 1.5 tokens / word
 
 CHUNK_TOKENS      = 950        # keep <1024 context
 OVERLAP_TOKENS    = 100
+
+STREAM_MIN_CHARS  = int(os.getenv("SUMMARY_STREAM_MIN_CHARS", "262144"))  # larger inputs are chunked lazily
+STREAM_INFLIGHT   = int(os.getenv("SUMMARY_STREAM_INFLIGHT_CHUNKS", "32"))  # chunks decoded + queued at once
+BATCH_TENANT      = "batch"      # fair-queue identity of a bulk job pooling several users' notes
 PROMPT = (
     "Write an academic abstract that keeps concrete examples, technical measures "
     "and equity concerns in a scholarly tone:\n"
 )
 # ────────────────────────────────────────
 
+logger = get_logger("summarizer")
+
+
+class PartialSummary(str):
+    """Summary of only the chunks that finished before the request deadline."""
+
+    def __new__(cls, text: str, chunks_completed: int, chunks_total: int, sections_completed: int, sections_total: int) -> "PartialSummary":
+        obj = super().__new__(cls, text)
+        obj.chunks_completed = chunks_completed
+        obj.chunks_total = chunks_total
+        obj.sections_completed = sections_completed
+        obj.sections_total = sections_total
+        return obj
+
+
+@dataclass
+class _Prepared:
+    """A cleaned, split and chunked document, ready for inference."""
+    text: str                # cleaned input (fallback source)
+    sections: int
+    items: List[BatchItem]   # chunks in document order
+    owners: List[int]        # section index of each chunk
+
+    @property
+    def tokens(self) -> int:
+        return sum(it.n_tokens for it in self.items)
+
+
+class _Lots:
+    """
+    Planned batches of a lazy chunk stream, `window` chunks per lot.  Lots
+    are pulled (cleaned, tokenized, decoded) and planned in the executor,
+    one lot ahead of the batches handed out, never two pulls at once.
+    """
+
+    def __init__(self, items: Iterable[BatchItem], window: int) -> None:
+        self._source = iter(items)
+        self._window = window
+        self._ready: Deque[List[BatchItem]] = deque()
+        self._fetch: Optional[asyncio.Future] = None
+        self._drained = False    # source exhausted
+        self.exhausted = False   # … and every batch handed out
+
+    def _plan(self) -> List[List[BatchItem]]:
+        return plan_batches(list(islice(self._source, self._window)), BATCH_SIZE)
+
+    def _prefetch(self) -> None:
+        if self._fetch is None and not self._drained:
+            self._fetch = asyncio.ensure_future(run_in_executor("summarize.chunk", self._plan))
+            # retrieved even if nobody is left to await it (deadline)
+            self._fetch.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    async def next(self) -> Optional[List[BatchItem]]:
+        """The next batch, or None once there are no more."""
+        while not self._ready:
+            if self._drained:
+                self.exhausted = True
+                return None
+            self._prefetch()
+            fetch = self._fetch
+            planned = await asyncio.shield(fetch)   # a cancelled waiter must not cancel the shared pull
+            if self._fetch is fetch:
+                self._fetch = None
+                self._drained = not planned
+                self._ready.extend(planned)
+                self._prefetch()
+        return self._ready.popleft()
+
 
 class SummarizerService:
-    def __init__(self) -> None:
-        print(f"🚀 Loading {MODEL_NAME} …")
-        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    def __init__(self, pipe: Any = None, tokenizer: Any = None) -> None:
+        """
+        Loads MODEL_NAME, or uses the given pipe + tokenizer (benchmarks,
+        load tests).  HF_MODEL=stub selects the deterministic stub model.
+        """
+        if pipe is None and MODEL_NAME == "stub":
+            from services.stub_model import StubPipeline, StubTokenizer
+
+            pipe, tokenizer = StubPipeline(), StubTokenizer()
+        if pipe is None:
+            pipe, tokenizer = self._load_model()
+        self.pipe = pipe
+        self.tokenizer = tokenizer
+        self._prompt_tokens = len(self.tokenizer(PROMPT, add_special_tokens=False).input_ids)
+        self.batch_stats = BatchStats()   # cumulative, across requests
+        self._flights = SingleFlight()    # coalesces identical in-flight summaries
+        logger.info("Model ready", extra={"model": MODEL_NAME})
+
+    def _load_model(self) -> Tuple[Any, Any]:
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+
+        logger.info("Loading model", extra={"model": MODEL_NAME})
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 
         load_kwargs: dict = {}
         if torch.cuda.is_available():
             if USE_8BIT:
-                print("⚡  8-bit GPU")
+                logger.info("Using 8-bit GPU")
                 load_kwargs = dict(load_in_8bit=True, device_map="auto")
             elif USE_FP16:
-                print("⚡  fp16 GPU")
+                logger.info("Using fp16 GPU")
                 load_kwargs = dict(torch_dtype=torch.float16, device_map="auto")
             else:
-                print("⚡  fp32 GPU")
+                logger.info("Using fp32 GPU")
                 load_kwargs = dict(device_map="auto")
         elif torch.backends.mps.is_available() and USE_FP16:
-            print("🍎  Apple-silicon fp16 (MPS)")
+            logger.info("Using Apple-silicon fp16 (MPS)")
             load_kwargs = dict(torch_dtype=torch.float16, device_map={"": "mps"})
         else:
-            print("💻  CPU mode")
+            logger.info("Using CPU")
             load_kwargs = dict(device_map={"": "cpu"})
 
         self.model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME, **load_kwargs)
 
         pipe_kwargs = dict(
             model=self.model,
-            tokenizer=self.tokenizer,
-            num_beams=5,
+            tokenizer=tokenizer,
+            num_beams=NUM_BEAMS,
             length_penalty=0.9,
             early_stopping=True,
             no_repeat_ngram_size=3,
@@ -74,42 +177,97 @@ class SummarizerService:
         if not any(k in load_kwargs for k in ("device_map", "load_in_8bit")):
             pipe_kwargs["device"] = 0 if torch.cuda.is_available() else -1
 
-        self.pipe: Pipeline = pipeline("summarization", **pipe_kwargs)
-        print("✅  Model ready!")
+        return pipeline("summarization", **pipe_kwargs), tokenizer
 
     @staticmethod
     def _clean(txt: str) -> str:
-        return re.sub(r"\s+", " ", txt).strip()
+        return text_processing.clean_whitespace(txt)
 
     @staticmethod
     def _is_meta_line(line: str) -> bool:
-        l = line.strip().lower()
-        return (
-            l.startswith(("abstract —", "write an academic abstract"))
-            or "for confidential support" in l
-            or re.search(r"(http|www\.)", l)
-            or re.search(r"@\w+", l)
-            or any(bad in l for bad in ["click here", "follow us", "back to", "prize", "winner", "submit", "feature"])
-        )
+        return text_processing.is_meta_line(line)
 
     def _strip_prompt(self, text: str) -> str:
-        lines = [l for l in text.splitlines() if not self._is_meta_line(l)]
-        cleaned_text = "\n".join(lines)
-        cleaned_text = re.sub(r'@\w+', '', cleaned_text)
-        cleaned_text = re.sub(r'(http|www\.)\S+', '', cleaned_text)
-        cleaned_text = re.sub(r'(click here|follow us|back to|prize|winner|submit|feature).*', '', cleaned_text, flags=re.I)
-        return cleaned_text
+        return text_processing.strip_meta(text)
 
-    def _chunk(self, text: str) -> List[str]:
+    def _chunk_tokens(self, text: str) -> List[Tuple[str, int]]:
+        """Like _chunk, but also returns each chunk's token count."""
         ids = self.tokenizer(text, add_special_tokens=False).input_ids
         if len(ids) <= CHUNK_TOKENS:
-            return [text]
+            return [(text, len(ids))]
         step = CHUNK_TOKENS - OVERLAP_TOKENS
         return [
-            self.tokenizer.decode(ids[i : i + CHUNK_TOKENS], skip_special_tokens=True)
+            (self.tokenizer.decode(ids[i : i + CHUNK_TOKENS], skip_special_tokens=True), len(ids[i : i + CHUNK_TOKENS]))
             for i in range(0, len(ids), step)
         ]
 
+    def _chunk(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self._chunk_tokens(text)]
+
+    def _iter_chunk_tokens(self, pieces: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """
+        _chunk_tokens over "".join(pieces), holding about one chunk of token
+        ids at a time.  Pieces must meet at whitespace (iter_clean_input's
+        do), so tokenizing them one by one gives the whole text's ids.
+        """
+        step = CHUNK_TOKENS - OVERLAP_TOKENS
+        ids: List[int] = []
+        head: Optional[List[str]] = []   # the text itself, while it still fits one chunk
+        for piece in pieces:
+            ids.extend(self.tokenizer(piece, add_special_tokens=False).input_ids)
+            if head is not None:
+                if len(ids) <= CHUNK_TOKENS:
+                    head.append(piece)
+                    continue
+                head = None
+            while len(ids) >= CHUNK_TOKENS:
+                yield self.tokenizer.decode(ids[:CHUNK_TOKENS], skip_special_tokens=True), CHUNK_TOKENS
+                del ids[:step]
+        if head is not None:
+            yield "".join(head), len(ids)
+            return
+        while ids:
+            yield self.tokenizer.decode(ids[:CHUNK_TOKENS], skip_special_tokens=True), min(len(ids), CHUNK_TOKENS)
+            del ids[:step]
+
+    @staticmethod
+    def _chunk_sizes(n_tokens: int) -> List[int]:
+        """Token count of each chunk _chunk_tokens makes from an n_tokens text."""
+        if n_tokens <= CHUNK_TOKENS:
+            return [n_tokens]
+        step = CHUNK_TOKENS - OVERLAP_TOKENS
+        return [min(CHUNK_TOKENS, n_tokens - i) for i in range(0, n_tokens, step)]
+
+    def _batch_item(self, index: int, chunk: str, n_tok: int) -> BatchItem:
+        tgt_words = max(30, int(len(chunk.split()) * OUTPUT_RATIO))
+        mx, mn = quantize_target(int(tgt_words * TOKEN_SCALE))
+        return BatchItem(index, chunk, n_tok + self._prompt_tokens, mx, mn)
+
+    def _generate_batch(self, batch: List[BatchItem], num_beams: int = NUM_BEAMS) -> List[str]:
+        """One padded generate call over a batch of prompt-prefixed chunks."""
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check()  # time ran out while this batch was queued
+        start = time.perf_counter()
+        with timed("summarize.generate"):
+            res = self.pipe(
+                [PROMPT + it.text for it in batch],
+                max_length=batch[0].max_length,
+                min_length=batch[0].min_length,
+                truncation=True,
+                batch_size=len(batch),
+                num_beams=num_beams,
+                stopping_criteria=stopping_criteria(deadline),
+            )
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(deadline.reason)  # decoding was cut short
+        texts = [r["summary_text"] for r in res]
+        generated = sum(len(ids) for ids in self.tokenizer(texts, add_special_tokens=False).input_ids)
+        record_generation(
+            "summarize", sum(it.n_tokens for it in batch), generated, time.perf_counter() - start
+        )
+        return [self._ensure_period(self._clean(t)) for t in texts]
+
     @staticmethod
     def _ensure_period(s: str) -> str:
         return s.rstrip(" ,;:\n").rstrip(".!?") + "."
@@ -119,80 +277,271 @@ class SummarizerService:
         text: str,
         academic: bool = True,
         bullet_points: bool | None = None,
+        user_id: str | None = None,
     ) -> str:
+        """
+        Summarise `text`.  Identical concurrent calls (same content +
+        options, from any user) share a single inference run, admitted
+        against the budget of the user who started it.  Raises
+        services.admission.AdmissionRejected when the job is over budget.
+
+        Honours the request deadline (utils.deadline): if it passes, returns
+        a PartialSummary of the chunks that finished (in document order), or
+        raises DeadlineExceeded when none did.
+        """
+        key = request_key(content_hash(text, normalize=False), academic, bullet_points)
+        while True:
+            try:
+                return await self._flights.do(key, lambda: self._summarize(text, academic, bullet_points, user_id))
+            except AdmissionRejected as exc:
+                if exc.status_code == 413 or exc.user_id == (user_id or "anonymous"):
+                    raise   # too large for anyone, or our own budget
+                # another user's budget turned the shared run down: start (or join) one under ours
+
+    @staticmethod
+    def _split_sections(text: str) -> List[str]:
+        # SECTION-AWARE SPLITTING: before lines that look like headings
+        return text_processing.split_sections(text)
 
-        print("\n[DEBUG] Raw extracted text (first 500 chars):\n", text[:500])
-        text = self._clean(self._strip_prompt(text))
-        print("[DEBUG] Cleaned input text (first 500 chars):\n", text[:500])
+    @staticmethod
+    def _postprocess(summary: str) -> str:
+        return text_processing.postprocess_summary(summary)
+
+    def _prepare(self, text: str) -> "_Prepared | str":
+        """Clean, split and chunk `text`; returns a message instead when there is nothing to summarise."""
+        log_payload(logger, "Raw input text", lambda: text)
+        with timed("summarize.clean"):
+            text = text_processing.clean_input(text)
+        log_payload(logger, "Cleaned input text", lambda: text)
         if not text:
-            print("[DEBUG] Cleaned text is empty after cleaning.")
+            logger.debug("Cleaned text is empty")
             return "No content."
-        if len(text.split()) < 10:
-            print("[DEBUG] Cleaned text too short after cleaning.")
+        if len(text.split(None, 10)) < 10:   # word count, without listing every word
+            logger.debug("Cleaned text too short")
             return "Content too short or invalid after cleaning."
 
-        # SECTION-AWARE SPLITTING
-        # Split on lines that look like section headings (title case, all caps, or surrounded by whitespace)
-        section_pattern = re.compile(r"(?:^|\n)([A-Z][A-Za-z0-9\- ]{3,40})(?:\n|$)")
-        sections = []
-        last_idx = 0
-        for match in section_pattern.finditer(text):
-            start = match.start(1)
-            if last_idx < start:
-                section_text = text[last_idx:start].strip()
-                if section_text:
-                    sections.append(section_text)
-            last_idx = start
-        # Add the last section
-        if last_idx < len(text):
-            section_text = text[last_idx:].strip()
-            if section_text:
-                sections.append(section_text)
-        # If no sections found, treat the whole text as one section
-        if not sections:
-            sections = [text]
-        print(f"[DEBUG] Detected {len(sections)} sections for summarization.")
-
-        # Summarize each section individually
-        loop = asyncio.get_running_loop()
-        def summarize_section(section):
-            # Use the same summarization logic as before, but on the section
-            chunks = self._chunk(section)
-            tgt_words = [max(30, int(len(c.split()) * OUTPUT_RATIO)) for c in chunks]
-            max_tok = [min(1000, int(w * TOKEN_SCALE)) for w in tgt_words]
-            min_tok = [int(mx * 0.60) for mx in max_tok]
-            out = []
-            for chunk, mx, mn in zip(chunks, max_tok, min_tok):
-                res = self.pipe(PROMPT + chunk, max_length=mx, min_length=mn, truncation=True)[0]["summary_text"]
-                out.append(self._ensure_period(self._clean(res)))
-            return " ".join(out)
-        section_summaries = await asyncio.gather(*[loop.run_in_executor(None, summarize_section, sec) for sec in sections])
-        summary = " ".join(section_summaries)
-
-        summary = re.sub(r'for confidential support.*', '', summary, flags=re.I | re.S)
-        summary = re.sub(r'(http|www\.)\S+', '', summary)
-        summary = re.sub(r'@\w+', '', summary)
-        summary = re.sub(r'(click here|follow us|back to|prize|winner|submit|feature).*', '', summary, flags=re.I)
-        summary = re.sub(r'\s{2,}', ' ', summary).strip()
-        # Remove repeated prompt instructions at the end
-        summary = re.sub(
-            r"(write an academic abstract.*?in a scholarly tone:.*?)+", "", summary, flags=re.I | re.S
-        )
-        summary = re.sub(
-            r"(write an academic abstract.*?in a academic tone:.*?)+", "", summary, flags=re.I | re.S
-        )
-        summary = re.sub(r"authors say\.\.", "authors say.", summary)
-        # Remove any trailing incomplete sentences or meta lines
-        summary = re.sub(r"([.?!])[^.?!]*$", r"\1", summary)
-        summary = summary.strip()
-        if not summary.endswith('.'):
-            summary += '.'
-        print("[DEBUG] Final section-aware summary (first 500 chars):\n", summary[:500])
+        with timed("summarize.split"):
+            sections = self._split_sections(text)
+        logger.debug("Split into sections", extra={"sections": len(sections)})
+
+        items: List[BatchItem] = []
+        owners: List[int] = []
+        with timed("summarize.tokenize"):
+            for sec_idx, sec in enumerate(sections):
+                for chunk, n_tok in self._chunk_tokens(sec):
+                    items.append(self._batch_item(len(items), chunk, n_tok))
+                    owners.append(sec_idx)
+        return _Prepared(text, len(sections), items, owners)
+
+    async def _iter_batches(
+        self, items: Iterable[BatchItem], ticket: Ticket, deadline: Optional[Deadline], window: Optional[int] = None
+    ) -> AsyncIterator[Tuple[List[BatchItem], List[str]]]:
+        """
+        Batch chunks by length + target so padded generate calls waste as
+        little as possible; yield (batch, outputs) as each batch finishes.
+        Batches still queued at the deadline are cancelled.
+
+        With `window`, `items` is consumed lazily in the executor (_Lots),
+        `window` chunks at a time (each lot planned on its own), and only
+        about `window` chunks' worth of batches are queued for inference at
+        once.
+        """
+        admission = get_admission()
+        stats = BatchStats()
+
+        async def call(b: List[BatchItem]) -> Tuple[List[BatchItem], List[str]]:
+            return b, await admission.run(ticket, max(it.n_tokens for it in b) * len(b), self._generate_batch, b, ticket.beams)
+
+        async def next_call(lots: _Lots) -> Optional[Tuple[List[BatchItem], List[str]]]:
+            b = await lots.next()
+            return None if b is None else await call(b)
+
+        if window is None:
+            calls: Iterable[Any] = (call(b) for b in plan_batches(list(items), BATCH_SIZE))
+            limit = None
+        else:
+            lots = _Lots(items, window)
+            # one call per free slot; each takes whichever batch is next once its lot is ready
+            calls = (next_call(lots) for _ in iter(lambda: lots.exhausted, True))
+            limit = max(1, window // BATCH_SIZE)
+        try:
+            with timed("summarize.inference"):
+                async for _, done in iter_until(calls, deadline, limit):
+                    if done is None:
+                        continue
+                    batch, outs = done
+                    stats.record(batch)
+                    yield batch, outs
+        finally:
+            self.batch_stats.merge(stats)
+            logger.debug("Batched chunks", extra=stats.as_dict())
+
+    def _assemble(
+        self, sections: int, owners: Sequence[int], lead: str, results: List[Optional[str]], deadline: Optional[Deadline]
+    ) -> str:
+        """
+        Join chunk outputs (document order; `owners` = section of each) into
+        the final summary.  `lead` is the cleaned text, or enough of its
+        start for the short-summary fallback.
+        """
+        per_section: List[List[Optional[str]]] = [[] for _ in range(sections)]
+        for sec_idx, out in zip(owners, results):
+            per_section[sec_idx].append(out)
+        # after a deadline, keep what finished
+        finished = [out for out in results if out is not None]
+        if not finished:
+            reason = (deadline.reason if deadline is not None else None) or "deadline"
+            DEADLINE_EVENTS.inc(op="summarize", outcome=reason)
+            raise DeadlineExceeded(reason)
+        section_summaries = [" ".join(out for out in outs if out is not None) for outs in per_section]
+        summary = " ".join(s for s in section_summaries if s)
+
+        with timed("summarize.postprocess"):
+            summary = self._postprocess(summary)
+        log_payload(logger, "Final summary", lambda: summary)
+        if len(finished) < len(results):
+            sections_completed = sum(all(out is not None for out in outs) for outs in per_section)
+            DEADLINE_EVENTS.inc(op="summarize", outcome="partial")
+            logger.info("Deadline hit; returning partial summary", extra={
+                "reason": deadline.reason if deadline is not None else None,
+                "chunks_completed": len(finished),
+                "chunks_total": len(results),
+            })
+            return PartialSummary(summary, len(finished), len(results), sections_completed, sections)
         # Fallback: if summary is too short, return first 3 sentences of cleaned input
-        if len(summary.split()) < 20:
-            print("[DEBUG] Section-aware summary too short after all processing. Returning fallback.")
-            fallback = '. '.join(text.split('. ')[:3]).strip()
+        if len(summary.split(None, 20)) < 20:
+            logger.debug("Summary too short after post-processing; returning fallback")
+            fallback = '. '.join(lead.split('. ')[:3]).strip()
             if not fallback.endswith('.'):
                 fallback += '.'
             return fallback or "Summary could not be generated."
         return summary
+
+    async def _summarize(
+        self,
+        text: str,
+        academic: bool = True,
+        bullet_points: bool | None = None,
+        user_id: str | None = None,
+    ) -> str:
+        if len(text) >= STREAM_MIN_CHARS:
+            return await self._summarize_streaming(text, user_id)
+        # cleaning + tokenizing is CPU work: keep it off the event loop
+        prep = await run_in_executor("summarize.prepare", self._prepare, text)
+        if isinstance(prep, str):
+            return prep
+
+        # Price the whole job before any inference; may downgrade or reject
+        ticket = get_admission().admit("summarize", user_id, prep.tokens, NUM_BEAMS)
+        deadline = current_deadline()
+        results: List[Optional[str]] = [None] * len(prep.items)
+        async for batch, outs in self._iter_batches(prep.items, ticket, deadline):
+            for it, out in zip(batch, outs):
+                results[it.index] = out
+        return self._assemble(prep.sections, prep.owners, prep.text, results, deadline)
+
+    async def _summarize_streaming(self, text: str, user_id: str | None = None) -> str:
+        """
+        _summarize for large inputs, in roughly constant memory: cleaning,
+        tokenizing and decoding chunks happen lazily as inference frees up
+        room (STREAM_INFLIGHT chunks at a time), and chunk texts are dropped
+        once summarised.  A first pass only counts tokens, to price the job
+        before any inference.  Same output as the in-memory path: cleaning
+        joins all lines, so a cleaned document is always a single section.
+        """
+        log_payload(logger, "Raw input text", lambda: text)
+        n_tokens, n_words, lead = await run_in_executor("summarize.count", self._count_stream, text)
+        if not lead:
+            logger.debug("Cleaned text is empty")
+            return "No content."
+        if n_words < 10:
+            logger.debug("Cleaned text too short")
+            return "Content too short or invalid after cleaning."
+
+        sizes = self._chunk_sizes(n_tokens)
+        ticket = get_admission().admit("summarize", user_id, sum(sizes) + self._prompt_tokens * len(sizes), NUM_BEAMS)
+        deadline = current_deadline()
+        items = (
+            self._batch_item(i, chunk, n_tok)
+            for i, (chunk, n_tok) in enumerate(self._iter_chunk_tokens(text_processing.iter_clean_input(text)))
+        )
+        results: List[Optional[str]] = [None] * len(sizes)
+        async for batch, outs in self._iter_batches(items, ticket, deadline, window=STREAM_INFLIGHT):
+            for it, out in zip(batch, outs):
+                results[it.index] = out
+        return self._assemble(1, [0] * len(sizes), lead, results, deadline)
+
+    def _count_stream(self, text: str) -> Tuple[int, int, str]:
+        """Streaming pre-pass: (tokens, words up to 10, the first three sentences) of the cleaned text."""
+        n_tokens, n_words, lead, lead_breaks = 0, 0, "", 0
+        with timed("summarize.tokenize"):
+            for piece in text_processing.iter_clean_input(text):
+                n_tokens += len(self.tokenizer(piece, add_special_tokens=False).input_ids)
+                if n_words < 10:
+                    n_words += len(piece.split(None, 10))
+                if lead_breaks < 3:   # the fallback needs the first three sentences
+                    lead_breaks += (lead[-1:] + piece).count(". ")
+                    lead += piece
+        return n_tokens, n_words, lead
+
+    async def summarize_many(
+        self, texts: Sequence[str], user_ids: Sequence[Optional[str]]
+    ) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+        """
+        Summarise many documents (`user_ids[i]` owns `texts[i]`) as a single
+        job: chunks from all of them share length-bucketed batches, so a bulk
+        import runs at the model's batch throughput.  Yields (index, summary)
+        as each document completes, or (index, exception) for one that was
+        rejected by admission control or got nothing done before the deadline.
+        """
+        admission = get_admission()
+        deadline = current_deadline()
+        preps: Dict[int, _Prepared] = {}
+        pools: Dict[int, List[BatchItem]] = defaultdict(list)   # beams → pooled chunks
+        where: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        owners = {user_id or "anonymous" for user_id in user_ids}
+        for i, (text, user_id) in enumerate(zip(texts, user_ids)):
+            prep = await run_in_executor("summarize.prepare", self._prepare, text)
+            if isinstance(prep, str):
+                yield i, prep
+                continue
+            # each document is priced on its own owner's budget, so one
+            # oversized note doesn't sink the whole import
+            try:
+                ticket = admission.admit("summarize", user_id, prep.tokens, NUM_BEAMS)
+            except AdmissionRejected as exc:
+                yield i, exc
+                continue
+            preps[i] = prep
+            pool = pools[ticket.beams]
+            for j, it in enumerate(prep.items):
+                where[ticket.beams].append((i, j))
+                pool.append(BatchItem(len(pool), it.text, it.n_tokens, it.max_length, it.min_length))
+
+        results = {i: [None] * len(p.items) for i, p in preps.items()}
+        remaining = {i: len(p.items) for i, p in preps.items()}
+
+        async def run_pool(beams: int) -> AsyncIterator[Tuple[int, int, str]]:
+            pool = pools[beams]
+            # bulk work: ordinary weight in the fair queue, as one tenant (its
+            # only owner, or BATCH_TENANT for a mixed import)
+            owner = next(iter(owners)) if len(owners) == 1 else BATCH_TENANT
+            ticket = Ticket("summarize", owner, sum(it.n_tokens for it in pool) * beams, beams, 1.0)
+            async for batch, outs in self._iter_batches(pool, ticket, deadline):
+                for it, out in zip(batch, outs):
+                    doc, j = where[beams][it.index]
+                    yield doc, j, out
+
+        for beams in list(pools):
+            async for doc, j, out in run_pool(beams):
+                results[doc][j] = out
+                remaining[doc] -= 1
+                if remaining[doc] == 0:
+                    prep = preps.pop(doc)
+                    yield doc, self._assemble(prep.sections, prep.owners, prep.text, results.pop(doc), deadline)
+
+        for doc, prep in preps.items():  # cut short by the deadline
+            try:
+                yield doc, self._assemble(prep.sections, prep.owners, prep.text, results[doc], deadline)
+            except DeadlineExceeded as exc:
+                yield doc, exc
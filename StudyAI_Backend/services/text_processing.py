@@ -0,0 +1,274 @@
+# services/text_processing.py
+"""
+Text cleaning + post-processing shared by SummarizerService and
+FlashcardService.
+
+• Patterns are compiled once, at import
+• Meta-line filter: the text is lowercased once, then each line gets plain
+  substring tests (a combined alternation measured ~4x slower than those
+  for literal needles, so only "@handle" is left to a regex)
+• Guards: a cleanup pass only runs when its trigger text occurs at all.
+  For IGNORECASE patterns the test is done on the lowercased text; that is
+  exact unless the text holds one of the four characters re folds onto
+  ASCII letters (İ ı ſ K), in which case the pass always runs
+• Promo tails ("click here …" to end of line) are cut with str.find
+  instead of a case-insensitive alternation scan
+• Whitespace collapse via str.split, stopwords in a frozenset
+
+Output is identical to the per-call re.sub chains this replaced;
+bench/legacy_text.py keeps those, and `python -m bench.run --only text
+flashcards` times both on 1 MB inputs and checks they agree, there and on
+an adversarial corpus.
+"""
+from __future__ import annotations
+
+import re
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# ---------- shared ---------- #
+_MULTI_WS_RE = re.compile(r"\s{2,}")
+_MENTION_RE = re.compile(r"@\w+")
+_URL_RE = re.compile(r"(http|www\.)\S+")
+_SENTENCE_RE = re.compile(r"[^.!?]+")   # the pieces re.split(r"[.!?]+") leaves, minus the empty ones
+
+_NOISE_WORDS = ("click here", "follow us", "back to", "prize", "winner", "submit", "feature")
+_NOISE_TAIL_RE = re.compile(r"(click here|follow us|back to|prize|winner|submit|feature).*", re.I)
+
+# the only non-ASCII characters an IGNORECASE pattern matches against ASCII letters
+_FOLDS_TO_ASCII = ("\u0130", "\u0131", "\u017f", "\u212a")
+
+
+def _folds_exactly(text: str) -> bool:
+    """Does `needle in text.lower()` decide IGNORECASE matches of lowercase-ASCII needles?"""
+    return text.isascii() or not any(ch in text for ch in _FOLDS_TO_ASCII)
+
+
+def _may_match_ci(text: str, needles: Iterable[str]) -> bool:
+    """Could an IGNORECASE pattern that needs one of `needles` match `text`?"""
+    if not _folds_exactly(text):
+        return True
+    low = text.lower()
+    return any(needle in low for needle in needles)
+
+
+def _cut_noise_tails(text: str) -> str:
+    """_NOISE_TAIL_RE.sub("", text): every line loses everything from its first promo phrase on."""
+    if not _folds_exactly(text):
+        return _NOISE_TAIL_RE.sub("", text)
+    low = text.lower()
+    starts = []
+    for word in _NOISE_WORDS:
+        i = low.find(word)
+        while i != -1:
+            starts.append(i)
+            i = low.find(word, i + 1)
+    if not starts:
+        return text
+    starts.sort()
+    out, pos = [], 0
+    for start in starts:
+        if start < pos:  # inside a tail already cut
+            continue
+        out.append(text[pos:start])
+        end = text.find("\n", start)
+        pos = len(text) if end == -1 else end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def clean_whitespace(text: str) -> str:
+    r"""re.sub(r"\s+", " ", text).strip(), ~4x faster (\s and str.isspace agree on every code point)."""
+    return " ".join(text.split())
+
+
+def sentences(text: str, min_chars: int, limit: Optional[int] = None) -> List[str]:
+    """
+    Split on runs of .!? and keep the stripped pieces longer than
+    min_chars – the first `limit` of them, without scanning past those.
+    """
+    found = (s for s in (m.group().strip() for m in _SENTENCE_RE.finditer(text)) if len(s) > min_chars)
+    return list(islice(found, limit))
+
+
+# ---------- summariser input ---------- #
+_META_PREFIXES = ("abstract —", "write an academic abstract")
+_META_WORDS = ("for confidential support", "http", "www.") + _NOISE_WORDS
+_MENTION_START_RE = re.compile(r"@\w")
+_SECTION_HEADING_RE = re.compile(r"(?:^|\n)([A-Z][A-Za-z0-9\- ]{3,40})(?:\n|$)")
+
+
+def _is_meta_lower(low: str) -> bool:
+    if low.lstrip().startswith(_META_PREFIXES):
+        return True
+    for word in _META_WORDS:
+        if word in low:
+            return True
+    return "@" in low and _MENTION_START_RE.search(low) is not None
+
+
+def is_meta_line(line: str) -> bool:
+    """Prompt echoes, support boilerplate, links, @handles and promo lines."""
+    return _is_meta_lower(line.lower())
+
+
+def _lowered_lines(text: str, lines: List[str]) -> List[str]:
+    lowered = text.lower()
+    if len(lowered) == len(text):  # no character grew when lowercased → same line breaks
+        low_lines = lowered.splitlines()
+        if len(low_lines) == len(lines):
+            return low_lines
+    return [line.lower() for line in lines]
+
+
+def strip_meta(text: str) -> str:
+    """Drop meta lines, then @handles, URLs and promo tails from what is left."""
+    lines = text.splitlines()
+    text = "\n".join(line for line, low in zip(lines, _lowered_lines(text, lines)) if not _is_meta_lower(low))
+    if "@" in text:
+        text = _MENTION_RE.sub("", text)
+    if "http" in text or "www." in text:
+        text = _URL_RE.sub("", text)
+    return _cut_noise_tails(text)
+
+
+def clean_input(text: str) -> str:
+    """strip_meta + whitespace collapse: what the summariser feeds the model."""
+    return clean_whitespace(strip_meta(text))
+
+
+def iter_clean_input(text: str, block_chars: int = 1 << 16) -> Iterator[str]:
+    """
+    clean_input(text) in pieces, without building the cleaned string:
+    "".join(iter_clean_input(text)) == clean_input(text).  strip_meta only
+    ever looks within a line, so the text is cleaned a block of whole lines
+    at a time.  Pieces after the first start with the joining space.
+    """
+    sep, start = "", 0
+    while start < len(text):
+        end = text.find("\n", start + block_chars)
+        end = len(text) if end == -1 else end + 1
+        words = strip_meta(text[start:end]).split()
+        if words:
+            yield sep + " ".join(words)
+            sep = " "
+        start = end
+
+
+def split_sections(text: str) -> List[str]:
+    """Split before lines that look like headings; the whole text when there are none."""
+    sections = []
+    last_idx = 0
+    for match in _SECTION_HEADING_RE.finditer(text):
+        start = match.start(1)
+        if last_idx < start:
+            section_text = text[last_idx:start].strip()
+            if section_text:
+                sections.append(section_text)
+        last_idx = start
+    if last_idx < len(text):
+        section_text = text[last_idx:].strip()
+        if section_text:
+            sections.append(section_text)
+    return sections or [text]
+
+
+# ---------- summariser output ---------- #
+_CONFIDENTIAL_RE = re.compile(r"for confidential support.*", re.I | re.S)
+_PROMPT_ECHO_RES = (
+    re.compile(r"(write an academic abstract.*?in a scholarly tone:.*?)+", re.I | re.S),
+    re.compile(r"(write an academic abstract.*?in a academic tone:.*?)+", re.I | re.S),
+)
+_TRAILING_FRAGMENT_RE = re.compile(r"([.?!])[^.?!]*$")
+
+
+def postprocess_summary(summary: str) -> str:
+    """Strip boilerplate, links and prompt echoes; end on a complete sentence."""
+    if _may_match_ci(summary, ("for confidential support",)):
+        summary = _CONFIDENTIAL_RE.sub("", summary)
+    if "http" in summary or "www." in summary:
+        summary = _URL_RE.sub("", summary)
+    if "@" in summary:
+        summary = _MENTION_RE.sub("", summary)
+    summary = _cut_noise_tails(summary)
+    summary = _MULTI_WS_RE.sub(" ", summary).strip()
+    if _may_match_ci(summary, ("write an academic abstract",)):
+        for pattern in _PROMPT_ECHO_RES:
+            summary = pattern.sub("", summary)
+    summary = summary.replace("authors say..", "authors say.")
+    summary = _TRAILING_FRAGMENT_RE.sub(r"\1", summary).strip()
+    if not summary.endswith("."):
+        summary += "."
+    return summary
+
+
+# ---------- flashcards ---------- #
+_CODE_BLOCK_RE = re.compile(r"```.*?```", re.DOTALL)
+_INLINE_CODE_RE = re.compile(r"`.*?`")
+
+# (pattern, lowercase text every match contains – checked with _may_match_ci)
+_QA_PATTERNS: Sequence[Tuple["re.Pattern[str]", Tuple[str, ...]]] = (
+    (re.compile(r"Q:\s*(.*?)\s*A:\s*(.*?)(?=Q:|$)", re.DOTALL | re.IGNORECASE), ("q:", "a:")),
+    (re.compile(r"Question:\s*(.*?)\s*Answer:\s*(.*?)(?=Question:|$)", re.DOTALL | re.IGNORECASE), ("question:", "answer:")),
+    (re.compile(r"\d+\.\s*(.*?\?)\s*(.*?)(?=\d+\.|$)", re.DOTALL | re.IGNORECASE), ("?",)),   # "1. question? answer"
+    (re.compile(r"([^.!?]+\?)\s*(.*?)(?=[^.!?]+\?|$)", re.DOTALL | re.IGNORECASE), ("?",)),   # "question? answer"
+)
+_LEADING_NUMBER_RE = re.compile(r"^\d+\.\s*")
+_BRACKETS_RE = re.compile(r"\[.*?\]")
+_PARENS_RE = re.compile(r"\(.*?\)")
+
+STOPWORDS = frozenset([
+    "the", "this", "that", "these", "those", "what", "when", "where", "which", "who", "why", "how",
+    "there", "during", "extract", "important", "sentences", "text", "could", "used", "educational",
+    "flashcards", "focus", "definitions", "processes", "concepts",
+])
+
+
+def clean_flashcard_text(text: str) -> str:
+    """Collapse whitespace and drop code blocks / inline code."""
+    text = clean_whitespace(text)
+    if "`" in text:
+        text = _CODE_BLOCK_RE.sub("", text)
+        text = _INLINE_CODE_RE.sub("", text)
+    return text
+
+
+def parse_qa_pairs(response: str) -> List[Tuple[str, str]]:
+    """
+    (question, answer) pairs from a model response: the first Q/A format
+    that yields usable pairs wins; otherwise "What is X?" cards from the
+    response's sentences.  At most 15.
+    """
+    response = clean_whitespace(response)
+    pairs: List[Tuple[str, str]] = []
+    for pattern, needles in _QA_PATTERNS:
+        if not all(_may_match_ci(response, (needle,)) for needle in needles):
+            continue
+        for question, answer in pattern.findall(response):
+            question = _BRACKETS_RE.sub("", _LEADING_NUMBER_RE.sub("", question.strip()))
+            answer = _PARENS_RE.sub("", _BRACKETS_RE.sub("", _LEADING_NUMBER_RE.sub("", answer.strip())))
+            if not question.endswith("?"):
+                question += "?"
+            if len(question) > 10 and len(answer) > 10:
+                pairs.append((question, answer))
+        if pairs:
+            break
+
+    if not pairs:
+        for sentence in sentences(response, 20, limit=10):
+            words = sentence.split()
+            if len(words) > 5:
+                key_word = words[0] if words[0].istitle() else "this concept"
+                pairs.append((f"What is {key_word}?", sentence))
+    return pairs[:15]
+
+
+def key_term(words: Sequence[str]) -> Optional[str]:
+    """The sentence's topic: first capitalised non-stopword, else first long non-stopword."""
+    for word in words:
+        if word[0].isupper() and len(word) > 3 and word.lower() not in STOPWORDS:
+            return word
+    for word in words:
+        if len(word) > 4 and word.lower() not in STOPWORDS:
+            return word.capitalize()
+    return None
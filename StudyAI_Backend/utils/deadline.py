@@ -0,0 +1,242 @@
+# utils/deadline.py
+"""
+Per-request deadlines + cancellation of abandoned inference.
+
+• Deadline          – set by the HTTP middleware from the X-Request-Timeout
+                      header (seconds) or REQUEST_DEADLINE_SECONDS, carried
+                      in a contextvar (so executor threads see it too, via
+                      utils.metrics.run_in_executor)
+• stopping_criteria – generate() stopping criterion that ends decoding at
+                      the next step once the deadline passes or is cancelled
+• iter_until        – yields results as they finish; at the deadline cancels
+                      queued work (gather_until: same, as a list with None
+                      for what didn't finish).  Optionally bounds how many
+                      run at once, pulling the rest lazily
+• watch_disconnect  – cancels the request's deadline when the HTTP client
+                      goes away
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.metrics import REGISTRY, Counter
+
+# ─────── Configuration ───────
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+MAX_DEADLINE_SECONDS     = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "600"))  # 0 = uncapped
+DISCONNECT_POLL_SECONDS  = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+DEADLINE_HEADER          = "x-request-timeout"
+# ────────────────────────────────────────
+
+DEADLINE_EVENTS = REGISTRY.register(Counter(
+    "studyai_deadline_total", "Requests cut short by their deadline or a client disconnect.", ["op", "outcome"]))
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed (or its client left) before any usable result."""
+
+
+class Deadline:
+    def __init__(self, seconds: Optional[float]) -> None:
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()   # read from executor threads
+
+    @classmethod
+    def from_header(
+        cls, value: Optional[str], default: float = DEFAULT_DEADLINE_SECONDS, cap: float = MAX_DEADLINE_SECONDS
+    ) -> "Deadline":
+        """The header's seconds, or `default`; at most `cap` (0 = uncapped).  Routes with longer work pass their own."""
+        seconds = default
+        if value:
+            try:
+                seconds = float(value)
+            except ValueError:
+                pass
+        if seconds <= 0:
+            seconds = cap   # "no deadline" still gets the server's cap
+        elif cap:
+            seconds = min(seconds, cap)
+        return cls(seconds or None)
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if self.reason is None:
+            self.reason = reason
+        self._cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        if self._cancelled.is_set():
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        if self._cancelled.is_set():
+            return True
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            if self.reason is None:
+                self.reason = "deadline"
+            return True
+        return False
+
+    def check(self) -> None:
+        if self.expired():
+            raise DeadlineExceeded(self.reason or "deadline")
+
+    async def wait(self) -> None:
+        """Return once the deadline has passed or been cancelled."""
+        while not self.expired():
+            remaining = self.remaining()
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS if remaining is None else min(remaining, DISCONNECT_POLL_SECONDS))
+
+
+deadline_var: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return deadline_var.get()
+
+
+# ---------- generation ---------- #
+_criterion_cls: Any = None
+
+
+def _criterion_class() -> Any:
+    global _criterion_cls
+    if _criterion_cls is None:
+        try:
+            from transformers import StoppingCriteria
+        except ImportError:  # stub model
+            StoppingCriteria = object
+
+        class DeadlineCriterion(StoppingCriteria):  # type: ignore[misc, valid-type]
+            """Checked by generate() between decode steps."""
+
+            def __init__(self, deadline: Deadline) -> None:
+                self.deadline = deadline
+
+            def __call__(self, input_ids: Any = None, scores: Any = None, **kwargs: Any) -> Any:
+                stop = self.deadline.expired()
+                if input_ids is None:
+                    return stop
+                import torch
+
+                return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+        _criterion_cls = DeadlineCriterion
+    return _criterion_cls
+
+
+def stopping_criteria(deadline: Optional[Deadline]) -> Any:
+    """generate(stopping_criteria=…) for `deadline`, or None without one."""
+    if deadline is None:
+        return None
+    criterion = _criterion_class()(deadline)
+    try:
+        from transformers import StoppingCriteriaList
+    except ImportError:
+        return [criterion]
+    return StoppingCriteriaList([criterion])
+
+
+# ---------- scheduling ---------- #
+async def iter_until(
+    aws: Iterable[Awaitable[Any]], deadline: Optional[Deadline], limit: Optional[int] = None
+) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield (index, result) as the awaitables finish, until `deadline` passes
+    or is cancelled; whatever is unfinished then is cancelled (queued chunks
+    never start).  Work that itself hit the deadline is skipped; any other
+    exception propagates.
+
+    With `limit`, at most that many run at once and the rest are pulled
+    from `aws` only as earlier ones finish – pass a generator, so work that
+    never starts is never built.
+    """
+    source = iter(aws)
+    numbering = itertools.count()
+    index: Dict[asyncio.Future, int] = {}
+    pending: Set[asyncio.Future] = set()
+
+    def start_more() -> None:
+        while limit is None or len(pending) < limit:
+            aw = next(source, None)
+            if aw is None:
+                return
+            t = asyncio.ensure_future(aw)
+            index[t] = next(numbering)
+            pending.add(t)
+
+    stopper = asyncio.ensure_future(deadline.wait()) if deadline is not None else None
+    try:
+        start_more()
+        while pending and not (stopper is not None and stopper.done()):
+            waiting = pending | {stopper} if stopper is not None else pending
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t is stopper:
+                    continue
+                pending.discard(t)
+                i = index.pop(t)
+                if t.cancelled():
+                    continue
+                exc = t.exception()
+                if exc is None:
+                    yield i, t.result()
+                elif not isinstance(exc, DeadlineExceeded):
+                    raise exc
+            if not (stopper is not None and stopper.done()):
+                start_more()
+    finally:
+        if stopper is not None:
+            stopper.cancel()
+        for t in pending:
+            if not t.done():
+                t.cancel()
+        close = getattr(source, "close", None)
+        if close is not None:
+            close()
+
+
+async def gather_until(aws: Iterable[Awaitable[Any]], deadline: Optional[Deadline]) -> List[Any]:
+    """asyncio.gather on top of iter_until: what didn't finish comes back as None."""
+    aws = list(aws)
+    results: List[Any] = [None] * len(aws)
+    async for i, result in iter_until(aws, deadline):
+        results[i] = result
+    return results
+
+
+@asynccontextmanager
+async def watch_disconnect(request: Any, deadline: Optional[Deadline]) -> AsyncIterator[None]:
+    """
+    While the body runs, poll request.is_disconnected() and cancel the
+    deadline once the client is gone.  Use it around the request's own
+    wait, never inside work shared through utils.singleflight: there the
+    disconnect only drops this waiter, and the work stops once every
+    waiter has gone.
+    """
+    if deadline is None:
+        yield
+        return
+
+    async def poll() -> None:
+        while not deadline.expired():
+            if await request.is_disconnected():
+                deadline.cancel("client_disconnected")
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.ensure_future(poll())
+    try:
+        yield
+    finally:
+        watcher.cancel()
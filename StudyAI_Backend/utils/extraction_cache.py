@@ -0,0 +1,222 @@
+# utils/extraction_cache.py
+"""
+On-disk cache of extracted upload text (PDF parsing / OCR).
+
+• Key  = SHA-256 of the raw file bytes + extractor kind + extractor settings
+• Value = zlib-compressed UTF-8 text, stored in one SQLite file
+• Size-bounded: least-recently-used entries are evicted past CACHE_MAX_BYTES
+• Lifetime hit / miss counters are kept in the same file
+
+CLI (run from StudyAI_Backend/):
+    python -m utils.extraction_cache stats
+    python -m utils.extraction_cache warm handout.pdf slide1.png …
+    python -m utils.extraction_cache prune [--max-mb N]
+    python -m utils.extraction_cache clear
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Optional
+
+from utils.hashing import bytes_hash, request_key
+
+# ─────── Configuration ───────
+CACHE_ENABLED   = os.getenv("EXTRACTION_CACHE", "1") == "1"
+CACHE_PATH      = os.getenv(
+    "EXTRACTION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "extraction.sqlite3"),
+)
+CACHE_MAX_BYTES = int(float(os.getenv("EXTRACTION_CACHE_MAX_MB", "256")) * 1024 * 1024)
+# ────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       TEXT PRIMARY KEY,
+    kind      TEXT NOT NULL,
+    data      BLOB NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class ExtractionCache:
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0      # this process only; lifetime totals live in `counters`
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ---------- keys ---------- #
+    @staticmethod
+    def key(kind: str, data: bytes, settings: str = "") -> str:
+        return request_key(kind, settings, bytes_hash(data))
+
+    # ---------- core ---------- #
+    def _bump(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._bump("misses")
+                return None
+            self.hits += 1
+            self._bump("hits")
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key: str, kind: str, text: str) -> None:
+        blob = zlib.compress(text.encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, data, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, blob, len(blob), time.time()),
+            )
+            self._evict_locked(self.max_bytes)
+
+    def get_or_extract(
+        self,
+        kind: str,
+        data: bytes,
+        extractor: Callable[[bytes], str],
+        settings: str = "",
+    ) -> str:
+        """Return cached text for these bytes, or run `extractor` and cache it."""
+        key = self.key(kind, data, settings)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        text = extractor(data)
+        if text.strip():  # failed / empty extractions are retried next time
+            self.put(key, kind, text)
+        return text
+
+    # ---------- maintenance ---------- #
+    def _evict_locked(self, max_bytes: int) -> int:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        removed = 0
+        if total <= max_bytes:
+            return removed
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        return removed
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Evict LRU entries until the cache fits `max_bytes`; returns #removed."""
+        with self._lock:
+            return self._evict_locked(self.max_bytes if max_bytes is None else max_bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM counters")
+        self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "lifetime_hits": hits,
+            "lifetime_misses": misses,
+            "lifetime_hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+
+_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Process-wide cache, or None when EXTRACTION_CACHE=0."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
+
+
+def cached_extract(kind: str, data: bytes, extractor: Callable[[bytes], str], settings: str = "") -> str:
+    cache = get_extraction_cache()
+    if cache is None:
+        return extractor(data)
+    return cache.get_or_extract(kind, data, extractor, settings)
+
+
+# ---------- CLI ---------- #
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the StudyAI extraction cache.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="print size and hit-rate counters")
+    warm = sub.add_parser("warm", help="extract + cache the given PDF / image files")
+    warm.add_argument("files", nargs="+")
+    prune = sub.add_parser("prune", help="evict LRU entries down to a size limit")
+    prune.add_argument("--max-mb", type=float, default=None)
+    sub.add_parser("clear", help="drop every entry and counter")
+    args = parser.parse_args()
+
+    cache = ExtractionCache()
+    if args.cmd == "warm":
+        from services.parser import OCR_SETTINGS, extract_text_from_image
+        from services.pdf_parser import PDF_SETTINGS, extract_text_from_pdf
+
+        for path in args.files:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            if path.lower().endswith(".pdf"):
+                text = cache.get_or_extract("pdf", data, extract_text_from_pdf, PDF_SETTINGS)
+            else:
+                text = cache.get_or_extract("image", data, extract_text_from_image, OCR_SETTINGS)
+            print(f"{path}: {len(text)} chars")
+    elif args.cmd == "prune":
+        limit = None if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+        print(f"Evicted {cache.prune(limit)} entries")
+    elif args.cmd == "clear":
+        cache.clear()
+        print("Cache cleared")
+
+    for name, value in cache.stats().items():
+        print(f"{name:>20}: {value}")
+
+
+if __name__ == "__main__":
+    _main()
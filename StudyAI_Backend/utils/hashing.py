@@ -0,0 +1,29 @@
+# utils/hashing.py
+"""
+Stable content hashes used as dedup / coalescing keys.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any
+
+
+def bytes_hash(data: bytes | bytearray) -> str:
+    """SHA-256 hex digest of raw bytes (uploads)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_hash(text: str, normalize: bool = True) -> str:
+    """
+    SHA-256 of text.  By default whitespace is collapsed first so re-flowed
+    copies match; pass normalize=False when line structure matters.
+    """
+    if normalize:
+        text = re.sub(r"\s+", " ", text).strip()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def request_key(*parts: Any) -> str:
+    """Join a content hash with request parameters into one opaque key."""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
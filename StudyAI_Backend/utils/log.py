@@ -0,0 +1,234 @@
+# utils/log.py
+"""
+Structured, non-blocking logging + lightweight request tracing.
+
+• get_logger(name)   – stdlib logger whose records are emitted as one JSON
+                       object per line, tagged with request / trace ids.
+                       `extra` keys that would overwrite a LogRecord
+                       attribute (filename, module, …) are logged as
+                       `extra_<key>` (warned once per key) – logging never
+                       fails the caller
+• Non-blocking       – loggers only enqueue; a QueueListener thread does the
+                       actual stdout write, so the event loop never blocks on I/O
+• Sampling           – LOG_SAMPLE_RATE keeps that share of DEBUG/INFO records
+                       (warnings and errors are always kept)
+• log_payload()      – user-content debug dumps, off unless LOG_PAYLOADS=1;
+                       the payload is built lazily, so disabled = free
+• span(name)         – trace span that follows one request across parsing,
+                       inference and persistence (TRACING=1 logs span timings,
+                       TRACING=otel hands spans to OpenTelemetry if installed)
+"""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+# ─────── Configuration ───────
+LOG_LEVEL        = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT       = os.getenv("LOG_FORMAT", "json")          # json | text
+LOG_FILE         = os.getenv("LOG_FILE", "")                # append here instead of stdout
+LOG_SAMPLE_RATE  = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_PAYLOADS     = os.getenv("LOG_PAYLOADS", "0") == "1"
+PAYLOAD_CHARS    = int(os.getenv("LOG_PAYLOAD_CHARS", "500"))
+TRACING          = os.getenv("TRACING", "0").lower()        # 0 | 1 | otel
+# ────────────────────────────────────────
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+span_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span_id", default=None)
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_RESERVED_EXTRA = frozenset(_RESERVED | {"request_id", "trace_id", "span_id"})   # the last three: _ContextFilter's
+
+
+class _GuardedLogger(logging.Logger):
+    """
+    Renames reserved `extra` keys before the level check.  The stdlib raises
+    KeyError on them when it builds a record, so a bad key in a debug() call
+    would pass at INFO and fail the request once DEBUG is turned on.
+    """
+
+
+_warned_keys: set = set()
+
+
+def _safe_extra(logger: logging.Logger, extra: Any) -> Any:
+    """`extra` with reserved keys prefixed `extra_`; the first use of each is warned about."""
+    if not extra:
+        return extra
+    clash = _RESERVED_EXTRA.intersection(extra)
+    if not clash:
+        return extra
+    new = sorted(clash - _warned_keys)
+    if new:
+        _warned_keys.update(new)
+        logging.Logger.warning(
+            logger, "Reserved logging `extra` key(s) renamed with an extra_ prefix; rename them at the call site",
+            extra={"renamed_keys": new}, stacklevel=3,
+        )
+    return {f"extra_{key}" if key in clash else key: value for key, value in extra.items()}
+
+
+def _guarded(method: Callable[..., None]) -> Callable[..., None]:
+    def call(self: logging.Logger, *args: Any, **kwargs: Any) -> None:
+        if "extra" in kwargs:
+            kwargs["extra"] = _safe_extra(self, kwargs["extra"])
+        kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1   # report the caller, not this wrapper
+        method(self, *args, **kwargs)
+    return call
+
+
+for _name in ("debug", "info", "warning", "error", "exception", "critical", "log"):
+    setattr(_GuardedLogger, _name, _guarded(getattr(logging.Logger, _name)))
+
+
+def _guard(logger: logging.Logger) -> logging.Logger:
+    if type(logger) is logging.Logger:
+        logger.__class__ = _GuardedLogger
+    return logger
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps ids on the record (in the caller's context) and applies sampling."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+            return False
+        record.request_id = request_id_var.get()
+        record.trace_id = trace_id_var.get()
+        record.span_id = span_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and value is not None and not key.startswith("_"):
+                doc[key] = value
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        rid = getattr(record, "request_id", None)
+        base = f"{record.levelname:<7} {record.name} {'[' + rid + '] ' if rid else ''}{record.getMessage()}"
+        if record.exc_info:
+            base += "\n" + self.formatException(record.exc_info)
+        return base
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Idempotent: route the `studyai` logger tree through a background queue."""
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.FileHandler(LOG_FILE) if LOG_FILE else logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger("studyai")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)  # drain on shutdown
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return _guard(logging.getLogger(f"studyai.{name}"))
+
+
+def log_payload(logger: logging.Logger, msg: str, make_payload: Callable[[], Any]) -> None:
+    """
+    Debug-log user content.  Does nothing (and never calls make_payload)
+    unless LOG_PAYLOADS=1 and DEBUG is enabled for this logger.
+    """
+    if LOG_PAYLOADS and logger.isEnabledFor(logging.DEBUG):
+        payload = make_payload()
+        if isinstance(payload, str):
+            payload = payload[:PAYLOAD_CHARS]
+        logger.debug(msg, extra={"payload": payload})
+
+
+# ---------- request ids ---------- #
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+# ---------- tracing ---------- #
+_otel_tracer = None
+if TRACING == "otel":
+    try:
+        from opentelemetry import trace as _otel_trace  # optional dependency
+
+        _otel_tracer = _otel_trace.get_tracer("studyai")
+    except ImportError:
+        TRACING = "1"
+
+_trace_log = _guard(logging.getLogger("studyai.trace"))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """
+    Trace span.  With TRACING=0 (default) this is a no-op; otherwise child
+    spans inherit the trace id through contextvars (asyncio tasks and
+    utils.metrics.run_in_executor both carry the context along).
+    """
+    if TRACING in ("0", "", "false"):
+        yield
+        return
+    if _otel_tracer is not None:
+        with _otel_tracer.start_as_current_span(name, attributes=attributes or None):
+            yield
+        return
+
+    configure_logging()
+    trace_id = trace_id_var.get() or uuid.uuid4().hex
+    parent = span_id_var.get()
+    span_id = uuid.uuid4().hex[:16]
+    t_tok = trace_id_var.set(trace_id)
+    s_tok = span_id_var.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        _trace_log.info(
+            name,
+            extra={"span": name, "parent_id": parent, "duration_ms": duration_ms, "error": error, **attributes},
+        )
+        span_id_var.reset(s_tok)
+        trace_id_var.reset(t_tok)
@@ -0,0 +1,219 @@
+# utils/metrics.py
+"""
+Dependency-free Prometheus metrics + per-stage timing spans.
+
+• Counter / Gauge / Histogram with labels, rendered in the Prometheus text
+  exposition format by REGISTRY.render() (served on GET /metrics)
+• timed("stage") – context manager / decorator recording wall time into
+  studyai_stage_seconds{stage=…}; also opens a utils.log trace span
+• run_in_executor() – like loop.run_in_executor, but records how long the
+  job waited for a worker thread and carries contextvars (request / trace
+  ids) into it
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.log import span
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Set explicitly, or computed at scrape time from `fn`."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, fn: Optional[Callable[[], float]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.fn = fn
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {float(self.fn())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # per label-set: [bucket counts…, +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(c), t[0]) for k, (c, t) in self._values.items()]
+        lines: List[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(m.render() for m in list(self._metrics.values()))
+
+
+REGISTRY = Registry()
+
+# ---------- StudyAI metrics ---------- #
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "studyai_stage_seconds", "Wall time spent in each pipeline stage.", ["stage"]))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "studyai_http_request_seconds", "End-to-end HTTP request latency.", ["method", "route", "status"]))
+EXECUTOR_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "studyai_executor_queue_wait_seconds", "Time a job waited for an executor thread.", ["op"]))
+INPUT_TOKENS = REGISTRY.register(Histogram(
+    "studyai_input_tokens", "Input tokens per generate call.", ["op"], buckets=SIZE_BUCKETS))
+GENERATED_TOKENS = REGISTRY.register(Histogram(
+    "studyai_generated_tokens", "Generated tokens per generate call.", ["op"], buckets=SIZE_BUCKETS))
+TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "studyai_generated_tokens_per_second", "Decode throughput per generate call.", ["op"], buckets=RATE_BUCKETS))
+INPUT_TOKENS_TOTAL = REGISTRY.register(Counter(
+    "studyai_input_tokens_total", "Input tokens fed to the model.", ["op"]))
+GENERATED_TOKENS_TOTAL = REGISTRY.register(Counter(
+    "studyai_generated_tokens_total", "Tokens generated by the model.", ["op"]))
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed_fn(stage: str) -> Callable:
+    """Decorator form of timed(); works on sync and async functions."""
+    def deco(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def record_generation(op: str, input_tokens: int, generated_tokens: int, seconds: float) -> None:
+    INPUT_TOKENS.observe(input_tokens, op=op)
+    GENERATED_TOKENS.observe(generated_tokens, op=op)
+    INPUT_TOKENS_TOTAL.inc(input_tokens, op=op)
+    GENERATED_TOKENS_TOTAL.inc(generated_tokens, op=op)
+    if seconds > 0:
+        TOKENS_PER_SECOND.observe(generated_tokens / seconds, op=op)
+
+
+async def run_in_executor(op: str, fn: Callable, *args: Any) -> Any:
+    """loop.run_in_executor(None, fn, *args) that also records queue wait."""
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+    ctx = contextvars.copy_context()
+
+    def call() -> Any:
+        EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - submitted, op=op)
+        return ctx.run(fn, *args)
+
+    return await loop.run_in_executor(None, call)
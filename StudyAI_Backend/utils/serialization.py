@@ -0,0 +1,93 @@
+# utils/serialization.py
+"""
+Response bodies for the large payloads (summaries, flashcard sets, sync
+pages, search hits).
+
+• JSON via orjson when it is installed, compact stdlib json otherwise –
+  straight from the route's dicts, so FastAPI's jsonable_encoder copy of
+  the whole payload is skipped
+• pydantic models (Flashcard …) are encoded where they sit in the payload,
+  without their None fields – routes don't build dict lists for them
+• MessagePack when the client asks for it (`Accept: application/msgpack`)
+  and the optional msgpack package is installed; JSON otherwise
+• gzip when the client accepts it and the body is at least
+  RESPONSE_GZIP_MIN_BYTES
+"""
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import json
+import os
+from typing import Any, Dict, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson  # optional dependency
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # optional dependency
+except ImportError:
+    msgpack = None
+
+# ─────── Configuration ───────
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL     = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+# ────────────────────────────────────────
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+_MSGPACK_ACCEPT = (MSGPACK_TYPE, "application/x-msgpack")
+
+
+def _default(obj: Any) -> Any:
+    """Whatever orjson / json / msgpack can't encode natively."""
+    if isinstance(obj, BaseModel):
+        dump = getattr(obj, "model_dump", None) or obj.dict   # pydantic 2 / 1
+        return dump(exclude_none=True)
+    if isinstance(obj, (dt.datetime, dt.date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(payload: Any) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+def wants_msgpack(accept: str) -> bool:
+    accept = accept.lower()
+    return msgpack is not None and any(media in accept for media in _MSGPACK_ACCEPT)
+
+
+def encode_body(payload: Any, accept: str = "", accept_encoding: str = "") -> Tuple[bytes, str, Dict[str, str]]:
+    """(body, media type, headers) for `payload` as the client's Accept / Accept-Encoding ask."""
+    if wants_msgpack(accept):
+        data, media_type = msgpack.packb(payload, default=_default, use_bin_type=True), MSGPACK_TYPE
+    else:
+        data, media_type = dumps(payload), JSON_TYPE
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(data) >= RESPONSE_GZIP_MIN_BYTES and "gzip" in accept_encoding.lower():
+        data = gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return data, media_type, headers
+
+
+def encoded(request: Request, payload: Any, status_code: int = 200) -> Response:
+    """The route's result as a ready Response, negotiated from the request headers."""
+    body, media_type, headers = encode_body(
+        payload,
+        request.headers.get("accept", ""),
+        request.headers.get("accept-encoding", ""),
+    )
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
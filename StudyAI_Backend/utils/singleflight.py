@@ -0,0 +1,124 @@
+# utils/singleflight.py
+"""
+Single-flight request coalescing.
+
+Concurrent callers that ask for the same key while a computation is still
+running attach to that computation and receive the same result (or the same
+exception).  Nothing is cached once the computation finishes.
+
+The shared work belongs to no single caller (utils.deadline):
+• it runs under its own deadline, the latest of its current waiters'
+  deadlines (none if any waiter has none)
+• a waiter whose client disconnects, or whose deadline passes while a
+  longer-lived waiter keeps the work going, leaves with DeadlineExceeded;
+  the others keep waiting
+• only when every waiter has left is the work's deadline cancelled (queued
+  inference is dropped) and the key freed for a fresh start
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.deadline import Deadline, DeadlineExceeded, deadline_var
+
+
+class _FlightDeadline(Deadline):
+    """
+    Expires with the last of its waiters' deadlines, read live: a waiter's
+    own deadline may be a flight deadline further out that is still being
+    extended (nested flights, e.g. note → summariser).
+    """
+
+    def __init__(self) -> None:
+        self.waiters: List[Optional[Deadline]] = []
+        super().__init__(None)
+
+    @property
+    def expires_at(self) -> Optional[float]:  # type: ignore[override]
+        ends = [None if w is None else w.expires_at for w in self.waiters]
+        if not ends or None in ends:
+            return None
+        return max(ends)
+
+    @expires_at.setter
+    def expires_at(self, value: Optional[float]) -> None:
+        pass   # derived from the waiters
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.deadline = _FlightDeadline()
+        self.task: Optional[asyncio.Future] = None
+
+    @property
+    def waiters(self) -> List[Optional[Deadline]]:
+        return self.deadline.waiters
+
+    def outlives(self, deadline: Deadline) -> bool:
+        """Will the shared work keep running after `deadline` has passed?"""
+        ends = self.deadline.expires_at
+        return ends is None or (deadline.expires_at is not None and ends > deadline.expires_at)
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: Dict[str, _Flight] = {}
+        self.leaders = 0     # computations actually started
+        self.followers = 0   # callers that piggy-backed on one
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            flight = self._start(key, fn)
+        mine = deadline_var.get()
+        flight.waiters.append(mine)
+        try:
+            return await self._wait(flight, mine)
+        finally:
+            flight.waiters.remove(mine)
+            if not flight.waiters and not flight.task.done():
+                # nobody left to receive it: stop the work, let a newcomer start afresh
+                flight.deadline.cancel("abandoned")
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+
+    def _start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> _Flight:
+        flight = _Flight()
+
+        async def run() -> Any:
+            deadline_var.set(flight.deadline)   # the task's own context copy, not the caller's
+            return await fn()
+
+        flight.task = asyncio.ensure_future(run())
+        self._inflight[key] = flight
+
+        def done(task: asyncio.Future) -> None:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+            if not task.cancelled():
+                task.exception()   # retrieved, even when every waiter has gone
+
+        flight.task.add_done_callback(done)
+        return flight
+
+    @staticmethod
+    async def _wait(flight: _Flight, mine: Optional[Deadline]) -> Any:
+        # shield: a waiter going away must not cancel the shared work
+        if mine is None:
+            return await asyncio.shield(flight.task)
+        stopper = asyncio.ensure_future(mine.wait())
+        try:
+            await asyncio.wait({flight.task, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopper.cancel()
+        if flight.task.done() or (mine.reason == "deadline" and not flight.outlives(mine)):
+            # the work shares this deadline: its (partial) result is moments away
+            return await asyncio.shield(flight.task)
+        raise DeadlineExceeded(mine.reason or "deadline")
@@ -0,0 +1,731 @@
+# utils/storage.py
+"""
+Pluggable persistence for notes, summaries and flashcard sets.
+
+• StorageBackend  – the interface main.py talks to
+• FirestoreStorage – thin adapter over the helpers in firebase.py
+• SQLiteStorage    – local single-file backend (offline benchmarks, load
+                     tests, single-node deployments); no Google credentials
+• changes_since    – delta-sync reads: every write stamps updatedAt, every
+                     delete leaves a tombstone, and each kind is read as an
+                     (updatedAt, id) range after the client's cursor
+
+Pick one with STORAGE_BACKEND=firestore|sqlite (default: firestore).
+Every method returns the same dict shapes as the firebase.py helpers.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.log import get_logger
+
+# ─────── Configuration ───────
+STORAGE_BACKEND     = os.getenv("STORAGE_BACKEND", "firestore").lower()
+SQLITE_STORAGE_PATH = os.getenv(
+    "SQLITE_STORAGE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "studyai.sqlite3"),
+)
+TOMBSTONE_TTL_DAYS  = int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", "30"))   # older cursors get a full resync
+# ────────────────────────────────────────
+
+# delta sync: what the client syncs; a cursor position is (updatedAt µs, id)
+SYNC_KINDS = ("notes", "summaries", "flashcard_sets", "tombstones")
+SyncPosition = Tuple[int, str]
+
+logger = get_logger("storage")
+
+
+# ---------- ids ---------- #
+def _sanitize(key: str) -> str:
+    return key.replace(" ", "_").replace("/", "-").strip()
+
+
+def new_note_ids(source: str, title: str, summary_type: str) -> tuple[str, str]:
+    """
+    Ids for a note + its summary; callers may mint them before the write.
+    The note id is the source + title: a second note with that title is
+    refused, whether written now or through the write-behind queue.
+    """
+    note_id = f"{_sanitize(source)}_{_sanitize(title)}"
+    return note_id, f"{note_id}_{summary_type}_{uuid.uuid4().hex[:8]}"
+
+
+def new_flashcard_set_id(set_name: str) -> str:
+    return f"flashcard_set_{_sanitize(set_name)}_{uuid.uuid4().hex[:8]}"
+
+
+def tombstone_id(kind: str, item_id: str) -> str:
+    return f"{kind}:{item_id}"
+
+
+def _card_dicts(flashcards: List[Any]) -> List[Dict[str, str]]:
+    return [
+        {"id": f"card_{i}_{uuid.uuid4().hex[:4]}", "question": card.question, "answer": card.answer}
+        for i, card in enumerate(flashcards)
+    ]
+
+
+# ---------- interface ---------- #
+class StorageBackend(ABC):
+    """Everything the API persists.  Methods mirror the firebase.py helpers."""
+
+    # notes + summaries
+    @abstractmethod
+    def save_note(
+        self,
+        *,
+        user_id: str,
+        title: str,
+        content: str,
+        summary: str,
+        source: str,
+        summary_type: str = "bullet_points",
+        content_hash: str | None = None,
+        upload_hash: str | None = None,
+        summary_id: str | None = None,
+        note_id: str | None = None,
+    ) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def find_note_by_hash(
+        self,
+        user_id: str,
+        *,
+        content_hash: str | None = None,
+        upload_hash: str | None = None,
+    ) -> Optional[Dict[str, str]]: ...
+
+    @abstractmethod
+    def note_exists(self, user_id: str, note_id: str) -> bool: ...
+
+    @abstractmethod
+    def delete_summary_and_note(self, user_id: str, summary_id: str) -> Dict[str, Any]: ...
+
+    # bulk variants – backends override these with batched round trips
+    def save_notes(self, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """save_note(**note) for each note; results in the same order."""
+        return [self.save_note(**note) for note in notes]
+
+    def find_notes_by_hashes(self, user_id: str, content_hashes: List[str]) -> Dict[str, Dict[str, str]]:
+        """Content hash → find_note_by_hash result, for the hashes that exist."""
+        found = {}
+        for h in dict.fromkeys(content_hashes):
+            hit = self.find_note_by_hash(user_id, content_hash=h)
+            if hit:
+                found[h] = hit
+        return found
+
+    def delete_summaries_and_notes(self, user_id: str, summary_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Summary id → delete_summary_and_note result."""
+        return {sid: self.delete_summary_and_note(user_id, sid) for sid in dict.fromkeys(summary_ids)}
+
+    # flashcard sets
+    @abstractmethod
+    def save_flashcard_set(
+        self,
+        *,
+        user_id: str,
+        set_name: str,
+        flashcards: List[Any],
+        note_id: str | None = None,
+        note_title: str | None = None,
+        set_id: str | None = None,
+    ) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def get_user_flashcard_sets(self, user_id: str) -> List[Dict]: ...
+
+    @abstractmethod
+    def get_flashcard_set(self, user_id: str, set_id: str) -> Dict: ...
+
+    @abstractmethod
+    def delete_flashcard_set(self, user_id: str, set_id: str) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def update_flashcard_set(self, user_id: str, set_id: str, flashcards: List[Any]) -> Dict[str, Any]: ...
+
+    # delta sync
+    @abstractmethod
+    def changes_since(
+        self, user_id: str, kind: str, after: Optional[SyncPosition], limit: int
+    ) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """
+        Up to `limit` (updatedAt µs, id, record) of `kind` written after
+        `after`, oldest first.  Records use the client's field names with
+        epoch-millisecond times; a tombstone record is {"kind", "id"}.
+        """
+
+    def ensure_sync_stamps(self, user_id: str) -> None:
+        """Make sure every stored item has an updatedAt stamp (run before a first sync)."""
+
+    def get_flashcard_sets(self, user_id: str, set_ids: List[str]) -> Dict[str, Dict]:
+        """Set id → get_flashcard_set result."""
+        return {set_id: self.get_flashcard_set(user_id, set_id) for set_id in dict.fromkeys(set_ids)}
+
+    def delete_flashcard_sets(self, user_id: str, set_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Set id → delete_flashcard_set result."""
+        return {set_id: self.delete_flashcard_set(user_id, set_id) for set_id in dict.fromkeys(set_ids)}
+
+
+# ---------- Firestore ---------- #
+class FirestoreStorage(StorageBackend):
+    def __init__(self) -> None:
+        import firebase  # imported lazily: pulls in firebase_admin
+
+        self._fb = firebase
+        firebase.get_db()  # fail fast on missing credentials
+
+    def save_note(self, **kwargs) -> Dict[str, Any]:
+        return self._fb.save_note_to_firestore(**kwargs)
+
+    def find_note_by_hash(self, user_id: str, **kwargs) -> Optional[Dict[str, str]]:
+        return self._fb.find_note_by_hash(user_id, **kwargs)
+
+    def note_exists(self, user_id: str, note_id: str) -> bool:
+        return self._fb.note_exists(user_id, note_id)
+
+    def save_notes(self, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._fb.save_notes_to_firestore(notes)
+
+    def find_notes_by_hashes(self, user_id: str, content_hashes: List[str]) -> Dict[str, Dict[str, str]]:
+        return self._fb.find_notes_by_hashes(user_id, content_hashes)
+
+    def delete_summary_and_note(self, user_id: str, summary_id: str) -> Dict[str, Any]:
+        return self._fb.delete_summary_and_note(user_id, summary_id)
+
+    def delete_summaries_and_notes(self, user_id: str, summary_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return self._fb.delete_summaries_and_notes(user_id, summary_ids)
+
+    def save_flashcard_set(self, **kwargs) -> Dict[str, Any]:
+        return self._fb.save_flashcard_set_to_firestore(**kwargs)
+
+    def get_user_flashcard_sets(self, user_id: str) -> List[Dict]:
+        return self._fb.get_user_flashcard_sets(user_id)
+
+    def get_flashcard_set(self, user_id: str, set_id: str) -> Dict:
+        return self._fb.get_flashcard_set(user_id, set_id)
+
+    def delete_flashcard_set(self, user_id: str, set_id: str) -> Dict[str, Any]:
+        return self._fb.delete_flashcard_set(user_id, set_id)
+
+    def update_flashcard_set(self, user_id: str, set_id: str, flashcards: List[Any]) -> Dict[str, Any]:
+        return self._fb.update_flashcard_set(user_id, set_id, flashcards)
+
+    def changes_since(
+        self, user_id: str, kind: str, after: Optional[SyncPosition], limit: int
+    ) -> List[Tuple[int, str, Dict[str, Any]]]:
+        return self._fb.changes_since(user_id, kind, after, limit)
+
+    def ensure_sync_stamps(self, user_id: str) -> None:
+        self._fb.backfill_updated_at(user_id)
+
+    def get_flashcard_sets(self, user_id: str, set_ids: List[str]) -> Dict[str, Dict]:
+        return self._fb.get_flashcard_sets(user_id, set_ids)
+
+    def delete_flashcard_sets(self, user_id: str, set_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return self._fb.delete_flashcard_sets(user_id, set_ids)
+
+
+# ---------- SQLite ---------- #
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    user_id      TEXT NOT NULL,
+    note_id      TEXT NOT NULL,
+    name         TEXT,
+    content      TEXT,
+    source       TEXT,
+    summary_id   TEXT,
+    content_hash TEXT,
+    upload_hash  TEXT,
+    created_at   REAL NOT NULL,
+    updated_us   INTEGER,
+    PRIMARY KEY (user_id, note_id)
+);
+CREATE INDEX IF NOT EXISTS idx_notes_user_created ON notes (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_notes_user_content_hash ON notes (user_id, content_hash);
+CREATE INDEX IF NOT EXISTS idx_notes_user_upload_hash ON notes (user_id, upload_hash);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id      TEXT NOT NULL,
+    summary_id   TEXT NOT NULL,
+    note_id      TEXT NOT NULL,
+    summary      TEXT,
+    summary_type TEXT,
+    created_at   REAL NOT NULL,
+    updated_us   INTEGER,
+    PRIMARY KEY (user_id, summary_id)
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_user_created ON summaries (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_summaries_user_note ON summaries (user_id, note_id);
+
+CREATE TABLE IF NOT EXISTS flashcard_sets (
+    user_id    TEXT NOT NULL,
+    set_id     TEXT NOT NULL,
+    name       TEXT,
+    note_id    TEXT,
+    note_title TEXT,
+    flashcards TEXT NOT NULL,
+    card_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_us INTEGER,
+    PRIMARY KEY (user_id, set_id)
+);
+CREATE INDEX IF NOT EXISTS idx_flashcard_sets_user_created ON flashcard_sets (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS tombstones (
+    user_id      TEXT NOT NULL,
+    tombstone_id TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    item_id      TEXT NOT NULL,
+    updated_us   INTEGER NOT NULL,
+    PRIMARY KEY (user_id, tombstone_id)
+);
+"""
+
+# run after _migrate(), which adds updated_us to databases created before delta sync
+_SYNC_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_notes_user_updated ON notes (user_id, updated_us, note_id);
+CREATE INDEX IF NOT EXISTS idx_summaries_user_updated ON summaries (user_id, updated_us, summary_id);
+CREATE INDEX IF NOT EXISTS idx_flashcard_sets_user_updated ON flashcard_sets (user_id, updated_us, set_id);
+CREATE INDEX IF NOT EXISTS idx_tombstones_user_updated ON tombstones (user_id, updated_us, tombstone_id);
+"""
+
+# kind → (table, id column, columns → record fields)
+_SYNC_TABLES = {
+    "notes": ("notes", "note_id", {
+        "name": "name", "content": "content", "source": "source", "summary_id": "summaryId",
+    }),
+    "summaries": ("summaries", "summary_id", {
+        "note_id": "noteId", "summary": "summary", "summary_type": "summaryType",
+    }),
+    "flashcard_sets": ("flashcard_sets", "set_id", {
+        "name": "name", "note_id": "noteId", "note_title": "noteTitle", "flashcards": "flashcards",
+    }),
+}
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts is not None else None
+
+
+def _ms(ts: Optional[float]) -> Optional[int]:
+    return int(ts * 1000) if ts is not None else None
+
+
+def _chunks(values: List[str], size: int = 500) -> List[List[str]]:
+    """Split an IN (…) list to stay under SQLite's bound-variable limit."""
+    return [values[start : start + size] for start in range(0, len(values), size)]
+
+
+class SQLiteStorage(StorageBackend):
+    def __init__(self, path: str = SQLITE_STORAGE_PATH) -> None:
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.executescript(_SYNC_SCHEMA)
+        self._last_us = 0
+
+    def _migrate(self) -> None:
+        for table in ("notes", "summaries", "flashcard_sets"):
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if "updated_us" not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_us INTEGER")
+                self._conn.execute(f"UPDATE {table} SET updated_us = CAST(created_at * 1000000 AS INTEGER)")
+                logger.info("Added updated_us to SQLite table", extra={"table": table})
+
+    def _now_us(self) -> int:
+        """Strictly increasing µs stamp (call under the lock), so a clock step never hides a write."""
+        self._last_us = max(self._last_us + 1, time.time_ns() // 1000)
+        return self._last_us
+
+    def _tombstones(self, user_id: str, kind: str, item_ids: List[str]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tombstones (user_id, tombstone_id, kind, item_id, updated_us) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(user_id, tombstone_id(kind, item_id), kind, item_id, self._now_us()) for item_id in item_ids],
+        )
+
+    # ---------- notes + summaries ---------- #
+    def save_note(
+        self,
+        *,
+        user_id: str,
+        title: str,
+        content: str,
+        summary: str,
+        source: str,
+        summary_type: str = "bullet_points",
+        content_hash: str | None = None,
+        upload_hash: str | None = None,
+        summary_id: str | None = None,
+        note_id: str | None = None,
+    ) -> Dict[str, Any]:
+        new_note_id, new_summary_id = new_note_ids(source, title, summary_type)
+        note_id = note_id or new_note_id
+        summary_id = summary_id or new_summary_id
+        ts = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO notes (user_id, note_id, name, content, source, summary_id, "
+                    "content_hash, upload_hash, created_at, updated_us) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, note_id, title, content, source, summary_id, content_hash, upload_hash, ts,
+                     self._now_us()),
+                )
+                self._conn.execute(
+                    "INSERT INTO summaries (user_id, summary_id, note_id, summary, summary_type, created_at, "
+                    "updated_us) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, summary_id, note_id, summary, summary_type, ts, self._now_us()),
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK")
+                logger.warning("Note already exists – skipping write", extra={"note_id": note_id})
+                return {"success": False, "note_id": note_id, "summary_id": summary_id}
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"success": True, "note_id": note_id, "summary_id": summary_id}
+
+    def find_note_by_hash(
+        self,
+        user_id: str,
+        *,
+        content_hash: str | None = None,
+        upload_hash: str | None = None,
+    ) -> Optional[Dict[str, str]]:
+        column, value = ("content_hash", content_hash) if content_hash else ("upload_hash", upload_hash)
+        if not value:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT n.note_id, s.summary_id, s.summary FROM notes n "
+                f"JOIN summaries s ON s.user_id = n.user_id AND s.summary_id = n.summary_id "
+                f"WHERE n.user_id = ? AND n.{column} = ? LIMIT 1",
+                (user_id, value),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"note_id": row[0], "summary_id": row[1], "summary": row[2]}
+
+    def note_exists(self, user_id: str, note_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM notes WHERE user_id = ? AND note_id = ?", (user_id, note_id)
+            ).fetchone()
+        return row is not None
+
+    def save_notes(self, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """All notes in one transaction; a note whose id exists is skipped."""
+        results = []
+        ts = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for note in notes:
+                    summary_type = note.get("summary_type", "bullet_points")
+                    new_note_id, new_summary_id = new_note_ids(note["source"], note["title"], summary_type)
+                    note_id = note.get("note_id") or new_note_id
+                    summary_id = note.get("summary_id") or new_summary_id
+                    cur = self._conn.execute(
+                        "INSERT OR IGNORE INTO notes (user_id, note_id, name, content, source, summary_id, "
+                        "content_hash, upload_hash, created_at, updated_us) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (note["user_id"], note_id, note["title"], note["content"], note["source"], summary_id,
+                         note.get("content_hash"), note.get("upload_hash"), ts, self._now_us()),
+                    )
+                    if cur.rowcount:
+                        self._conn.execute(
+                            "INSERT INTO summaries (user_id, summary_id, note_id, summary, summary_type, created_at, "
+                            "updated_us) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (note["user_id"], summary_id, note_id, note["summary"], summary_type, ts, self._now_us()),
+                        )
+                    else:
+                        logger.warning("Note already exists – skipping write", extra={"note_id": note_id})
+                    results.append({"success": bool(cur.rowcount), "note_id": note_id, "summary_id": summary_id})
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return results
+
+    def find_notes_by_hashes(self, user_id: str, content_hashes: List[str]) -> Dict[str, Dict[str, str]]:
+        hashes = list(dict.fromkeys(h for h in content_hashes if h))
+        found: Dict[str, Dict[str, str]] = {}
+        with self._lock:
+            for part in _chunks(hashes):
+                rows = self._conn.execute(
+                    "SELECT n.content_hash, n.note_id, s.summary_id, s.summary FROM notes n "
+                    "JOIN summaries s ON s.user_id = n.user_id AND s.summary_id = n.summary_id "
+                    f"WHERE n.user_id = ? AND n.content_hash IN ({','.join('?' * len(part))})",
+                    (user_id, *part),
+                ).fetchall()
+                for h, note_id, summary_id, summary in rows:
+                    found.setdefault(h, {"note_id": note_id, "summary_id": summary_id, "summary": summary})
+        return found
+
+    def delete_summary_and_note(self, user_id: str, summary_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT note_id FROM summaries WHERE user_id = ? AND summary_id = ?",
+                (user_id, summary_id),
+            ).fetchone()
+            if row is None:
+                return {"success": False, "message": "Summary not found"}
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM summaries WHERE user_id = ? AND summary_id = ?", (user_id, summary_id))
+                self._conn.execute("DELETE FROM notes WHERE user_id = ? AND note_id = ?", (user_id, row[0]))
+                self._tombstones(user_id, "summaries", [summary_id])
+                self._tombstones(user_id, "notes", [row[0]])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"success": True, "message": "Deleted", "note_id": row[0]}
+
+    def delete_summaries_and_notes(self, user_id: str, summary_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """One transaction: look the note ids up, then delete summaries + notes."""
+        ids = list(dict.fromkeys(summary_ids))
+        found: Dict[str, str] = {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for part in _chunks(ids):
+                    marks = ",".join("?" * len(part))
+                    found.update(self._conn.execute(
+                        f"SELECT summary_id, note_id FROM summaries WHERE user_id = ? AND summary_id IN ({marks})",
+                        (user_id, *part),
+                    ).fetchall())
+                    self._conn.execute(
+                        f"DELETE FROM summaries WHERE user_id = ? AND summary_id IN ({marks})", (user_id, *part)
+                    )
+                note_ids = list(dict.fromkeys(found.values()))
+                for part in _chunks(note_ids):
+                    self._conn.execute(
+                        f"DELETE FROM notes WHERE user_id = ? AND note_id IN ({','.join('?' * len(part))})",
+                        (user_id, *part),
+                    )
+                self._tombstones(user_id, "summaries", list(found))
+                self._tombstones(user_id, "notes", note_ids)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {
+            sid: {"success": True, "message": "Deleted", "note_id": found[sid]} if sid in found
+            else {"success": False, "message": "Summary not found"}
+            for sid in ids
+        }
+
+    # ---------- flashcard sets ---------- #
+    def save_flashcard_set(
+        self,
+        *,
+        user_id: str,
+        set_name: str,
+        flashcards: List[Any],
+        note_id: str | None = None,
+        note_title: str | None = None,
+        set_id: str | None = None,
+    ) -> Dict[str, Any]:
+        set_id = set_id or new_flashcard_set_id(set_name)
+        cards = _card_dicts(flashcards)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO flashcard_sets (user_id, set_id, name, note_id, note_title, flashcards, "
+                    "card_count, created_at, updated_us) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, set_id, set_name, note_id, note_title, json.dumps(cards), len(cards), time.time(),
+                     self._now_us()),
+                )
+            except sqlite3.IntegrityError:
+                logger.warning("Flashcard set already exists – skipping write", extra={"set_id": set_id})
+                return {"success": False, "set_id": set_id}
+        return {"success": True, "set_id": set_id}
+
+    def get_user_flashcard_sets(self, user_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT set_id, name, note_id, note_title, card_count, created_at FROM flashcard_sets "
+                "WHERE user_id = ? ORDER BY created_at DESC",
+                (user_id,),
+            ).fetchall()
+        return [
+            {
+                "id": set_id,
+                "name": name,
+                "noteId": note_id,
+                "noteTitle": note_title,
+                "flashcardCount": count,
+                "createdAt": _iso(created_at),
+            }
+            for set_id, name, note_id, note_title, count, created_at in rows
+        ]
+
+    def get_flashcard_set(self, user_id: str, set_id: str) -> Dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT set_id, name, note_id, note_title, flashcards, created_at FROM flashcard_sets "
+                "WHERE user_id = ? AND set_id = ?",
+                (user_id, set_id),
+            ).fetchone()
+        if row is None:
+            return {"success": False, "message": "Flashcard set not found"}
+        return {
+            "success": True,
+            "id": row[0],
+            "name": row[1],
+            "noteId": row[2],
+            "noteTitle": row[3],
+            "flashcards": json.loads(row[4]),
+            "createdAt": _iso(row[5]),
+        }
+
+    def delete_flashcard_set(self, user_id: str, set_id: str) -> Dict[str, Any]:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cur = self._conn.execute(
+                    "DELETE FROM flashcard_sets WHERE user_id = ? AND set_id = ?", (user_id, set_id)
+                )
+                if cur.rowcount:
+                    self._tombstones(user_id, "flashcard_sets", [set_id])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not cur.rowcount:
+            return {"success": False, "message": "Flashcard set not found"}
+        return {"success": True, "message": "Deleted"}
+
+    def update_flashcard_set(self, user_id: str, set_id: str, flashcards: List[Any]) -> Dict[str, Any]:
+        cards = _card_dicts(flashcards)
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE flashcard_sets SET flashcards = ?, card_count = ?, updated_us = ? "
+                "WHERE user_id = ? AND set_id = ?",
+                (json.dumps(cards), len(cards), self._now_us(), user_id, set_id),
+            )
+        if not cur.rowcount:
+            return {"success": False, "message": "Flashcard set not found"}
+        return {"success": True, "message": "Updated"}
+
+    def get_flashcard_sets(self, user_id: str, set_ids: List[str]) -> Dict[str, Dict]:
+        ids = list(dict.fromkeys(set_ids))
+        rows = []
+        with self._lock:
+            for part in _chunks(ids):
+                rows += self._conn.execute(
+                    "SELECT set_id, name, note_id, note_title, flashcards, created_at FROM flashcard_sets "
+                    f"WHERE user_id = ? AND set_id IN ({','.join('?' * len(part))})",
+                    (user_id, *part),
+                ).fetchall()
+        found = {
+            row[0]: {
+                "success": True,
+                "id": row[0],
+                "name": row[1],
+                "noteId": row[2],
+                "noteTitle": row[3],
+                "flashcards": json.loads(row[4]),
+                "createdAt": _iso(row[5]),
+            }
+            for row in rows
+        }
+        return {set_id: found.get(set_id, {"success": False, "message": "Flashcard set not found"}) for set_id in ids}
+
+    def delete_flashcard_sets(self, user_id: str, set_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(set_ids))
+        deleted = set()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for part in _chunks(ids):
+                    marks = ",".join("?" * len(part))
+                    deleted.update(r[0] for r in self._conn.execute(
+                        f"SELECT set_id FROM flashcard_sets WHERE user_id = ? AND set_id IN ({marks})",
+                        (user_id, *part),
+                    ))
+                    self._conn.execute(
+                        f"DELETE FROM flashcard_sets WHERE user_id = ? AND set_id IN ({marks})", (user_id, *part)
+                    )
+                self._tombstones(user_id, "flashcard_sets", [set_id for set_id in ids if set_id in deleted])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {
+            set_id: {"success": True, "message": "Deleted"} if set_id in deleted
+            else {"success": False, "message": "Flashcard set not found"}
+            for set_id in ids
+        }
+
+    # ---------- delta sync ---------- #
+    def changes_since(
+        self, user_id: str, kind: str, after: Optional[SyncPosition], limit: int
+    ) -> List[Tuple[int, str, Dict[str, Any]]]:
+        after_us, after_id = after or (-1, "")
+        if kind == "tombstones":
+            with self._lock:
+                cutoff = (time.time() - TOMBSTONE_TTL_DAYS * 86400) * 1_000_000
+                self._conn.execute("DELETE FROM tombstones WHERE user_id = ? AND updated_us < ?", (user_id, cutoff))
+                rows = self._conn.execute(
+                    "SELECT updated_us, tombstone_id, kind, item_id FROM tombstones "
+                    "WHERE user_id = ? AND (updated_us, tombstone_id) > (?, ?) ORDER BY updated_us, tombstone_id LIMIT ?",
+                    (user_id, after_us, after_id, limit),
+                ).fetchall()
+            return [(us, tid, {"kind": k, "id": item_id}) for us, tid, k, item_id in rows]
+
+        table, id_column, fields = _SYNC_TABLES[kind]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT updated_us, {id_column}, created_at, {', '.join(fields)} FROM {table} "
+                f"WHERE user_id = ? AND (updated_us, {id_column}) > (?, ?) ORDER BY updated_us, {id_column} LIMIT ?",
+                (user_id, after_us, after_id, limit),
+            ).fetchall()
+        changes = []
+        for us, item_id, created_at, *values in rows:
+            record = {"id": item_id, **dict(zip(fields.values(), values))}
+            if "flashcards" in record:
+                record["flashcards"] = json.loads(record["flashcards"])
+            record.update(createdAt=_ms(created_at), updatedAt=us // 1000)
+            changes.append((us, item_id, record))
+        return changes
+
+
+# ---------- selection ---------- #
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Process-wide backend chosen by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            _storage = SQLiteStorage()
+        elif STORAGE_BACKEND == "firestore":
+            _storage = FirestoreStorage()
+        else:
+            raise RuntimeError(f"❌ Unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (expected firestore or sqlite)")
+    return _storage
+
+
+def set_storage(backend: StorageBackend) -> None:
+    """Swap the process-wide backend (benchmarks, load tests)."""
+    global _storage
+    _storage = backend
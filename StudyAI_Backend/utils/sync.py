@@ -0,0 +1,110 @@
+# utils/sync.py
+"""
+Delta sync for the mobile client.
+
+• Cursor      – opaque url-safe token: for every kind, the (updatedAt µs,
+                id) of the last change the client has seen, plus when it
+                was issued.  Cursors older than the tombstone TTL force a
+                full resync (`reset`), since deletions may have expired
+• collect     – one page of changes after a cursor, for every kind; the
+                client repeats the call while `has_more` is set.  Kinds are
+                read separately but cut at one frontier (the earliest
+                position of any kind with more to come), so a page never
+                holds a change newer than one it leaves for a later page –
+                e.g. a re-created note never arrives before its delete
+
+Pages are encoded by utils/serialization (gzip, optional MessagePack).
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.storage import SYNC_KINDS, TOMBSTONE_TTL_DAYS, StorageBackend, SyncPosition
+
+# ─────── Configuration ───────
+SYNC_PAGE_LIMIT = int(os.getenv("SYNC_PAGE_LIMIT", "500"))      # changes per kind per response
+# ────────────────────────────────────────
+
+ITEM_KINDS = [kind for kind in SYNC_KINDS if kind != "tombstones"]
+
+
+class InvalidCursor(ValueError):
+    """The `since` token could not be decoded."""
+
+
+def encode_cursor(positions: Dict[str, SyncPosition], issued_us: int) -> str:
+    raw = json.dumps({"t": issued_us, "p": positions}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> Tuple[Dict[str, SyncPosition], int]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        positions = {kind: (int(us), str(item_id)) for kind, (us, item_id) in raw["p"].items() if kind in SYNC_KINDS}
+        return positions, int(raw["t"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor(f"Invalid sync cursor: {exc}") from exc
+
+
+def collect(storage: StorageBackend, user_id: str, since: Optional[str], limit: int = SYNC_PAGE_LIMIT) -> Dict[str, Any]:
+    """
+    Changes after `since` (None = everything).  Items are upserts with
+    client field names (None fields dropped, times in epoch ms);
+    `deleted` lists ids per kind.  An id both written and deleted in the
+    same page keeps only its newest state.
+    """
+    now_us = time.time_ns() // 1000
+    positions: Dict[str, SyncPosition] = {}
+    reset = False
+    if since:
+        positions, issued_us = decode_cursor(since)
+        if now_us - issued_us > TOMBSTONE_TTL_DAYS * 86400 * 1_000_000:
+            positions, reset = {}, True
+    if not positions:
+        storage.ensure_sync_stamps(user_id)
+
+    limit = max(1, min(limit, SYNC_PAGE_LIMIT))
+    pages = {kind: storage.changes_since(user_id, kind, positions.get(kind), limit) for kind in SYNC_KINDS}
+    # a full page may be followed by more of its kind: hold back every kind's
+    # changes past the earliest such frontier (its own page is kept whole)
+    full = [changes[-1][0] for changes in pages.values() if len(changes) == limit]
+    has_more = bool(full)
+    frontier_us = min(full) if full else None
+
+    items: Dict[str, Dict[str, Tuple[int, Dict[str, Any]]]] = {kind: {} for kind in ITEM_KINDS}
+    deleted: Dict[str, Dict[str, int]] = {kind: {} for kind in ITEM_KINDS}
+    for kind, changes in pages.items():
+        if frontier_us is not None:
+            changes = [change for change in changes if change[0] <= frontier_us]
+        if changes:
+            positions[kind] = changes[-1][:2]
+        for us, item_id, record in changes:
+            if kind == "tombstones":
+                if record["kind"] in deleted:
+                    deleted[record["kind"]][record["id"]] = us
+            else:
+                items[kind][item_id] = (us, {k: v for k, v in record.items() if v is not None})
+
+    body: Dict[str, Any] = {
+        "success": True,
+        "cursor": encode_cursor(positions, now_us),
+        "has_more": has_more,
+        "reset": reset,
+        "deleted": {},
+    }
+    for kind in ITEM_KINDS:
+        gone = deleted[kind]
+        upserts: List[Dict[str, Any]] = []
+        for item_id, (us, record) in items[kind].items():
+            if gone.get(item_id, -1) > us:
+                continue
+            gone.pop(item_id, None)   # re-created after the delete
+            upserts.append(record)
+        body[kind] = upserts
+        body["deleted"][kind] = list(gone)
+    return body
+
@@ -0,0 +1,268 @@
+# utils/write_behind.py
+"""
+Write-behind persistence queue.
+
+With WRITE_BEHIND=1 the API answers as soon as inference is done: the
+Firestore write is appended to a local SQLite journal and a background
+thread flushes it in batches, retrying with exponential backoff.
+
+• a handler takes every ready payload of its op at once (one bulk write)
+  and returns one result per payload; if it raises, the whole batch is
+  retried
+• jobs are only removed from the journal after their handler succeeds, so
+  a crash or a Firestore outage never loses finished inference work – a
+  batch may be replayed, so payloads carry their final ids and a replayed
+  write is refused as already existing, not duplicated
+• enqueue can be given a key (e.g. user + note id): a job whose key is
+  already queued, or taken in storage, is refused up front, as the direct
+  write would be – not accepted and then dropped at flush.  Callers run
+  enqueue in the executor: the insert is fsynced
+• jobs that keep failing past MAX_ATTEMPTS are parked (`dead = 1`) for
+  inspection, not deleted
+• queued payloads are searchable by user + content / upload hash
+  (`pending`), so dedup sees writes that have not landed yet
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.log import get_logger
+from utils.serialization import dumps
+
+# ─────── Configuration ───────
+WRITE_BEHIND       = os.getenv("WRITE_BEHIND", "0") == "1"
+QUEUE_PATH         = os.getenv(
+    "WRITE_BEHIND_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "write_behind.sqlite3"),
+)
+FLUSH_INTERVAL_S   = float(os.getenv("WRITE_BEHIND_INTERVAL_S", "0.5"))
+FLUSH_BATCH        = int(os.getenv("WRITE_BEHIND_BATCH", "50"))
+MAX_ATTEMPTS       = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "12"))
+BACKOFF_BASE_S     = 0.5
+BACKOFF_MAX_S      = 300.0
+# ────────────────────────────────────────
+
+logger = get_logger("write_behind")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    op              TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    enqueued_at     REAL NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error      TEXT,
+    dead            INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (dead, next_attempt_at);
+"""
+
+# lookup keys copied out of the payload (added after the first schema – migrated in place)
+_KEY_COLUMNS = ("user_id", "content_hash", "upload_hash")
+_ADDED_COLUMNS = (*_KEY_COLUMNS, "job_key")
+_KEY_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_content ON jobs (op, user_id, content_hash);
+CREATE INDEX IF NOT EXISTS idx_jobs_upload ON jobs (op, user_id, upload_hash);
+CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (op, job_key);
+"""
+
+Handler = Callable[[List[Dict[str, Any]]], List[Any]]   # payloads → one result each
+
+
+class WriteBehindQueue:
+    def __init__(self, handlers: Dict[str, Handler], path: str = QUEUE_PATH) -> None:
+        self.handlers = handlers
+        self.path = path
+        self.flushed = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()   # one flush at a time: a job is never run twice at once
+        self._enqueuing = threading.Lock()  # one keyed check-then-insert at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")  # durability over speed – this is the journal
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in _ADDED_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        self._conn.executescript(_KEY_INDEXES)
+
+    # ---------- producer side ---------- #
+    def enqueue(
+        self,
+        op: str,
+        payload: Dict[str, Any],
+        key: str | None = None,
+        taken: Callable[[], bool] | None = None,
+    ) -> Optional[int]:
+        """
+        Journal a job; returns its id, or None when refused: a live job with
+        the same `key` is queued, or `taken()` says storage already has it.
+        Enqueues run one at a time and check the queue before storage: a
+        flush only drops a job once it is stored, so a key is always seen in
+        one or the other.  `taken()` runs outside `_lock` – lookups and the
+        flusher never wait on its round trip.
+        """
+        if op not in self.handlers:
+            raise ValueError(f"No write-behind handler for {op!r}")
+        with self._enqueuing:
+            if key is not None:
+                with self._lock:
+                    queued = self._conn.execute(
+                        "SELECT 1 FROM jobs WHERE op = ? AND job_key = ? AND dead = 0 LIMIT 1", (op, key)
+                    ).fetchone()
+                if queued or (taken is not None and taken()):
+                    return None
+            now = time.time()
+            with self._lock:
+                cur = self._conn.execute(
+                    "INSERT INTO jobs (op, payload, enqueued_at, next_attempt_at, user_id, content_hash, "
+                    "upload_hash, job_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (op, dumps(payload).decode(), now, now, *(payload.get(c) for c in _KEY_COLUMNS), key),
+                )
+        self._wake.set()
+        return cur.lastrowid
+
+    def pending(
+        self,
+        op: str,
+        user_id: str,
+        *,
+        content_hash: str | None = None,
+        upload_hash: str | None = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Payload of a queued (not parked) `op` job for this user + hash, if any."""
+        column, value = ("content_hash", content_hash) if content_hash else ("upload_hash", upload_hash)
+        if not value:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT payload FROM jobs WHERE op = ? AND user_id = ? AND {column} = ? AND dead = 0 "
+                f"ORDER BY id LIMIT 1",
+                (op, user_id, value),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pending_by_hashes(self, op: str, user_id: str, content_hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Content hash → queued payload, for the hashes that have one."""
+        hashes = list(dict.fromkeys(content_hashes))
+        found: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(hashes), 500):   # under SQLite's bound-parameter limit
+            part = hashes[start:start + 500]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT content_hash, payload FROM jobs WHERE op = ? AND user_id = ? AND dead = 0 "
+                    f"AND content_hash IN ({','.join('?' * len(part))}) ORDER BY id",
+                    (op, user_id, *part),
+                ).fetchall()
+            for h, payload in rows:
+                found.setdefault(h, json.loads(payload))
+        return found
+
+    # ---------- consumer side ---------- #
+    def flush_once(self, limit: int = FLUSH_BATCH) -> int:
+        """Run up to `limit` ready jobs, one handler call per op; returns how many succeeded."""
+        with self._flushing:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, op, payload, attempts FROM jobs "
+                    "WHERE dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (time.time(), limit),
+                ).fetchall()
+            by_op: Dict[str, List[tuple]] = {}
+            for row in rows:
+                by_op.setdefault(row[1], []).append(row)
+
+            done = 0
+            for op, jobs in by_op.items():
+                try:
+                    results = self.handlers[op]([json.loads(payload) for _, _, payload, _ in jobs])
+                except Exception as exc:
+                    for job_id, _, _, attempts in jobs:
+                        self._reschedule(job_id, attempts + 1, exc)
+                    continue
+                for (job_id, _, _, _), result in zip(jobs, results):
+                    if isinstance(result, dict) and not result.get("success", True):
+                        # enqueue refused taken keys: an earlier, interrupted flush wrote
+                        # it – or another writer (instance) took the id since
+                        logger.warning("Write-behind job found its item existing", extra={"op": op, "job_id": job_id})
+                with self._lock:
+                    self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job[0],) for job in jobs])
+                self.flushed += len(jobs)
+                done += len(jobs)
+            return done
+
+    def _reschedule(self, job_id: int, attempts: int, exc: Exception) -> None:
+        if attempts >= MAX_ATTEMPTS:
+            logger.error("Write-behind job parked", extra={"job_id": job_id, "attempts": attempts, "error": str(exc)})
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET attempts = ?, last_error = ?, dead = 1 WHERE id = ?",
+                    (attempts, str(exc), job_id),
+                )
+            return
+        self.retries += 1
+        delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (attempts - 1))
+        delay *= random.uniform(0.8, 1.2)  # jitter so a recovering Firestore is not stampeded
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (attempts, str(exc), time.time() + delay, job_id),
+            )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                flushed = self.flush_once()
+            except Exception as exc:  # never let the flusher die
+                logger.exception("Write-behind flush error")
+                flushed = 0
+            if not flushed:
+                self._wake.wait(FLUSH_INTERVAL_S)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher after one last drain attempt; unsent jobs stay journaled."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # still inside a flush (e.g. a slow Firestore write): leave the rest journaled
+                logger.warning("Write-behind flusher still busy at shutdown; skipping final drain")
+                return
+            self._thread = None
+        self.flush_once(limit=10_000)
+
+    # ---------- metrics ---------- #
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            depth, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at) FROM jobs WHERE dead = 0"
+            ).fetchone()
+            dead = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE dead = 1").fetchone()[0]
+        return {
+            "depth": depth,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "dead": dead,
+            "flushed": self.flushed,
+            "retries": self.retries,
+        }